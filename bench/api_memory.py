@@ -0,0 +1,153 @@
+import argparse
+import http.client
+import os
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2.extras import RealDictCursor
+
+from generate_data import generate
+from db.migrate import load_migrations, upgrade
+from load_test import AppServer, DisposablePostgres, _free_port
+
+# (label, path). `/` builds the whole catalog snapshot in memory, which is what
+# a buffered export would cost.
+ENDPOINTS = (
+    ('api ndjson', '/api/products'),
+    ('api json', '/api/products?format=json'),
+    ('/ (snapshot)', '/'),
+)
+
+
+def _worker_pid(master_pid):
+    # Linux only: the single gunicorn worker is the master's only child.
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            with open(f'/proc/{master_pid}/task/{master_pid}/children') as handle:
+                children = handle.read().split()
+        except OSError:
+            children = []
+        if children:
+            return int(children[0])
+        time.sleep(0.1)
+    raise SystemExit('could not find the gunicorn worker process')
+
+
+def _memory_kb(pid):
+    values = {}
+    with open(f'/proc/{pid}/status') as handle:
+        for line in handle:
+            name, _, value = line.partition(':')
+            if name in ('VmRSS', 'VmHWM'):
+                values[name] = int(value.split()[0])
+    return values
+
+
+def _fetch(port, path):
+    # Reads and discards the body as it arrives, so the client holds no copy.
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+    started = time.perf_counter()
+    conn.request('GET', path)
+    response = conn.getresponse()
+    size = 0
+    while True:
+        chunk = response.read(65536)
+        if not chunk:
+            break
+        size += len(chunk)
+    conn.close()
+    if response.status != 200:
+        raise SystemExit(f'{path} returned {response.status}')
+    return size, time.perf_counter() - started
+
+
+def _load_catalog(database_url, products, seed):
+    conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                truncate public.order_items, public.orders, public.product_categories,
+                         public.products, public.categories, public.user_roles, public.users
+                cascade
+                """
+            )
+            generate(cur, {'products': products, 'users': 1, 'orders': 0, 'categories': 40}, seed,
+                     echo=lambda message: None)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def measure(database_url, path, fetch_size):
+    port = _free_port()
+    server = AppServer(database_url, 1, port, env={'API_FETCH_SIZE': str(fetch_size)})
+    server.start()
+    try:
+        worker = _worker_pid(server.process.pid)
+        before = _memory_kb(worker)['VmRSS']
+        size, elapsed = _fetch(port, path)
+        after = _memory_kb(worker)
+    finally:
+        server.stop()
+    return {
+        'bytes': size,
+        'seconds': elapsed,
+        'rss_before_mb': before / 1024,
+        'peak_mb': after['VmHWM'] / 1024,
+        'growth_mb': (after['VmHWM'] - before) / 1024,
+    }
+
+
+def main():
+    load_dotenv(override=True)
+    parser = argparse.ArgumentParser(
+        description='Peak RSS of a gunicorn worker serving /api/products, against catalog size.'
+    )
+    parser.add_argument('--initdb', action='store_true',
+                        help='Run against a disposable initdb cluster instead of DATABASE_URL.')
+    parser.add_argument('--pg-bin', help='Directory with initdb/pg_ctl (defaults to PATH).')
+    parser.add_argument('--truncate', action='store_true',
+                        help='Required with DATABASE_URL: each size empties the catalog, user and order tables.')
+    parser.add_argument('--sizes', default='10000,50000,200000', help='comma-separated product counts')
+    parser.add_argument('--fetch-size', type=int, default=1000, help='API_FETCH_SIZE for the server')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    postgres = DisposablePostgres(args.pg_bin) if args.initdb else None
+    try:
+        if postgres:
+            print('starting disposable Postgres...')
+            database_url = postgres.start()
+        else:
+            database_url = os.getenv('DATABASE_URL')
+            if not database_url:
+                raise SystemExit('DATABASE_URL is not set (or use --initdb)')
+            if not args.truncate:
+                raise SystemExit('this benchmark replaces the catalog; pass --truncate or use --initdb')
+
+        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+        try:
+            upgrade(conn, load_migrations(), echo=lambda message: print(f'  {message}'))
+        finally:
+            conn.close()
+
+        print(f"{'products':>9} {'endpoint':<14} {'MB sent':>8} {'seconds':>8} {'rss before':>11} {'peak':>8} {'growth':>8}")
+        for products in sizes:
+            _load_catalog(database_url, products, args.seed)
+            for label, path in ENDPOINTS:
+                result = measure(database_url, path, args.fetch_size)
+                print(
+                    f"{products:>9,} {label:<14} {result['bytes'] / 1e6:>8.1f} {result['seconds']:>8.2f} "
+                    f"{result['rss_before_mb']:>9.1f}MB {result['peak_mb']:>6.1f}MB {result['growth_mb']:>6.1f}MB"
+                )
+    finally:
+        if postgres:
+            postgres.stop()
+
+
+if __name__ == '__main__':
+    main()
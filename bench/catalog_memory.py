@@ -0,0 +1,113 @@
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_PATH = os.path.join(PROJECT_ROOT, 'src')
+
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from services.page_cache import catalog_version
+from services.records import _normalize_cantity, price_row_from_row, product_from_row
+
+CATEGORIES = ['Frutas', 'Verduras', 'Lácteos', 'Carniceria', 'Panadería', 'Congelados', 'Bebidas', 'Limpieza']
+# Columns of the cart price lookup (products_by_ids_sql).
+PRICE_COLUMNS = ('id', 'name', 'price', 'image_url', 'is_on_offer', 'offer_price')
+UNITS = ['1 u', '500 g', '1 kg', '1 L', '2 L', '6 u', '250 g', '12 u']
+
+
+def database_rows(size, seed):
+    # Shaped like the catalog query's rows: a fresh string per row and numeric
+    # columns as Decimal, which is what psycopg2 hands back.
+    rng = random.Random(seed)
+    rows = []
+    for index in range(size):
+        price = Decimal(f'{rng.uniform(0.5, 80):.2f}')
+        on_offer = rng.random() < 0.1
+        rows.append({
+            'id': f'{rng.getrandbits(128):032x}',
+            'name': f'Producto {index} {rng.choice(CATEGORIES)}',
+            'description': 'Cantidad: ' + rng.choice(UNITS),
+            'price': price,
+            'image_url': f'https://cdn.example.com/p/{index}.webp',
+            'is_on_offer': on_offer,
+            'offer_price': (price * Decimal('0.8')).quantize(Decimal('0.01')) if on_offer else Decimal('0'),
+            'category': ''.join(rng.choice(CATEGORIES)),
+        })
+    return rows
+
+
+def dict_product(row):
+    # The previous per-product representation, kept here as the baseline.
+    return {
+        'id': str(row.get('id')),
+        'name': row.get('name'),
+        'category': row.get('category') or 'Sin categoria',
+        'price': float(row.get('price') or 0),
+        'cantity': _normalize_cantity(row.get('description')),
+        'image_url': row.get('image_url'),
+        'is_on_offer': bool(row.get('is_on_offer')),
+        'offer_price': float(row.get('offer_price') or 0),
+    }
+
+
+def measure(build, size, seed):
+    # Rows are created under tracing and dropped after the build, so strings the
+    # representation keeps alive (or lets go of) are counted.
+    gc.collect()
+    tracemalloc.start()
+    rows = database_rows(size, seed)
+    baseline, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    result = build(rows)
+    del rows
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+
+    # Timed separately: tracing slows allocation-heavy code unevenly.
+    rows = database_rows(size, seed)
+    started = time.perf_counter()
+    build(rows)
+    elapsed = time.perf_counter() - started
+    return result, {'retained': current, 'peak': peak - baseline, 'blocks': blocks, 'seconds': elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory of the cached catalog: dict rows against compact records.')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='comma-separated product counts')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    builds = (
+        ('catalog dicts', lambda rows: [dict_product(row) for row in rows]),
+        ('catalog records', lambda rows: tuple(product_from_row(row) for row in rows)),
+        ('price dicts', lambda rows: {str(row['id']): {key: row[key] for key in PRICE_COLUMNS} for row in rows}),
+        ('price records', lambda rows: {record.id: record for record in map(price_row_from_row, rows)}),
+    )
+
+    print(f"{'products':>9} {'representation':<16} {'retained':>10} {'per item':>9} {'peak':>10} {'blocks':>10} {'build':>8} {'version':>8}")
+    for size in [int(size) for size in args.sizes.split(',') if size.strip()]:
+        for label, build in builds:
+            result, stats = measure(build, size, args.seed)
+            version_time = ''
+            if label.startswith('catalog'):
+                started = time.perf_counter()
+                catalog_version(result)
+                version_time = f'{time.perf_counter() - started:.2f}s'
+            print(
+                f"{size:>9,} {label:<16} {stats['retained'] / 1e6:>8.1f}MB {stats['retained'] / size:>7.0f}B "
+                f"{stats['peak'] / 1e6:>8.1f}MB {stats['blocks']:>10,} {stats['seconds']:>7.2f}s {version_time:>8}"
+            )
+            del result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_PATH = os.path.join(PROJECT_ROOT, 'src')
+
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2.extras import RealDictCursor
+
+from db.schema import detect_catalog_schema
+from services.checkout import new_idempotency_key, place_order
+
+
+def _per_line_checkout(cur, user_id, items, subtotal):
+    # The previous implementation: one insert for the order, one per line.
+    cur.execute(
+        """
+        insert into public.orders (user_id, status, subtotal, tax, total, currency)
+        values (%s, %s, %s, %s, %s, %s)
+        returning id
+        """,
+        (user_id, 'pending', subtotal, 0, subtotal, 'USD'),
+    )
+    order_id = cur.fetchone()['id']
+    for item in items:
+        cur.execute(
+            """
+            insert into public.order_items
+            (order_id, product_id, quantity, unit_price, line_total)
+            values (%s, %s, %s, %s, %s)
+            """,
+            (order_id, item['id'], item['quantity'], item['unit_price'], item['line_total']),
+        )
+
+
+def _batched_checkout(cur, schema, user_id, items, subtotal):
+    place_order(cur, schema, user_id, items, subtotal, 0, subtotal, idempotency_key=new_idempotency_key())
+
+
+def _fixture(cur, lines):
+    cur.execute('select id, price from public.products order by id limit %s', (lines,))
+    products = cur.fetchall()
+    if len(products) < lines:
+        raise SystemExit(f'Need at least {lines} products, found {len(products)}')
+
+    cur.execute('select id from public.users limit 1')
+    user = cur.fetchone()
+    if user is None:
+        cur.execute(
+            """
+            insert into public.users (email, password_hash, full_name)
+            values ('bench-checkout@example.com', 'x', 'Bench')
+            returning id
+            """
+        )
+        user = cur.fetchone()
+
+    items = []
+    for product in products:
+        unit_price = Decimal(str(product['price'] or 0))
+        items.append({
+            'id': str(product['id']),
+            'quantity': 2,
+            'unit_price': float(unit_price),
+            'line_total': float(unit_price * 2),
+        })
+    return user['id'], items, sum(item['line_total'] for item in items)
+
+
+def _measure(conn, run, rounds):
+    samples = []
+    for _ in range(rounds):
+        with conn.cursor() as cur:
+            started = time.perf_counter()
+            run(cur)
+            samples.append((time.perf_counter() - started) * 1000)
+        # Nothing is kept: every round is rolled back.
+        conn.rollback()
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    load_dotenv(override=True)
+    parser = argparse.ArgumentParser(description='Checkout write latency by number of cart lines.')
+    parser.add_argument('--lines', default='1,10,30,60,120')
+    parser.add_argument('--rounds', type=int, default=30)
+    args = parser.parse_args()
+
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        raise SystemExit('DATABASE_URL is not set')
+
+    conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    try:
+        with conn.cursor() as cur:
+            schema = detect_catalog_schema(cur)
+        conn.rollback()
+
+        print(f"{'lines':>6} {'per-line p50':>14} {'per-line max':>14} {'batched p50':>13} {'batched max':>13}")
+        for lines in [int(value) for value in args.lines.split(',') if value.strip()]:
+            with conn.cursor() as cur:
+                user_id, items, subtotal = _fixture(cur, lines)
+            old_p50, old_max = _measure(
+                conn, lambda cur: _per_line_checkout(cur, user_id, items, subtotal), args.rounds
+            )
+            new_p50, new_max = _measure(
+                conn, lambda cur: _batched_checkout(cur, schema, user_id, items, subtotal), args.rounds
+            )
+            conn.rollback()
+            print(f'{lines:>6} {old_p50:>12.2f}ms {old_max:>12.2f}ms {new_p50:>11.2f}ms {new_max:>11.2f}ms')
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+import argparse
+import contextlib
+import datetime
+import itertools
+import os
+import random
+import sys
+import time
+import uuid
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_PATH = os.path.join(PROJECT_ROOT, 'src')
+
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+import bcrypt
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2.extras import RealDictCursor
+
+from db.copy import CopyStream
+from db.schema import detect_catalog_schema
+from services.catalog_stats import refresh_catalog_stats
+
+PRESETS = {
+    'tiny': {'products': 2_000, 'users': 1_000, 'orders': 2_000, 'categories': 20},
+    'small': {'products': 20_000, 'users': 20_000, 'orders': 50_000, 'categories': 40},
+    'medium': {'products': 200_000, 'users': 200_000, 'orders': 500_000, 'categories': 80},
+    'large': {'products': 1_000_000, 'users': 2_000_000, 'orders': 3_000_000, 'categories': 150},
+}
+DEFAULT_PRESET = 'small'
+# Every generated account uses this password so load tests can log in as them.
+GENERATED_PASSWORD = 'bench-password'
+
+BASE_CATEGORIES = [
+    'Frutas', 'Verduras', 'Lacteos', 'Carniceria', 'Panaderia', 'Congelados', 'Bebidas',
+    'Limpieza', 'Snacks', 'Despensa', 'Cuidado personal', 'Mascotas', 'Bebes', 'Vinos',
+]
+PRODUCTS = [
+    'leche', 'queso', 'yogur', 'pan', 'arroz', 'pollo', 'carne', 'manzana', 'pera',
+    'platano', 'pina', 'jugo', 'agua', 'cafe', 'te', 'azucar', 'sal', 'aceite',
+    'harina', 'huevos', 'tomate', 'cebolla', 'papa', 'zanahoria', 'galletas',
+    'cereal', 'mantequilla', 'jamon', 'salchicha', 'limon', 'detergente', 'jabon',
+]
+BRANDS = [
+    'La Granja', 'Del Valle', 'Sol Dorado', 'Campo Fresco', 'Rico', 'Natural',
+    'Premium', 'Casa', 'Norte', 'Sur', 'Vida Sana', 'Oro Verde',
+]
+UNITS = ['1 kg', '500 g', '250 g', '1 L', '2 L', '6 u', '12 u', '330 ml']
+FIRST_NAMES = ['Ana', 'Luis', 'Maria', 'Jose', 'Carmen', 'Juan', 'Rosa', 'Pedro', 'Lucia', 'Miguel']
+LAST_NAMES = ['Perez', 'Gomez', 'Rodriguez', 'Diaz', 'Martinez', 'Santos', 'Ramirez', 'Cruz']
+ORDER_STATUSES = (('delivered', 70), ('paid', 20), ('pending', 7), ('cancelled', 3))
+ORDER_CHUNK = 20_000
+LOADED_TABLES = ('products', 'product_categories', 'users', 'user_roles', 'orders', 'order_items')
+
+
+def _uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _zipf_weights(size, exponent):
+    # Cumulative weights for rank-based (Zipf-like) sampling with rng.choices.
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, size + 1)))
+
+
+def _timestamp(now, rng, max_days):
+    return (now - datetime.timedelta(seconds=rng.random() * max_days * 86400)).isoformat()
+
+
+def _copy(cur, table, columns, rows, echo):
+    started = time.perf_counter()
+    stream = CopyStream(rows)
+    cur.copy_expert(f"copy public.{table} ({', '.join(columns)}) from stdin", stream, size=1 << 16)
+    elapsed = time.perf_counter() - started
+    echo(f'  {table:<20} {stream.count:>10,} rows  {elapsed:6.2f}s  {stream.count / elapsed if elapsed else 0:>10,.0f} rows/s')
+    return stream.count
+
+
+def _categories(cur, rng, count):
+    names = BASE_CATEGORIES[:count] + [f'Pasillo {index}' for index in range(len(BASE_CATEGORIES) + 1, count + 1)]
+    cur.execute(
+        'insert into public.categories (name) select unnest(%s::text[]) on conflict (name) do nothing',
+        (names,),
+    )
+    cur.execute('select id, name from public.categories where name = any(%s)', (names,))
+    ids = {row['name']: str(row['id']) for row in cur.fetchall()}
+    return [ids[name] for name in names]
+
+
+def _product_rows(rng, seed, count, now, prices):
+    for index in range(count):
+        product_id = _uuid(rng)
+        name = f'{rng.choice(PRODUCTS).title()} {rng.choice(BRANDS)} {rng.choice(UNITS)}'
+        # Log-normal prices: many cheap staples, a few expensive items.
+        price = round(min(500.0, rng.lognormvariate(1.2, 0.8)) + 0.5, 2)
+        on_offer = rng.random() < 0.12
+        offer_price = round(price * rng.uniform(0.6, 0.9), 2) if on_offer else 0
+        prices.append((product_id, offer_price if on_offer else price))
+        yield (
+            product_id,
+            name,
+            f'{name.lower().replace(" ", "-")}-{seed}-{index}',
+            f'Cantidad: {name.rsplit(" ", 2)[-2]} {name.rsplit(" ", 1)[-1]}',
+            price,
+            None,
+            't' if on_offer else 'f',
+            offer_price,
+            'f' if rng.random() < 0.03 else 't',
+            _timestamp(now, rng, 730),
+        )
+
+
+def _user_rows(rng, seed, count, now, password_hash, user_ids):
+    for index in range(count):
+        user_id = _uuid(rng)
+        user_ids.append(user_id)
+        yield (
+            user_id,
+            f'user{index}.s{seed}@example.com',
+            password_hash,
+            f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'f' if rng.random() < 0.02 else 't',
+            _timestamp(now, rng, 1095),
+        )
+
+
+def _orders(rng, count, now, user_ids, prices, popularity):
+    user_weights = _zipf_weights(len(user_ids), 0.6)
+    product_weights = _zipf_weights(len(popularity), 1.05)
+    statuses = [status for status, _ in ORDER_STATUSES]
+    status_weights = [weight for _, weight in ORDER_STATUSES]
+
+    for start in range(0, count, ORDER_CHUNK):
+        size = min(ORDER_CHUNK, count - start)
+        buyers = rng.choices(user_ids, cum_weights=user_weights, k=size)
+        order_statuses = rng.choices(statuses, weights=status_weights, k=size)
+        orders = []
+        items = []
+        for buyer, status in zip(buyers, order_statuses):
+            order_id = _uuid(rng)
+            lines = min(30, int(rng.expovariate(1 / 4)) + 1)
+            picked = {popularity[rank] for rank in rng.choices(range(len(popularity)), cum_weights=product_weights, k=lines)}
+            subtotal = 0
+            for product_index in picked:
+                product_id, unit_price = prices[product_index]
+                quantity = rng.choice((1, 1, 1, 2, 2, 3, 4, 6))
+                line_total = round(unit_price * quantity, 2)
+                subtotal += line_total
+                items.append((_uuid(rng), order_id, product_id, quantity, unit_price, line_total))
+            subtotal = round(subtotal, 2)
+            orders.append((order_id, buyer, status, subtotal, 0, subtotal, 'USD', _timestamp(now, rng, 365)))
+        yield orders, items
+
+
+@contextlib.contextmanager
+def _indexes_deferred(cur, tables, echo):
+    # Secondary indexes are dropped for the load and rebuilt once at the end,
+    # which is several times faster than maintaining them row by row. Indexes
+    # that back constraints (primary keys, unique emails) stay in place.
+    cur.execute(
+        """
+        select i.indexrelid::regclass::text as name, pg_get_indexdef(i.indexrelid) as definition
+        from pg_index i
+        where i.indrelid = any(%s::regclass[])
+          and not exists (select 1 from pg_constraint c where c.conindid = i.indexrelid)
+        """,
+        ([f'public.{table}' for table in tables],),
+    )
+    indexes = cur.fetchall()
+    for index in indexes:
+        cur.execute(f"drop index {index['name']}")
+    yield
+    started = time.perf_counter()
+    for index in indexes:
+        cur.execute(index['definition'])
+    echo(f'  rebuilt {len(indexes)} indexes in {time.perf_counter() - started:.2f}s')
+
+
+def generate(cur, sizes, seed, echo=print):
+    rng = random.Random(seed)
+    # Fixed reference time so the same seed produces the same rows.
+    now = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    counts = {}
+    started = time.perf_counter()
+
+    cur.execute("insert into public.roles (name, description) values ('admin', 'Admin role') on conflict (name) do nothing")
+    cur.execute("select id from public.roles where name = 'admin'")
+    admin_role_id = str(cur.fetchone()['id'])
+    category_ids = _categories(cur, rng, sizes['categories'])
+    counts['categories'] = len(category_ids)
+
+    with _indexes_deferred(cur, LOADED_TABLES, echo):
+        prices = []
+        counts['products'] = _copy(
+            cur, 'products',
+            ('id', 'name', 'slug', 'description', 'price', 'image_url', 'is_on_offer', 'offer_price', 'is_active', 'created_at'),
+            _product_rows(rng, seed, sizes['products'], now, prices),
+            echo,
+        )
+
+        # Long tail: the first categories hold most of the catalog.
+        category_weights = _zipf_weights(len(category_ids), 1.1)
+        assigned = rng.choices(category_ids, cum_weights=category_weights, k=len(prices))
+        counts['product_categories'] = _copy(
+            cur, 'product_categories', ('product_id', 'category_id'),
+            ((product_id, category_id) for (product_id, _), category_id in zip(prices, assigned)),
+            echo,
+        )
+
+        password_hash = bcrypt.hashpw(GENERATED_PASSWORD.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        user_ids = []
+        counts['users'] = _copy(
+            cur, 'users', ('id', 'email', 'password_hash', 'full_name', 'is_active', 'created_at'),
+            _user_rows(rng, seed, sizes['users'], now, password_hash, user_ids),
+            echo,
+        )
+
+        admins = rng.sample(user_ids, min(len(user_ids), max(1, len(user_ids) // 2000)))
+        counts['user_roles'] = _copy(cur, 'user_roles', ('user_id', 'role_id'), ((user_id, admin_role_id) for user_id in admins), echo)
+
+        counts['orders'] = counts['order_items'] = 0
+        if sizes['orders'] and user_ids and prices:
+            # Popularity is independent of age: a random permutation of the catalog.
+            popularity = list(range(len(prices)))
+            rng.shuffle(popularity)
+            for orders, items in _orders(rng, sizes['orders'], now, user_ids, prices, popularity):
+                counts['orders'] += _copy(
+                    cur, 'orders', ('id', 'user_id', 'status', 'subtotal', 'tax', 'total', 'currency', 'created_at'),
+                    orders, lambda message: None,
+                )
+                counts['order_items'] += _copy(
+                    cur, 'order_items', ('id', 'order_id', 'product_id', 'quantity', 'unit_price', 'line_total'),
+                    items, lambda message: None,
+                )
+            echo(f"  {'orders':<20} {counts['orders']:>10,} rows")
+            echo(f"  {'order_items':<20} {counts['order_items']:>10,} rows")
+
+    schema = detect_catalog_schema(cur)
+    if schema.has_catalog_stats:
+        refresh_catalog_stats(cur, schema, rebuild_sales=True)
+        echo('  refreshed catalog stats')
+
+    for table in LOADED_TABLES + ('categories',):
+        cur.execute(f'analyze public.{table}')
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    echo(f'  {total:,} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f} rows/s)')
+    return counts
+
+
+def add_size_arguments(parser, default_preset=DEFAULT_PRESET):
+    parser.add_argument('--preset', choices=sorted(PRESETS), default=default_preset)
+    for name in ('products', 'users', 'orders', 'categories'):
+        parser.add_argument(f'--{name}', type=int, help=f'Override the preset number of {name}.')
+    parser.add_argument('--seed', type=int, default=7, help='Same seed, same rows.')
+
+
+def sizes_from_args(args):
+    sizes = dict(PRESETS[args.preset])
+    for name in sizes:
+        value = getattr(args, name, None)
+        if value is not None:
+            sizes[name] = value
+    return sizes
+
+
+def main():
+    load_dotenv(override=True)
+    parser = argparse.ArgumentParser(
+        description='Fill the app tables with a deterministic synthetic dataset through COPY.'
+    )
+    add_size_arguments(parser)
+    parser.add_argument('--truncate', action='store_true',
+                        help='Empty products, categories, users and orders first.')
+    args = parser.parse_args()
+
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        raise SystemExit('DATABASE_URL is not set')
+
+    sizes = sizes_from_args(args)
+    print(f"preset={args.preset} seed={args.seed} " + ' '.join(f'{name}={value:,}' for name, value in sizes.items()))
+    conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    try:
+        with conn.cursor() as cur:
+            if args.truncate:
+                cur.execute(
+                    """
+                    truncate public.order_items, public.orders, public.product_categories,
+                             public.products, public.categories, public.user_roles, public.users
+                    cascade
+                    """
+                )
+            generate(cur, sizes, args.seed)
+        conn.commit()
+    except psycopg2.errors.UniqueViolation as exc:
+        conn.rollback()
+        raise SystemExit(f'{exc.diag.message_primary}: this seed was already loaded; use --truncate or another --seed')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
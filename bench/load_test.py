@@ -0,0 +1,551 @@
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_PATH = os.path.join(PROJECT_ROOT, 'src')
+RESULTS_DIR = os.path.join(PROJECT_ROOT, 'bench', 'results')
+
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+import bcrypt
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2.extras import RealDictCursor
+
+from db.migrate import load_migrations, upgrade
+from generate_data import add_size_arguments, generate, sizes_from_args
+
+SCENARIOS = ('browse', 'cart', 'checkout', 'admin')
+BENCH_PASSWORD = 'bench-password'
+ADMIN_EMAIL = 'bench-admin@example.com'
+SEARCH_TERMS = ('bench', 'product 1', 'prodcut', 'bench 42', 'pro')
+_SESSION_COOKIE_RE = re.compile(r'session=([^;]*)')
+_IDEMPOTENCY_RE = re.compile(r'name="idempotency_key"\s+value="([^"]+)"')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class DisposablePostgres:
+    # initdb cluster in a temp dir, listening only on a unix socket inside it.
+    def __init__(self, pg_bin=None):
+        self.pg_bin = pg_bin
+        self.directory = None
+
+    def _tool(self, name):
+        path = os.path.join(self.pg_bin, name) if self.pg_bin else shutil.which(name)
+        if not path or not os.path.exists(path):
+            raise SystemExit(f'{name} not found; put the Postgres bin directory on PATH or pass --pg-bin')
+        return path
+
+    def start(self):
+        self.directory = tempfile.mkdtemp(prefix='bench-pg-')
+        data_dir = os.path.join(self.directory, 'data')
+        try:
+            subprocess.run(
+                [self._tool('initdb'), '-D', data_dir, '-U', 'postgres', '--auth=trust', '-E', 'UTF8', '--no-sync'],
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+        except subprocess.CalledProcessError:
+            # initdb refuses to run as root, among other things; its own message
+            # has already been printed.
+            raise SystemExit('initdb failed; run as an unprivileged user or use DATABASE_URL')
+        options = f"-k {self.directory} -c listen_addresses='' -c max_connections=200"
+        if self._has_pg_stat_statements():
+            options += ' -c shared_preload_libraries=pg_stat_statements'
+        subprocess.run(
+            [self._tool('pg_ctl'), '-D', data_dir, '-o', options, '-l', os.path.join(self.directory, 'log'), '-w', 'start'],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        return f'postgresql://postgres@/postgres?host={self.directory}'
+
+    def _has_pg_stat_statements(self):
+        try:
+            sharedir = subprocess.check_output([self._tool('pg_config'), '--sharedir'], text=True).strip()
+        except (OSError, subprocess.CalledProcessError, SystemExit):
+            return False
+        return os.path.exists(os.path.join(sharedir, 'extension', 'pg_stat_statements.control'))
+
+    def stop(self):
+        if not self.directory:
+            return
+        subprocess.run(
+            [self._tool('pg_ctl'), '-D', os.path.join(self.directory, 'data'), '-m', 'fast', 'stop'],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def prepare_database(database_url, args, users):
+    conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    try:
+        upgrade(conn, load_migrations(), echo=lambda message: print(f'  {message}'))
+        with conn.cursor() as cur:
+            if args.generate:
+                generate(cur, sizes_from_args(args), args.seed)
+
+            password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=4)).decode('utf-8')
+            emails = [ADMIN_EMAIL] + [f'bench-shopper-{index}@example.com' for index in range(users)]
+            cur.execute(
+                """
+                insert into public.users (email, password_hash, full_name)
+                select email, %s, 'Bench ' || email from unnest(%s::text[]) as email
+                on conflict (email) do update set password_hash = excluded.password_hash, is_active = true
+                """,
+                (password_hash, emails),
+            )
+            cur.execute(
+                """
+                insert into public.user_roles (user_id, role_id)
+                select u.id, r.id from public.users u, public.roles r
+                where u.email = %s and r.name = 'admin'
+                on conflict do nothing
+                """,
+                (ADMIN_EMAIL,),
+            )
+            # Optional: gives real statement counts when the server preloads it.
+            cur.execute('savepoint stat_statements')
+            try:
+                cur.execute('create extension if not exists pg_stat_statements')
+            except psycopg2.Error:
+                cur.execute('rollback to savepoint stat_statements')
+        conn.commit()
+
+        with conn.cursor() as cur:
+            cur.execute('select id from public.products where is_active = true order by created_at desc limit 2000')
+            product_ids = [str(row['id']) for row in cur.fetchall()]
+        conn.commit()
+    finally:
+        conn.close()
+    if not product_ids:
+        raise SystemExit('No active products to shop for; use --generate')
+    return product_ids, emails[1:]
+
+
+class DatabaseCounters:
+    # Server-side statement counts (pg_stat_statements when installed) and
+    # transaction counts (always available) for the bench database.
+    def __init__(self, database_url):
+        self.conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+        self.conn.autocommit = True
+        with self.conn.cursor() as cur:
+            cur.execute("select 1 from pg_extension where extname = 'pg_stat_statements'")
+            self.statements = cur.fetchone() is not None
+
+    def snapshot(self):
+        # Transaction counters are flushed to the stats system about once a second.
+        time.sleep(1.1)
+        with self.conn.cursor() as cur:
+            cur.execute('select pg_stat_clear_snapshot()')
+            cur.execute(
+                'select xact_commit + xact_rollback as xacts from pg_stat_database where datname = current_database()'
+            )
+            counters = {'xacts': cur.fetchone()['xacts'], 'queries': None}
+            if self.statements:
+                cur.execute(
+                    """
+                    select coalesce(sum(calls), 0)::bigint as calls
+                    from pg_stat_statements
+                    where dbid = (select oid from pg_database where datname = current_database())
+                      and query not ilike '%pg_stat%'
+                    """
+                )
+                counters['queries'] = cur.fetchone()['calls']
+        return counters
+
+    def close(self):
+        self.conn.close()
+
+
+class AppServer:
+    def __init__(self, database_url, workers, port, threads=None, env=None):
+        self.database_url = database_url
+        self.workers = workers
+        self.port = port
+        self.threads = threads
+        self.env = env or {}
+        self.process = None
+
+    def start(self):
+        env = dict(os.environ, DATABASE_URL=self.database_url, SECRET_KEY='bench-secret', **self.env)
+        threads = ['--threads', str(self.threads)] if self.threads else []
+        self.process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn', 'index:app',
+                '--workers', str(self.workers),
+                *threads,
+                '--bind', f'127.0.0.1:{self.port}',
+                '--log-level', 'warning',
+            ],
+            cwd=PROJECT_ROOT,
+            env=env,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise SystemExit('gunicorn exited during startup')
+            try:
+                status, _ = Client('127.0.0.1', self.port).request('GET', '/health/db', record=False)
+                if status == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        raise SystemExit('gunicorn did not become ready in 30s')
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class Client:
+    # One virtual user: a keep-alive connection and its own session cookie.
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.conn = None
+        self.cookie = None
+        self.samples = []
+        self.errors = 0
+
+    def request(self, method, path, form=None, json_body=None, label=None, record=True, headers=None):
+        headers = dict(headers or {})
+        body = None
+        if form is not None:
+            body = urllib.parse.urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            body = json.dumps(json_body)
+            headers['Content-Type'] = 'application/json'
+            headers['Accept'] = 'application/json'
+        if self.cookie:
+            headers['Cookie'] = f'session={self.cookie}'
+
+        started = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn = None
+            if record:
+                self.errors += 1
+            return None, b''
+        elapsed = time.perf_counter() - started
+
+        for header, value in response.getheaders():
+            if header.lower() == 'set-cookie':
+                match = _SESSION_COOKIE_RE.search(value)
+                if match:
+                    self.cookie = match.group(1) or None
+        if record:
+            if response.status >= 500:
+                self.errors += 1
+            self.samples.append((label or path.split('?')[0], elapsed))
+        return response.status, payload
+
+    def login(self, email):
+        status, _ = self.request('POST', '/login', form={'email': email, 'password': BENCH_PASSWORD}, record=False)
+        if status != 302:
+            raise SystemExit(f'login failed for {email} (status {status})')
+
+
+def _pick(rng, product_ids):
+    # Skewed towards the first (newest) products, like real traffic.
+    return product_ids[min(len(product_ids) - 1, int(rng.paretovariate(1.2)) - 1)]
+
+
+def scenario_browse(client, rng, context):
+    client.request('GET', '/')
+    client.request('GET', '/products')
+    client.request('GET', f"/products?sort={rng.choice(['price_asc', 'price_desc', 'name'])}", label='/products?sort')
+    status, payload = client.request('GET', '/products?format=json', label='/products?format=json')
+    if status == 200:
+        cursor = json.loads(payload).get('next_cursor')
+        if cursor:
+            client.request('GET', f'/products?cursor={urllib.parse.quote(cursor)}', label='/products?cursor')
+    term = urllib.parse.quote(rng.choice(SEARCH_TERMS))
+    client.request('GET', f'/products/search?q={term}', label='/products/search')
+
+
+def scenario_cart(client, rng, context):
+    for _ in range(rng.randint(3, 8)):
+        client.request(
+            'POST', '/cart/add',
+            json_body={'product_id': _pick(rng, context['product_ids']), 'quantity': 1},
+        )
+    client.request('GET', '/cart')
+
+
+def scenario_checkout(client, rng, context):
+    for _ in range(3):
+        client.request(
+            'POST', '/cart/add',
+            json_body={'product_id': _pick(rng, context['product_ids']), 'quantity': rng.randint(1, 3)},
+        )
+    status, payload = client.request('GET', '/cart')
+    match = _IDEMPOTENCY_RE.search(payload.decode('utf-8', 'replace')) if status == 200 else None
+    client.request('POST', '/checkout', form={'idempotency_key': match.group(1) if match else ''})
+
+
+def scenario_admin(client, rng, context):
+    client.request('GET', '/admin/products')
+    client.request('GET', '/admin/users')
+    client.request('GET', '/admin/users?q=bench', label='/admin/users?q')
+    client.request('GET', '/admin/products?offer=1', label='/admin/products?offer')
+
+
+SCENARIO_FUNCTIONS = {
+    'browse': scenario_browse,
+    'cart': scenario_cart,
+    'checkout': scenario_checkout,
+    'admin': scenario_admin,
+}
+
+
+def run_scenario(name, port, context, concurrency, duration, warmup, seed):
+    clients = [Client('127.0.0.1', port) for _ in range(concurrency)]
+    if name == 'checkout':
+        for client, email in zip(clients, context['shoppers']):
+            client.login(email)
+    elif name == 'admin':
+        for client in clients:
+            client.login(ADMIN_EMAIL)
+
+    run = SCENARIO_FUNCTIONS[name]
+    measuring = threading.Event()
+    stop = threading.Event()
+
+    def worker(index, client):
+        rng = random.Random(seed * 1000 + index)
+        while not stop.is_set():
+            if not measuring.is_set():
+                client.samples.clear()
+                client.errors = 0
+            run(client, rng, context)
+
+    threads = [threading.Thread(target=worker, args=(index, client), daemon=True) for index, client in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(warmup)
+
+    before = context['counters'].snapshot()
+    measuring.set()
+    started = time.perf_counter()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    after = context['counters'].snapshot()
+
+    samples = [sample for client in clients for sample in client.samples]
+    errors = sum(client.errors for client in clients)
+    return summarize(samples, errors, elapsed, before, after)
+
+
+def _latency_summary(latencies):
+    return {
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2),
+    }
+
+
+def summarize(samples, errors, elapsed, before, after):
+    if not samples:
+        return {'requests': 0, 'errors': errors}
+    latencies = [latency for _, latency in samples]
+    requests = len(samples)
+    result = {
+        'requests': requests,
+        'errors': errors,
+        'seconds': round(elapsed, 2),
+        'rps': round(requests / elapsed, 1),
+        **_latency_summary(latencies),
+        'db_transactions_per_request': round((after['xacts'] - before['xacts']) / requests, 2),
+        'db_queries_per_request': (
+            round((after['queries'] - before['queries']) / requests, 2)
+            if after['queries'] is not None else None
+        ),
+        'endpoints': {},
+    }
+    by_label = {}
+    for label, latency in samples:
+        by_label.setdefault(label, []).append(latency)
+    for label, values in sorted(by_label.items()):
+        result['endpoints'][label] = {'requests': len(values), **_latency_summary(values)}
+    return result
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path, encoding='utf-8') as handle:
+        baseline = json.load(handle)
+    regressions = []
+    print(f"\ncompared with {baseline_path} ({baseline['meta'].get('commit')}):")
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous or not previous.get('requests') or not current.get('requests'):
+            continue
+        rps_change = (current['rps'] - previous['rps']) / previous['rps'] * 100
+        p95_change = (current['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100
+        flags = []
+        if rps_change < -tolerance:
+            flags.append('rps')
+        if p95_change > tolerance:
+            flags.append('p95')
+        if flags:
+            regressions.append(name)
+        print(
+            f"  {name:<10} rps {previous['rps']:>8.1f} -> {current['rps']:>8.1f} ({rps_change:+.1f}%)  "
+            f"p95 {previous['p95_ms']:>7.1f} -> {current['p95_ms']:>7.1f}ms ({p95_change:+.1f}%)"
+            f"{'  REGRESSION' if flags else ''}"
+        )
+    return regressions
+
+
+def main():
+    load_dotenv(override=True)
+    parser = argparse.ArgumentParser(description='End-to-end load test of index:app under gunicorn.')
+    parser.add_argument('--initdb', action='store_true',
+                        help='Run against a disposable initdb cluster instead of DATABASE_URL.')
+    parser.add_argument('--pg-bin', help='Directory with initdb/pg_ctl (defaults to PATH).')
+    parser.add_argument('--generate', action='store_true',
+                        help='Load a synthetic dataset first (implied by --initdb).')
+    add_size_arguments(parser)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers')
+    parser.add_argument('--concurrency', type=int, default=16, help='virtual users per scenario')
+    parser.add_argument('--duration', type=float, default=20, help='measured seconds per scenario')
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--output', help='Results JSON (default: bench/results/load-<commit>-<time>.json)')
+    parser.add_argument('--compare', help='Earlier results JSON to compare against.')
+    parser.add_argument('--tolerance', type=float, default=10,
+                        help='Allowed %% drop in rps / rise in p95 before --compare fails.')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    postgres = DisposablePostgres(args.pg_bin) if args.initdb else None
+    server = None
+    counters = None
+    try:
+        if postgres:
+            print('starting disposable Postgres...')
+            database_url = postgres.start()
+            args.generate = True
+        else:
+            database_url = os.getenv('DATABASE_URL')
+            if not database_url:
+                raise SystemExit('DATABASE_URL is not set (or use --initdb)')
+
+        print('migrating and seeding...')
+        product_ids, shoppers = prepare_database(database_url, args, args.concurrency)
+        counters = DatabaseCounters(database_url)
+        port = _free_port()
+        server = AppServer(database_url, args.workers, port)
+        server.start()
+
+        context = {'product_ids': product_ids, 'shoppers': shoppers, 'counters': counters}
+        results = {
+            'meta': {
+                'commit': _git_commit(),
+                'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'host': platform.node(),
+                'cpus': os.cpu_count(),
+                'workers': args.workers,
+                'concurrency': args.concurrency,
+                'duration': args.duration,
+                'seed': args.seed,
+                'generated': sizes_from_args(args) if args.generate else None,
+                'disposable_db': bool(postgres),
+            },
+            'scenarios': {},
+        }
+
+        print(f"{'scenario':<10} {'reqs':>7} {'err':>4} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'xact/req':>9} {'q/req':>6}")
+        for name in scenarios:
+            result = run_scenario(name, port, context, args.concurrency, args.duration, args.warmup, args.seed)
+            results['scenarios'][name] = result
+            if not result.get('requests'):
+                print(f'{name:<10} no requests completed ({result["errors"]} errors)')
+                continue
+            queries = result['db_queries_per_request']
+            print(
+                f"{name:<10} {result['requests']:>7} {result['errors']:>4} {result['rps']:>8.1f} "
+                f"{result['p50_ms']:>6.1f}ms {result['p95_ms']:>6.1f}ms {result['p99_ms']:>6.1f}ms "
+                f"{result['db_transactions_per_request']:>9.2f} {queries if queries is not None else '-':>6}"
+            )
+    finally:
+        if server:
+            server.stop()
+        if counters:
+            counters.close()
+        if postgres:
+            postgres.stop()
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"load-{results['meta']['commit'] or 'nogit'}-{stamp}.json")
+    with open(output, 'w', encoding='utf-8') as handle:
+        json.dump(results, handle, indent=2, sort_keys=True)
+    print(f'\nresults written to {output}')
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            raise SystemExit(f"Regression beyond {args.tolerance}% in: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
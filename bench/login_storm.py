@@ -0,0 +1,131 @@
+import argparse
+import os
+import random
+import threading
+import time
+
+import bcrypt
+import psycopg2
+from dotenv import load_dotenv
+
+from generate_data import add_size_arguments
+from load_test import AppServer, Client, _free_port, _latency_summary, prepare_database
+
+_NO_THROTTLING = {'LOGIN_RATE_PER_IP': '0', 'LOGIN_RATE_PER_EMAIL': '0'}
+
+# (label, extra server environment, storm). The unbounded phase approximates
+# hashing inline in every request thread; the next one relies on the bounded
+# bcrypt executor alone.
+PHASES = (
+    ('baseline', {}, False),
+    ('storm, unbounded', dict(_NO_THROTTLING, BCRYPT_CONCURRENCY='64', BCRYPT_MAX_QUEUE='1000'), True),
+    ('storm, no throttling', _NO_THROTTLING, True),
+    ('storm, throttled', {}, True),
+)
+
+
+def _set_password_cost(database_url, emails, rounds):
+    # Shoppers are created with a cheap hash; the storm needs the production cost.
+    password_hash = bcrypt.hashpw(b'bench-password', bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+    conn = psycopg2.connect(database_url)
+    try:
+        with conn.cursor() as cur:
+            cur.execute('update public.users set password_hash = %s where email = any(%s)', (password_hash, emails))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_phase(port, product_ids, emails, args, storm):
+    stop = threading.Event()
+    measuring = threading.Event()
+    browse_clients = [Client('127.0.0.1', port) for _ in range(args.browsers)]
+    outcomes = {}
+    outcomes_lock = threading.Lock()
+
+    def browse(index, client):
+        rng = random.Random(args.seed * 1000 + index)
+        while not stop.is_set():
+            if not measuring.is_set():
+                client.samples.clear()
+            if rng.random() < 0.5:
+                client.request('GET', '/products', label='/products')
+            else:
+                client.request('GET', '/', label='/')
+
+    def attack(index):
+        rng = random.Random(args.seed * 2000 + index)
+        client = Client('127.0.0.1', port)
+        while not stop.is_set():
+            status, _ = client.request(
+                'POST', '/login',
+                form={'email': rng.choice(emails), 'password': f'wrong-{rng.random()}'},
+                record=False,
+            )
+            if measuring.is_set():
+                with outcomes_lock:
+                    outcomes[status] = outcomes.get(status, 0) + 1
+
+    threads = [threading.Thread(target=browse, args=(index, client), daemon=True)
+               for index, client in enumerate(browse_clients)]
+    if storm:
+        threads += [threading.Thread(target=attack, args=(index,), daemon=True) for index in range(args.attackers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    measuring.set()
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    stop.set()
+    elapsed = time.perf_counter() - started
+    for thread in threads:
+        thread.join(timeout=30)
+
+    latencies = [latency for client in browse_clients for _, latency in client.samples]
+    result = {'browse_requests': len(latencies), 'browse_rps': round(len(latencies) / elapsed, 1)}
+    if latencies:
+        result.update(_latency_summary(latencies))
+    result['login_attempts'] = {str(status): count for status, count in sorted(outcomes.items(), key=str)}
+    return result
+
+
+def main():
+    load_dotenv(override=True)
+    parser = argparse.ArgumentParser(description='Browsing latency while a login storm hits the app.')
+    parser.add_argument('--generate', action='store_true', help='Load a synthetic dataset first.')
+    add_size_arguments(parser)
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='threads per gunicorn worker')
+    parser.add_argument('--browsers', type=int, default=4, help='concurrent browsing users')
+    parser.add_argument('--attackers', type=int, default=16, help='concurrent login attackers')
+    parser.add_argument('--accounts', type=int, default=50, help='accounts the attackers cycle through')
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost of the attacked accounts')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--warmup', type=float, default=2)
+    args = parser.parse_args()
+
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        raise SystemExit('DATABASE_URL is not set')
+
+    product_ids, emails = prepare_database(database_url, args, args.accounts)
+    _set_password_cost(database_url, emails, args.rounds)
+
+    print(f"{'phase':<22} {'rps':>8} {'p50':>8} {'p95':>9} {'p99':>9}  login attempts by status")
+    for label, env, storm in PHASES:
+        port = _free_port()
+        server = AppServer(database_url, args.workers, port, threads=args.threads, env=env)
+        server.start()
+        try:
+            result = run_phase(port, product_ids, emails, args, storm)
+        finally:
+            server.stop()
+        attempts = ', '.join(f'{status}: {count}' for status, count in result['login_attempts'].items()) or '-'
+        print(
+            f"{label:<22} {result['browse_rps']:>8.1f} {result.get('p50_ms', 0):>6.1f}ms "
+            f"{result.get('p95_ms', 0):>7.1f}ms {result.get('p99_ms', 0):>7.1f}ms  {attempts}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+import argparse
+import datetime
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_PATH = os.path.join(PROJECT_ROOT, 'src')
+
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2.extras import RealDictCursor
+from werkzeug.datastructures import MultiDict
+
+from db.schema import detect_catalog_schema
+from generate_data import add_size_arguments, generate, sizes_from_args
+from services.admin_listing import (
+    PRODUCT_FLAGS,
+    USER_FLAGS,
+    fetch_admin_products,
+    fetch_admin_users,
+    parse_admin_args,
+)
+from services.catalog_feed import feed_query, tombstone_query
+from services.catalog_stats import fetch_best_sellers
+from services.product_listing import SORT_OPTIONS, fetch_listing_page, parse_listing_args
+
+LARGE_TABLES = ('products', 'product_categories', 'users', 'user_roles', 'orders', 'order_items', 'carts', 'cart_items')
+
+
+class PlanRecorder:
+    # Stands in for a cursor: every statement the app code runs is EXPLAINed
+    # instead of executed, so the check follows the real query builders.
+    def __init__(self, cur):
+        self.cur = cur
+        self.plans = []
+        self._passthrough = False
+
+    def execute(self, sql, params=None):
+        self._passthrough = sql.lstrip().lower().startswith('explain')
+        if self._passthrough:
+            self.cur.execute(sql, params)
+            return
+        self.cur.execute(f'explain (format json) {sql}', params)
+        self.plans.append(next(iter(self.cur.fetchone().values()))[0]['Plan'])
+
+    def fetchone(self):
+        return self.cur.fetchone() if self._passthrough else None
+
+    def fetchall(self):
+        return self.cur.fetchall() if self._passthrough else []
+
+
+def _nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _nodes(child)
+
+
+def hot_queries(cur, schema):
+    cur.execute('select id, created_at from public.products order by created_at desc, id desc offset 100 limit 1')
+    product = cur.fetchone()
+    cur.execute('select id, email, created_at from public.users order by created_at desc, id desc offset 100 limit 1')
+    user = cur.fetchone()
+    cur.execute('select id from public.products order by id limit 20')
+    cart_ids = [str(row['id']) for row in cur.fetchall()]
+
+    queries = []
+    for sort in SORT_OPTIONS:
+        queries.append((f'/products sort={sort}', lambda rec, sort=sort: fetch_listing_page(
+            rec, schema, parse_listing_args(MultiDict({'sort': sort})))))
+    queries.append(('/products offers', lambda rec: fetch_listing_page(
+        rec, schema, parse_listing_args(MultiDict({'offers': '1'})))))
+
+    if product:
+        _, cursor = fetch_listing_page(cur, schema, parse_listing_args(MultiDict({'limit': '5'})))
+        queries.append(('/products next page', lambda rec: fetch_listing_page(
+            rec, schema, parse_listing_args(MultiDict({'cursor': cursor}))) if cursor else None))
+
+    queries.append(('cart price lookup', lambda rec: rec.execute(
+        schema.products_by_ids_sql, (schema.coerce_ids(cart_ids),))))
+
+    for flags, label in (({}, ''), ({'active': '1'}, ' active'), ({'offer': '1'}, ' on offer')):
+        queries.append((f'/admin/products{label}', lambda rec, flags=flags: fetch_admin_products(
+            rec, parse_admin_args(MultiDict(flags), PRODUCT_FLAGS))))
+    for flags, label in (({}, ''), ({'admin': '1'}, ' admins')):
+        queries.append((f'/admin/users{label}', lambda rec, flags=flags: fetch_admin_users(
+            rec, parse_admin_args(MultiDict(flags), USER_FLAGS))))
+
+    if user:
+        queries.append(('login by email', lambda rec: rec.execute(
+            'select id, password_hash, full_name from public.users where email = %s and is_active = true',
+            (user['email'],),
+        )))
+        queries.append(('admin role check', lambda rec: rec.execute(
+            """
+            select 1
+            from public.user_roles ur
+            join public.roles r on r.id = ur.role_id
+            where ur.user_id = %s and r.name = 'admin'
+            """,
+            (user['id'],),
+        )))
+        queries.append(('orders by user', lambda rec: rec.execute(
+            'select id from public.orders where user_id = %s order by created_at desc limit 20',
+            (user['id'],),
+        )))
+        if schema.has_carts:
+            queries.append(('stored cart lines', lambda rec: rec.execute(schema.cart_lines_sql, (user['id'],))))
+    if schema.has_column('updated_at') and schema.has_tombstones:
+        since = datetime.datetime.now(datetime.timezone.utc)
+        queries.append(('/api/products since', lambda rec: rec.execute(*feed_query(schema, since))))
+        queries.append(('/api/products since deletes', lambda rec: rec.execute(*tombstone_query(since))))
+    if schema.has_catalog_stats:
+        cur.execute('select c.name from public.categories c order by c.name limit 1')
+        category = cur.fetchone()
+        queries.append(('best sellers', lambda rec: fetch_best_sellers(rec, schema)))
+        if category:
+            queries.append(('best sellers by category', lambda rec: fetch_best_sellers(
+                rec, schema, category['name'])))
+    if 'idempotency_key' in schema.order_columns:
+        queries.append(('checkout idempotency lookup', lambda rec: rec.execute(
+            'select id from public.orders where idempotency_key = %s and user_id = %s',
+            ('x' * 32, user['id'] if user else None),
+        )))
+    return queries
+
+
+def main():
+    load_dotenv(override=True)
+    parser = argparse.ArgumentParser(
+        description='Fail if a hot query plan uses a sequential scan on a large table.'
+    )
+    parser.add_argument('--generate', action='store_true',
+                        help='Load a synthetic dataset first (rolled back at the end).')
+    add_size_arguments(parser, default_preset='medium')
+    parser.add_argument('--min-rows', type=int, default=10000,
+                        help='Sequential scans on tables smaller than this are allowed.')
+    args = parser.parse_args()
+
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        raise SystemExit('DATABASE_URL is not set')
+
+    conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    failures = []
+    try:
+        with conn.cursor() as cur:
+            if args.generate:
+                generate(cur, sizes_from_args(args), args.seed)
+            schema = detect_catalog_schema(cur)
+            cur.execute(
+                'select relname, reltuples::bigint as rows from pg_class where oid = any(%s::regclass[])',
+                ([f'public.{table}' for table in LARGE_TABLES],),
+            )
+            sizes = {row['relname']: row['rows'] for row in cur.fetchall()}
+            print('table rows (estimated): ' + ', '.join(f'{name}={rows}' for name, rows in sorted(sizes.items())))
+
+            for label, run in hot_queries(cur, schema):
+                recorder = PlanRecorder(cur)
+                run(recorder)
+                scans = sorted({
+                    node['Relation Name']
+                    for plan in recorder.plans
+                    for node in _nodes(plan)
+                    if node['Node Type'] == 'Seq Scan' and sizes.get(node.get('Relation Name'), 0) >= args.min_rows
+                })
+                cost = sum(plan['Total Cost'] for plan in recorder.plans)
+                status = f"SEQ SCAN on {', '.join(scans)}" if scans else 'ok'
+                print(f'{label:<32} cost={cost:>12.1f}  {status}')
+                if scans:
+                    failures.append(label)
+    finally:
+        conn.rollback()
+        conn.close()
+
+    if failures:
+        raise SystemExit(f'{len(failures)} hot query plan(s) fall back to a sequential scan')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_PATH = os.path.join(PROJECT_ROOT, 'src')
+TEMPLATES_PATH = os.path.join(SRC_PATH, 'templates')
+
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+# Every card of the largest catalog has to fit for the warm pass.
+os.environ.setdefault('CARD_CACHE_SIZE', '1000000')
+os.environ['JINJA_BYTECODE_CACHE'] = '0'
+
+from flask import Flask
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+from services.records import product_from_row
+from services.rendering import card_cache, init_rendering
+
+CATEGORIES = ['Frutas', 'Verduras', 'Lácteos', 'Carniceria', 'Panadería', 'Congelados', 'Bebidas']
+# Templates a worker compiles to serve its first home and /products requests.
+COLD_START_TEMPLATES = (
+    'layout/base.html', 'partials/_header.html', 'partials/_footer.html',
+    'main/index.html', 'main/_body.html', 'main/_components/products.html', 'main/_components/extra.html',
+    'menu/index.html', 'menu/_body.html', 'menu/_components/product_cards.html',
+    'partials/_product_card.html', 'macros/ui/badge.html',
+)
+
+# The per-product loop the cards template used before cards were cached.
+LOOP_TEMPLATE = """{% from 'macros/ui/badge.html' import badge %}
+{% for product in products %}
+<article
+  class="product-card product-card--menu"
+  data-product-item
+  data-name="{{ product.name }}"
+  data-category="{{ product.category }}"
+  data-offer="{{ 'on' if product.is_on_offer else 'off' }}"
+  data-price="{{ product.offer_price if product.is_on_offer else product.price }}"
+>
+  <div class="product-card__badges">
+    {{ badge(product.category, product.category) }} {% if
+    product.is_on_offer %} {{ badge('Oferta', 'oferta') }} {% endif %}
+  </div>
+  <div class="product-card__media">
+    <img src="{{ product.image_url }}" alt="{{ product.name }}" />
+  </div>
+  <div class="product-card__body">
+    <h3 class="product-card__title">{{ product.name }}</h3>
+    <p class="product-card__meta">{{ product.cantity }}</p>
+  </div>
+  <div class="product-card__footer">
+    <div class="product-card__price">
+      {% if product.is_on_offer %}
+      <p class="price">${{ product.offer_price }}</p>
+      <p class="price--offer">${{ product.price }}</p>
+      {% else %}
+      <p class="price">${{ product.price }}</p>
+      {% endif %}
+    </div>
+    <button class="add-to-cart" data-product-id="{{ product.id }}">
+      Agregar
+    </button>
+  </div>
+</article>
+{% endfor %}"""
+
+
+def build_products(size, seed):
+    rng = random.Random(seed)
+    products = []
+    for index in range(size):
+        on_offer = rng.random() < 0.1
+        price = round(rng.uniform(0.5, 80), 2)
+        products.append(product_from_row({
+            'id': f'{rng.getrandbits(128):032x}',
+            'name': f'Producto {index}',
+            'category': rng.choice(CATEGORIES),
+            'description': 'Cantidad: 1 u',
+            'price': price,
+            'image_url': f'/static/img/products/{index}.webp',
+            'is_on_offer': on_offer,
+            'offer_price': round(price * 0.8, 2) if on_offer else 0,
+        }))
+    return products
+
+
+def _environment(bytecode_cache=None):
+    return Environment(
+        loader=FileSystemLoader(TEMPLATES_PATH),
+        autoescape=select_autoescape(),
+        bytecode_cache=bytecode_cache,
+    )
+
+
+def compile_times(rounds):
+    # A fresh environment per round is a fresh worker: nothing compiled in memory.
+    def cold_start(bytecode_cache):
+        started = time.perf_counter()
+        env = _environment(bytecode_cache)
+        for name in COLD_START_TEMPLATES:
+            env.get_template(name)
+        return time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = FileSystemBytecodeCache(directory)
+        cold_start(cache)
+        source = min(cold_start(None) for _ in range(rounds))
+        cached = min(cold_start(cache) for _ in range(rounds))
+    return source, cached
+
+
+def _timed(render):
+    started = time.perf_counter()
+    html = render()
+    return time.perf_counter() - started, len(html)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Template compile and product card render times.')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='comma-separated product counts')
+    parser.add_argument('--rounds', type=int, default=5, help='cold starts per compile measurement')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    source, cached = compile_times(args.rounds)
+    print(f'cold start, {len(COLD_START_TEMPLATES)} templates: {source * 1000:.1f}ms from source, '
+          f'{cached * 1000:.1f}ms from the bytecode cache')
+
+    app = Flask(__name__, template_folder=TEMPLATES_PATH)
+    init_rendering(app)
+    loop = app.jinja_env.from_string(LOOP_TEMPLATE)
+    cards = app.jinja_env.from_string("{{ product_cards(products, 'menu') }}")
+
+    print(f"\n{'products':>9} {'jinja loop':>11} {'cards cold':>11} {'cards warm':>11} {'per card warm':>14} {'MB':>6}")
+    for size in [int(size) for size in args.sizes.split(',') if size.strip()]:
+        products = build_products(size, args.seed)
+        card_cache.invalidate()
+        loop_seconds, _ = _timed(lambda: loop.render(products=products))
+        cold_seconds, _ = _timed(lambda: cards.render(products=products))
+        warm_seconds, length = _timed(lambda: cards.render(products=products))
+        print(
+            f'{size:>9,} {loop_seconds * 1000:>9.1f}ms {cold_seconds * 1000:>9.1f}ms {warm_seconds * 1000:>9.1f}ms '
+            f'{warm_seconds / size * 1e6:>12.2f}us {length / 1e6:>6.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
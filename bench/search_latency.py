@@ -0,0 +1,97 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_PATH = os.path.join(PROJECT_ROOT, 'src')
+
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from services.search import SearchIndex
+
+WORDS = [
+    'leche', 'queso', 'yogur', 'pan', 'arroz', 'pollo', 'carne', 'manzana', 'pera',
+    'plátano', 'piña', 'jugo', 'agua', 'café', 'té', 'azúcar', 'sal', 'aceite',
+    'harina', 'huevos', 'tomate', 'cebolla', 'papa', 'zanahoria', 'galletas',
+    'cereal', 'mantequilla', 'jamón', 'salchicha', 'limón',
+]
+BRANDS = [
+    'la', 'granja', 'del', 'valle', 'sol', 'dorado', 'campo', 'fresco', 'rico',
+    'natural', 'premium', 'casa', 'norte', 'sur', 'vida', 'sana', 'oro', 'verde',
+]
+CATEGORIES = ['Frutas', 'Verduras', 'Lácteos', 'Carniceria', 'Panadería', 'Congelados', 'Bebidas']
+QUERIES = [
+    'lacteos', 'leche', 'lech', 'ar', 'cafe', 'pina dorado', 'manzana sol',
+    'qeuso', 'lehce granja', 'jamon del valle', 'azucar', 'zanahoria verde',
+]
+
+
+def build_catalog(size, seed):
+    rng = random.Random(seed)
+    products = []
+    for index in range(size):
+        name = ' '.join([
+            rng.choice(WORDS),
+            rng.choice(BRANDS),
+            rng.choice(BRANDS),
+            f'{rng.randint(1, 999)}g',
+        ]).title()
+        products.append({
+            'id': str(index),
+            'name': name,
+            'category': rng.choice(CATEGORIES),
+            'price': round(rng.uniform(0.5, 50), 2),
+        })
+    return products
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Typeahead latency of the in-memory product search index.')
+    parser.add_argument('--size', type=int, default=100_000)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    products = build_catalog(args.size, args.seed)
+    index = SearchIndex()
+
+    started = time.perf_counter()
+    index.sync(products)
+    print(f'build: {len(index)} products in {time.perf_counter() - started:.2f}s')
+
+    # A fresh snapshot with 1% of the rows renamed exercises the incremental path.
+    changed = [dict(product) for product in products]
+    for product in changed[:: max(1, args.size // 1000)]:
+        product['name'] = product['name'] + ' Nuevo'
+    started = time.perf_counter()
+    index.sync(changed)
+    print(f'incremental sync: {time.perf_counter() - started:.3f}s')
+
+    samples = []
+    for _ in range(args.rounds):
+        for query in QUERIES:
+            started = time.perf_counter()
+            index.search(query, limit=10)
+            samples.append((time.perf_counter() - started) * 1000)
+
+    print(
+        f'queries: {len(samples)}  '
+        f'p50={statistics.median(samples):.2f}ms  '
+        f'p95={percentile(samples, 95):.2f}ms  '
+        f'p99={percentile(samples, 99):.2f}ms  '
+        f'max={max(samples):.2f}ms'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,70 @@
 import os
 import json
-import bcrypt
 import re
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from flask import Flask, render_template, request, redirect, url_for, session
-from middleware.admin import build_admin_required, get_admin_role_id, is_admin as is_admin_user
+from flask import Flask, Response, g, make_response, render_template, request, redirect, url_for, session
+from middleware.admin import (
+    build_admin_required,
+    get_admin_role_id,
+    invalidate_user_roles,
+    is_admin as is_admin_user,
+)
+from db.pool import get_pool, pool_stats
+from db.migrate import db_cli
+from db.schema import get_catalog_schema, invalidate_catalog_schema
+from services.admin_listing import (
+    PRODUCT_FLAGS,
+    USER_FLAGS,
+    admin_query_args,
+    fetch_admin_products,
+    fetch_admin_users,
+    parse_admin_args,
+)
+from services.assets import init_assets
+from services.cache import cache_stats
+from services.carts import (
+    ADD,
+    SET,
+    apply_cart_changes,
+    apply_to_session_cart,
+    cart_quantity,
+    clear_cart,
+    fetch_cart_lines,
+    fold_changes,
+)
+from services.catalog import get_catalog, invalidate_catalog
+from services.catalog_feed import FeedError, parse_format, parse_since, prepare_feed, prune_tombstones, stream_feed
+from services.catalog_io import catalog_cli
+from services.catalog_stats import (
+    cached_best_sellers,
+    cached_category_facets,
+    fetch_best_sellers,
+    fetch_category_facets,
+    invalidate_stats,
+    product_category_ids,
+    refresh_category_facets,
+    sync_category_sales,
+)
+from services.checkout import find_order, new_idempotency_key, normalize_idempotency_key, place_order
+from services.metrics import init_metrics
+from services.passwords import PasswordHasherBusy, check_password, hash_password, needs_rehash
+from services.page_cache import (
+    SHARED_MAX_AGE,
+    cached_fragment,
+    cached_value,
+    catalog_state_version,
+    catalog_version,
+    page_etag,
+)
+from services.pricing import get_price_rows, invalidate_prices, price_line, remember_price_rows, unit_price
+from services.product_listing import fetch_listing_page, listing_query_args, parse_listing_args
+from services.profiler import init_profiler, profiler_report
+from services.records import product_from_row
+from services.rendering import init_rendering
+from services.search import search_products
+from services.sessions import init_sessions
+from services.throttle import email_limiter, ip_limiter, throttle_stats
 from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
 from decimal import Decimal
 # from livereload import Server
 
@@ -14,33 +72,24 @@ load_dotenv(override=True)
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'dev-secret-key')
+# Behind a reverse proxy (e.g. Render) set this to the number of proxies so
+# login throttling sees the client address instead of the proxy's.
+_trusted_proxies = int(os.getenv('TRUSTED_PROXY_COUNT', '0') or 0)
+if _trusted_proxies:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=_trusted_proxies, x_proto=_trusted_proxies)
+init_assets(app)
+init_rendering(app)
+init_metrics(app)
+init_sessions(app)
+init_profiler(app)
+app.cli.add_command(catalog_cli)
+app.cli.add_command(db_cli)
 
 
 def get_db_connection():
-    database_url = os.getenv('DATABASE_URL')
-    if not database_url:
-        raise RuntimeError('DATABASE_URL is not set')
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
-
-
-def _normalize_cantity(description):
-    if not description:
-        return ''
-    prefix = 'Cantidad:'
-    if description.startswith(prefix):
-        return description[len(prefix):].strip()
-    return description
-
-
-def _get_products_columns(cur):
-    cur.execute(
-        """
-        select column_name
-        from information_schema.columns
-        where table_schema = 'public' and table_name = 'products'
-        """
-    )
-    return {row.get('column_name') for row in cur.fetchall()}
+    # Borrows a pooled connection; leaving the `with` block commits (or rolls back
+    # on error) and always hands the connection back to the pool.
+    return get_pool().connection()
 
 
 def _normalize_product_id(value):
@@ -53,95 +102,36 @@ def _normalize_product_id(value):
     return normalized
 
 
-def load_products():
+def _query_products():
     with get_db_connection() as conn:
         with conn.cursor() as cur:
-            product_columns = _get_products_columns(cur)
-
-            description_sql = 'p.description' if 'description' in product_columns else 'null::text as description'
-            price_sql = 'p.price' if 'price' in product_columns else '0::numeric as price'
-            image_url_sql = 'p.image_url' if 'image_url' in product_columns else 'null::text as image_url'
-            is_on_offer_sql = 'p.is_on_offer' if 'is_on_offer' in product_columns else 'false as is_on_offer'
-            offer_price_sql = 'p.offer_price' if 'offer_price' in product_columns else '0::numeric as offer_price'
-            where_active_sql = 'where p.is_active = true' if 'is_active' in product_columns else ''
-            order_by_sql = 'order by p.created_at desc, p.name asc' if 'created_at' in product_columns else 'order by p.name asc'
-
-            cur.execute(
-                """
-                select
-                    to_regclass('public.product_categories') is not null as has_product_categories,
-                    to_regclass('public.categories') is not null as has_categories
-                """
-            )
-            schema_flags = cur.fetchone() or {}
-
-            has_category_tables = bool(
-                schema_flags.get('has_product_categories')
-                and schema_flags.get('has_categories')
-            )
-
-            if has_category_tables:
-                cur.execute(
-                    f"""
-                    select
-                        p.id,
-                        p.name,
-                        {description_sql},
-                        {price_sql},
-                        {image_url_sql},
-                        {is_on_offer_sql},
-                        {offer_price_sql},
-                        c.name as category
-                    from public.products p
-                    left join public.product_categories pc
-                        on pc.product_id = p.id
-                    left join public.categories c
-                        on c.id = pc.category_id
-                    {where_active_sql}
-                    {order_by_sql}
-                    """
-                )
-            else:
-                cur.execute(
-                    f"""
-                    select
-                        p.id,
-                        p.name,
-                        {description_sql},
-                        {price_sql},
-                        {image_url_sql},
-                        {is_on_offer_sql},
-                        {offer_price_sql},
-                        null::text as category
-                    from public.products p
-                    {where_active_sql}
-                    {order_by_sql}
-                    """
-                )
-
+            schema = get_catalog_schema(cur)
+            state = None
+            if schema.catalog_state_sql:
+                # Read before the rows: a change landing in between gives the
+                # next reload a new version instead of being hidden under this one.
+                cur.execute(schema.catalog_state_sql)
+                state = cur.fetchone()
+            cur.execute(schema.products_sql)
             rows = cur.fetchall()
 
-        products = []
-        for row in rows:
-                products.append({
-                        'id': str(row.get('id')),
-                        'name': row.get('name'),
-                        'category': row.get('category') or 'Sin categoria',
-                        'price': float(row.get('price') or 0),
-                        'cantity': _normalize_cantity(row.get('description')),
-                        'image_url': row.get('image_url'),
-                        'is_on_offer': bool(row.get('is_on_offer')),
-                        'offer_price': float(row.get('offer_price') or 0),
-                })
-        return {'Products': products}
+    products = tuple(product_from_row(row) for row in rows)
+    if state is None:
+        version = catalog_version(products)
+    else:
+        version = catalog_state_version(state['row_count'], state['last_updated'])
+    return {'Products': products, 'version': version}
 
 
-def _hash_password(password):
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+def load_products():
+    # The snapshot is shared between requests, so callers must treat it as read-only.
+    return get_catalog(_query_products)
 
 
-def _check_password(password, password_hash):
-    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+def _wants_json():
+    if request.args.get('format') == 'json':
+        return True
+    return request.accept_mimetypes.best == 'application/json'
 
 
 def _is_valid_email(email):
@@ -158,6 +148,23 @@ def _slugify(value):
 admin_required = build_admin_required(get_db_connection)
 
 
+def _catalog_changed(product_id=None):
+    invalidate_catalog()
+    invalidate_prices(product_id)
+    invalidate_stats()
+
+
+def _refresh_product_stats(cur, product_id, category_ids):
+    # Call after changing a product, with the categories it had before.
+    schema = get_catalog_schema(cur)
+    if not schema.has_catalog_stats:
+        return
+    if product_id is not None:
+        sync_category_sales(cur, product_id)
+        category_ids = set(category_ids) | product_category_ids(cur, product_id)
+    refresh_category_facets(cur, schema, category_ids)
+
+
 def _get_cart():
     cart = session.get('cart')
     if not isinstance(cart, dict):
@@ -169,6 +176,13 @@ def _save_cart(cart):
     session['cart'] = cart
 
 
+def _rotate_session():
+    # Server-side sessions get a new id on login; the cookie backend has none.
+    regenerate = getattr(session, 'regenerate', None)
+    if regenerate:
+        regenerate()
+
+
 def _fetch_products_by_ids(product_ids):
     normalized_ids = [
         normalized
@@ -180,100 +194,321 @@ def _fetch_products_by_ids(product_ids):
         return []
     with get_db_connection() as conn:
         with conn.cursor() as cur:
-            product_columns = _get_products_columns(cur)
-
-            price_sql = 'p.price' if 'price' in product_columns else '0::numeric as price'
-            image_url_sql = 'p.image_url' if 'image_url' in product_columns else 'null::text as image_url'
-            is_on_offer_sql = 'p.is_on_offer' if 'is_on_offer' in product_columns else 'false as is_on_offer'
-            offer_price_sql = 'p.offer_price' if 'offer_price' in product_columns else '0::numeric as offer_price'
-
-            cur.execute(
-                f"""
-                select
-                  p.id,
-                  p.name,
-                  {price_sql},
-                  {image_url_sql},
-                  {is_on_offer_sql},
-                  {offer_price_sql}
-                from public.products p
-                                where p.id::text = any(%s::text[])
-                """,
-                                (normalized_ids,),
-            )
+            schema = get_catalog_schema(cur)
+            typed_ids = schema.coerce_ids(normalized_ids)
+            if not typed_ids:
+                return []
+            cur.execute(schema.products_by_ids_sql, (typed_ids,))
             return cur.fetchall()
 
 
-def _build_cart_snapshot(cart):
+def _session_cart_lines(cart, revalidate=False):
     product_ids = list(cart.keys())
-    rows = _fetch_products_by_ids(product_ids)
-    items = []
-    subtotal = Decimal('0')
+    if revalidate:
+        # Checkout prices from the database, never from the cache.
+        rows = remember_price_rows(_fetch_products_by_ids(product_ids), product_ids)
+    else:
+        rows = get_price_rows(product_ids, _fetch_products_by_ids)
 
-    for row in rows:
-        product_id = str(row.get('id'))
+    lines = []
+    for product_id in product_ids:
+        row = rows.get(product_id)
         qty = int(cart.get(product_id, 0))
-        if qty <= 0:
-            continue
-        is_on_offer = bool(row.get('is_on_offer'))
-        offer_price = Decimal(str(row.get('offer_price') or 0))
-        price = Decimal(str(row.get('price') or 0))
-        unit_price = offer_price if is_on_offer and offer_price > 0 else price
-        line_total = unit_price * qty
-        subtotal += line_total
-        items.append({
-            'id': product_id,
-            'name': row.get('name'),
-            'image_url': row.get('image_url'),
-            'quantity': qty,
-            'unit_price': float(unit_price),
-            'line_total': float(line_total),
-        })
+        if row is not None and qty > 0:
+            lines.append((row, qty))
+    return lines
 
-    return items, float(subtotal)
 
+def _cart_lines(changes=None, revalidate=False, priced=True):
+    # Applies `changes` (see services.carts) and returns the cart as
+    # (price row, quantity) lines. Signed-in users' carts live in the database
+    # and come back already joined with current prices; anonymous carts live in
+    # the session. With priced=False a session cart is only updated.
+    user_id = session.get('user_id')
+    if user_id:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                schema = get_catalog_schema(cur)
+                if schema.has_carts:
+                    leftover = _get_cart()
+                    if leftover:
+                        # Session cart of a user signed in before carts were stored.
+                        apply_cart_changes(cur, schema, user_id, _session_cart_changes(leftover))
+                    if changes:
+                        apply_cart_changes(cur, schema, user_id, changes)
+                    lines = fetch_cart_lines(cur, schema, user_id)
+        if schema.has_carts:
+            session.pop('cart', None)
+            _remember_cart_count(sum(qty for _, qty in lines))
+            return lines
 
-def _cart_payload(cart):
-    items, subtotal = _build_cart_snapshot(cart)
-    item_map = {item['id']: item for item in items}
-    cart_count = sum(int(qty) for qty in cart.values()) if cart else 0
-    return items, subtotal, item_map, cart_count
+    cart = _get_cart()
+    if changes:
+        cart = apply_to_session_cart(cart, changes)
+        _save_cart(cart)
+    return _session_cart_lines(cart, revalidate) if priced else None
 
 
-@app.context_processor
-def inject_globals():
+def _remember_cart_count(count):
+    # Header badge for stored carts, so catalog pages need no cart query.
+    if session.get('cart_count') != count:
+        session['cart_count'] = count
+
+
+def _session_cart_changes(cart):
+    return {product_id: (ADD, int(qty)) for product_id, qty in cart.items() if int(qty) > 0}
+
+
+def _merge_session_cart(user_id):
+    # On login the anonymous cart is added into the stored one in a single
+    # statement; quantities of products in both add up.
     cart = _get_cart()
-    cart_count = sum(int(qty) for qty in cart.values()) if cart else 0
-    is_admin = False
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            schema = get_catalog_schema(cur)
+            if not schema.has_carts:
+                return
+            if cart:
+                apply_cart_changes(cur, schema, user_id, _session_cart_changes(cart))
+            count = cart_quantity(cur, user_id)
+    session.pop('cart', None)
+    _remember_cart_count(count)
+
+
+def _build_cart_snapshot(lines):
+    items = []
+    subtotal = Decimal('0')
+    for row, qty in lines:
+        item, line_total = price_line(row, qty)
+        subtotal += line_total
+        items.append(item)
+    return items, float(subtotal)
+
+
+def _cart_payload(lines, product_ids):
+    # Only the touched lines are priced in full; the other lines just add their
+    # unit price to the subtotal.
+    touched = set(product_ids)
+    item_map = {}
+    subtotal = Decimal('0')
+    for row, qty in lines:
+        line_id = str(row.get('id'))
+        if line_id in touched:
+            item, line_total = price_line(row, qty)
+            item_map[line_id] = item
+        else:
+            line_total = unit_price(row) * qty
+        subtotal += line_total
+
+    cart_count = sum(qty for _, qty in lines)
+    return item_map, float(subtotal), cart_count
+
+
+def _header_context():
+    # Per-request header data (cart badge, user, admin link); everything else on
+    # the catalog pages is shared between users.
+    if '_header_context' in g:
+        return g._header_context
     user_id = session.get('user_id')
+    if user_id and 'cart_count' in session:
+        cart_count = session['cart_count']
+    else:
+        cart = _get_cart()
+        cart_count = sum(int(qty) for qty in cart.values()) if cart else 0
+    is_admin = False
     if user_id:
         is_admin = is_admin_user(user_id, get_db_connection)
-        session['is_admin'] = is_admin
-    return {
+        # Only touch the session when the flag changes so the cookie is not re-sent.
+        if session.get('is_admin') != is_admin:
+            session['is_admin'] = is_admin
+    g._header_context = {
         'cart_count': cart_count,
         'user_name': session.get('user_name'),
         'is_admin': is_admin,
     }
+    return g._header_context
+
+
+@app.context_processor
+def inject_globals():
+    return _header_context()
+
+
+def _catalog_page(version, render, negotiated=False):
+    # negotiated: the view picks JSON or HTML from the Accept header, so the
+    # representation is part of the ETag and caches must key on Accept.
+    header = _header_context()
+    representation = 'json' if negotiated and _wants_json() else 'html'
+    etag = page_etag(version, request.full_path, representation, sorted(header.items()))
+
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag, weak=True)
+
+    if session.get('user_id') or header['cart_count']:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    else:
+        response.headers['Cache-Control'] = f'public, max-age=0, s-maxage={SHARED_MAX_AGE}'
+    response.vary.add('Cookie')
+    if negotiated:
+        response.vary.add('Accept')
+    return response
+
 
 @app.route('/')
 def index():
-    data_del_json = load_products()
-    return render_template('main/index.html', products=data_del_json)
+    catalog = load_products()
+    best_sellers = _best_sellers()
+    # Rankings change with orders, not with the catalog.
+    version = (catalog['version'], catalog_version(best_sellers))
+
+    def render():
+        body = cached_fragment(
+            ('main/_body.html',) + version,
+            lambda: render_template('main/_body.html', products=catalog, best_sellers=best_sellers),
+        )
+        return render_template('main/index.html', page_body=body)
+
+    return _catalog_page(version, render)
+
+
+def _best_sellers(category=None):
+    def load():
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                schema = get_catalog_schema(cur)
+                if not schema.has_catalog_stats:
+                    return ()
+                rows = fetch_best_sellers(cur, schema, category)
+        return tuple(product_from_row(row) for row in rows)
+
+    return cached_best_sellers(load, category)
+
+
+def _category_facets(catalog):
+    def load():
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                schema = get_catalog_schema(cur)
+                if schema.has_catalog_stats:
+                    return fetch_category_facets(cur)
+        # Before migration 0007: derived from the catalog snapshot.
+        names = sorted({product.category for product in catalog['Products'] if product.category})
+        return [{'name': name, 'product_count': None} for name in names]
+
+    return cached_category_facets(load)
+
+
+def _load_listing_page(filters):
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            schema = get_catalog_schema(cur)
+            rows, next_cursor = fetch_listing_page(cur, schema, filters)
+    return {'Products': [product_from_row(row) for row in rows]}, next_cursor
 
 
 @app.route('/products')
 def menu():
-    data_del_json = load_products()
-    categories = sorted({
-        product.get('category')
-        for product in data_del_json.get('Products', [])
-        if product.get('category')
-    })
-    return render_template(
-        'menu/index.html',
-        products=data_del_json,
-        categories=categories,
-    )
+    filters = parse_listing_args(request.args)
+    filter_args = listing_query_args(filters)
+    catalog = load_products()
+    version = catalog['version']
+    page_key = (version, tuple(sorted(filter_args.items())), filters['cursor'])
+
+    if _wants_json():
+        def build_json():
+            page, next_cursor = _load_listing_page(filters)
+            return {
+                'status': 'ok',
+                'products': page['Products'],
+                'next_cursor': next_cursor,
+                'html': render_template('menu/_components/product_cards.html', products=page),
+            }
+
+        return _catalog_page(version, lambda: cached_value(('menu.json',) + page_key, build_json), negotiated=True)
+
+    def render_body():
+        page, next_cursor = _load_listing_page(filters)
+        return render_template(
+            'menu/_body.html',
+            products=page,
+            categories=_category_facets(catalog),
+            filters=filters,
+            filter_args=filter_args,
+            next_cursor=next_cursor,
+        )
+
+    def render():
+        body = cached_fragment(('menu/_body.html',) + page_key, render_body)
+        return render_template('menu/index.html', page_body=body)
+
+    return _catalog_page(version, render, negotiated=True)
+
+
+@app.route('/products/search')
+def product_search():
+    query = (request.args.get('q') or '').strip()[:100]
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), 50))
+    except (TypeError, ValueError):
+        limit = 10
+
+    results = []
+    if query:
+        results = search_products(query, load_products().get('Products', []), limit=limit)
+    return {
+        'status': 'ok',
+        'query': query,
+        'results': results,
+    }
+
+
+@app.route('/api/products')
+def api_products():
+    try:
+        since = parse_since(request.args.get('since'))
+        fmt = parse_format(request.args.get('format'))
+        query, params, tombstones, next_since = prepare_feed(since)
+    except FeedError as exc:
+        return {'status': 'error', 'message': str(exc)}, exc.status
+
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    response = Response(stream_feed(query, params, next_since, fmt, tombstones=tombstones), mimetype=mimetype)
+    response.headers['X-Next-Since'] = next_since
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@app.route('/products/best-sellers')
+def product_best_sellers():
+    category = (request.args.get('category') or '').strip() or None
+    return {
+        'status': 'ok',
+        'category': category,
+        'products': list(_best_sellers(category)),
+    }
+
+
+def _too_many_attempts(template, retry_after, **context):
+    response = make_response(render_template(
+        template,
+        error=f'Demasiados intentos. Prueba de nuevo en {retry_after} s.',
+        **context,
+    ), 429)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+@app.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(exc):
+    if _wants_json():
+        response = make_response({'status': 'error', 'message': 'Servidor ocupado, intenta de nuevo.'}, 503)
+    else:
+        response = make_response('Servidor ocupado, intenta de nuevo en unos segundos.', 503)
+    response.headers['Retry-After'] = '1'
+    return response
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -308,6 +543,12 @@ def login():
             next_url=next_url,
         )
 
+    # Floods are turned away here, before any database or bcrypt work.
+    retry_after = max(ip_limiter.retry_after(request.remote_addr), email_limiter.retry_after(email))
+    if retry_after:
+        return _too_many_attempts('auth/login.html', retry_after, email=email, next_url=next_url)
+    ip_limiter.hit(request.remote_addr)
+
     with get_db_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(
@@ -320,7 +561,8 @@ def login():
             )
             user = cur.fetchone()
 
-    if not user or not _check_password(password, user['password_hash']):
+    if not user or not check_password(password, user['password_hash']):
+        email_limiter.hit(email)
         return render_template(
             'auth/login.html',
             error='Credenciales invalidas.',
@@ -328,8 +570,26 @@ def login():
             next_url=next_url,
         )
 
+    email_limiter.reset(email)
+    if needs_rehash(user['password_hash']):
+        # Best effort: with the hasher saturated the upgrade waits for a later
+        # login instead of failing this one.
+        try:
+            new_hash = hash_password(password)
+        except PasswordHasherBusy:
+            new_hash = None
+        if new_hash:
+            with get_db_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        'update public.users set password_hash = %s where id = %s and password_hash = %s',
+                        (new_hash, user['id'], user['password_hash']),
+                    )
+
+    _rotate_session()
     session['user_id'] = str(user['id'])
     session['user_name'] = user.get('full_name')
+    _merge_session_cart(session['user_id'])
     if next_url:
         return redirect(next_url)
     return redirect(url_for('index'))
@@ -375,8 +635,15 @@ def register():
             email=email,
         )
 
+    retry_after = ip_limiter.retry_after(request.remote_addr)
+    if retry_after:
+        return _too_many_attempts(
+            'auth/register.html', retry_after, first_name=first_name, last_name=last_name, email=email
+        )
+    ip_limiter.hit(request.remote_addr)
+
     full_name = f"{first_name} {last_name}".strip()
-    password_hash = _hash_password(password)
+    password_hash = hash_password(password)
 
     with get_db_connection() as conn:
         with conn.cursor() as cur:
@@ -401,16 +668,22 @@ def register():
             user_id = cur.fetchone()['id']
             conn.commit()
 
+    _rotate_session()
     session['user_id'] = str(user_id)
     session['user_name'] = full_name or email
+    _merge_session_cart(session['user_id'])
     return redirect(url_for('index'))
 
 
 @app.route('/cart')
 def cart():
-    cart_data = _get_cart()
-    items, subtotal = _build_cart_snapshot(cart_data)
-    return render_template('cart/index.html', items=items, subtotal=subtotal)
+    items, subtotal = _build_cart_snapshot(_cart_lines())
+    return render_template(
+        'cart/index.html',
+        items=items,
+        subtotal=subtotal,
+        checkout_key=new_idempotency_key(),
+    )
 
 
 @app.route('/cart/add', methods=['POST'])
@@ -432,12 +705,10 @@ def cart_add():
     if quantity <= 0:
         quantity = 1
 
-    cart_data = _get_cart()
-    cart_data[product_id] = int(cart_data.get(product_id, 0)) + quantity
-    _save_cart(cart_data)
+    lines = _cart_lines({product_id: (ADD, quantity)}, priced=request.is_json)
 
     if request.is_json:
-        items, subtotal, item_map, cart_count = _cart_payload(cart_data)
+        item_map, subtotal, cart_count = _cart_payload(lines, [product_id])
         return {
             'status': 'ok',
             'cart_count': cart_count,
@@ -464,15 +735,10 @@ def cart_update():
     except (TypeError, ValueError):
         return {'status': 'error', 'message': 'Invalid quantity'}, 400
 
-    cart_data = _get_cart()
-    if quantity <= 0:
-        cart_data.pop(product_id, None)
-    else:
-        cart_data[product_id] = quantity
-    _save_cart(cart_data)
+    lines = _cart_lines({product_id: (SET, max(quantity, 0))}, priced=request.is_json)
 
     if request.is_json:
-        items, subtotal, item_map, cart_count = _cart_payload(cart_data)
+        item_map, subtotal, cart_count = _cart_payload(lines, [product_id])
         return {
             'status': 'ok',
             'cart_count': cart_count,
@@ -493,12 +759,10 @@ def cart_remove():
         message = 'Missing product_id' if not raw_product_id else 'Invalid product_id'
         return {'status': 'error', 'message': message}, 400
 
-    cart_data = _get_cart()
-    cart_data.pop(product_id, None)
-    _save_cart(cart_data)
+    lines = _cart_lines({product_id: (SET, 0)}, priced=request.is_json)
 
     if request.is_json:
-        items, subtotal, item_map, cart_count = _cart_payload(cart_data)
+        item_map, subtotal, cart_count = _cart_payload(lines, [product_id])
         return {
             'status': 'ok',
             'cart_count': cart_count,
@@ -509,13 +773,89 @@ def cart_remove():
     return redirect(url_for('cart'))
 
 
+MAX_CART_BATCH = 100
+
+
+def _parse_cart_operation(operation):
+    if not isinstance(operation, dict):
+        return None, 'Invalid operation'
+
+    op = operation.get('op')
+    if op not in ('add', 'update', 'remove'):
+        return None, 'Invalid op'
+
+    raw_product_id = operation.get('product_id')
+    product_id = _normalize_product_id(raw_product_id)
+    if not product_id:
+        return None, 'Missing product_id' if not raw_product_id else 'Invalid product_id'
+
+    quantity = None
+    if op == 'add':
+        try:
+            quantity = int(operation.get('quantity') or 1)
+        except (TypeError, ValueError):
+            quantity = 1
+        quantity = max(quantity, 1)
+    elif op == 'update':
+        try:
+            quantity = int(operation.get('quantity'))
+        except (TypeError, ValueError):
+            return None, 'Invalid quantity'
+
+    return (op, product_id, quantity), None
+
+
+@app.route('/cart/batch', methods=['POST'])
+def cart_batch():
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    # Errors carry the current badge count so the page can undo its optimistic update.
+    if not isinstance(operations, list) or not operations:
+        return {'status': 'error', 'message': 'Missing operations', 'cart_count': _header_context()['cart_count']}, 400
+    if len(operations) > MAX_CART_BATCH:
+        return {'status': 'error', 'message': 'Too many operations', 'cart_count': _header_context()['cart_count']}, 400
+
+    # Validate everything first so a bad entry leaves the cart untouched.
+    parsed = []
+    for index, operation in enumerate(operations):
+        result, error = _parse_cart_operation(operation)
+        if error:
+            return {
+                'status': 'error',
+                'message': error,
+                'index': index,
+                'cart_count': _header_context()['cart_count'],
+            }, 400
+        parsed.append(result)
+
+    lines = _cart_lines(fold_changes(parsed))
+
+    touched = [product_id for _, product_id, _ in parsed]
+    item_map, subtotal, cart_count = _cart_payload(lines, touched)
+    return {
+        'status': 'ok',
+        'cart_count': cart_count,
+        'subtotal': subtotal,
+        'items': item_map,
+    }
+
+
 @app.route('/checkout', methods=['POST'])
 def checkout():
     if not session.get('user_id'):
         return redirect(url_for('login'))
 
-    cart_data = _get_cart()
-    items, subtotal = _build_cart_snapshot(cart_data)
+    idempotency_key = normalize_idempotency_key(request.form.get('idempotency_key'))
+    if idempotency_key:
+        # A retry of a checkout that went through finds its cart already
+        # emptied; send it to the order instead.
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                order_id = find_order(cur, get_catalog_schema(cur), session['user_id'], idempotency_key)
+        if order_id is not None:
+            return redirect(url_for('checkout_success', order_id=order_id))
+
+    items, subtotal = _build_cart_snapshot(_cart_lines(revalidate=True))
     if not items:
         return redirect(url_for('cart'))
 
@@ -524,35 +864,26 @@ def checkout():
 
     with get_db_connection() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                """
-                insert into public.orders (user_id, status, subtotal, tax, total, currency)
-                values (%s, %s, %s, %s, %s, %s)
-                returning id
-                """,
-                (session['user_id'], 'pending', subtotal, tax, total, 'USD'),
+            schema = get_catalog_schema(cur)
+            order_id, _ = place_order(
+                cur,
+                schema,
+                session['user_id'],
+                items,
+                subtotal,
+                tax,
+                total,
+                idempotency_key=idempotency_key,
             )
-            order_id = cur.fetchone()['id']
+            if order_id is not None and schema.has_carts:
+                clear_cart(cur, session['user_id'])
 
-            for item in items:
-                cur.execute(
-                    """
-                    insert into public.order_items
-                    (order_id, product_id, quantity, unit_price, line_total)
-                    values (%s, %s, %s, %s, %s)
-                    """,
-                    (
-                        order_id,
-                        item['id'],
-                        item['quantity'],
-                        item['unit_price'],
-                        item['line_total'],
-                    ),
-                )
-
-            conn.commit()
+    if order_id is None:
+        return redirect(url_for('cart'))
 
     session.pop('cart', None)
+    if schema.has_carts:
+        _remember_cart_count(0)
     return redirect(url_for('checkout_success', order_id=order_id))
 
 
@@ -574,30 +905,44 @@ def admin_home():
     return render_template('admin/index.html')
 
 
+@app.route('/admin/schema/refresh', methods=['POST'])
+@admin_required
+def admin_schema_refresh():
+    invalidate_catalog_schema()
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            schema = get_catalog_schema(cur)
+    _catalog_changed()
+    if _wants_json():
+        return {'status': 'ok', 'schema': schema.describe()}
+    return redirect(url_for('admin_home'))
+
+
+@app.route('/admin/perf')
+@admin_required
+def admin_perf():
+    report = profiler_report()
+    if _wants_json():
+        return {'status': 'ok', **report}
+    return render_template('admin/perf.html', report=report)
+
+
 @app.route('/admin/products')
 @admin_required
 def admin_products():
+    filters = parse_admin_args(request.args, PRODUCT_FLAGS)
     with get_db_connection() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                """
-                select
-                  p.id,
-                  p.name,
-                  p.price,
-                  p.is_active,
-                  p.is_on_offer,
-                  p.offer_price,
-                  c.name as category
-                from public.products p
-                left join public.product_categories pc on pc.product_id = p.id
-                left join public.categories c on c.id = pc.category_id
-                order by p.created_at desc
-                """
-            )
-            products = cur.fetchall()
+            products, next_cursor, total = fetch_admin_products(cur, filters)
 
-    return render_template('admin/products_list.html', products=products)
+    return render_template(
+        'admin/products_list.html',
+        products=products,
+        filters=filters,
+        filter_args=admin_query_args(filters),
+        next_cursor=next_cursor,
+        total=total,
+    )
 
 
 @app.route('/admin/products/new', methods=['GET', 'POST'])
@@ -657,8 +1002,10 @@ def admin_product_new():
                     "insert into public.product_categories (product_id, category_id) values (%s, %s)",
                     (product_id, category_id),
                 )
+            _refresh_product_stats(cur, product_id, ())
             conn.commit()
 
+    _catalog_changed(product_id)
     return redirect(url_for('admin_products'))
 
 
@@ -744,14 +1091,17 @@ def admin_product_edit(product_id):
                     product_id,
                 ),
             )
+            previous_categories = product_category_ids(cur, product_id)
             cur.execute('delete from public.product_categories where product_id = %s', (product_id,))
             if category_id:
                 cur.execute(
                     "insert into public.product_categories (product_id, category_id) values (%s, %s)",
                     (product_id, category_id),
                 )
+            _refresh_product_stats(cur, product_id, previous_categories)
             conn.commit()
 
+    _catalog_changed(product_id)
     return redirect(url_for('admin_products'))
 
 
@@ -760,35 +1110,32 @@ def admin_product_edit(product_id):
 def admin_product_delete(product_id):
     with get_db_connection() as conn:
         with conn.cursor() as cur:
+            previous_categories = product_category_ids(cur, product_id)
             cur.execute('delete from public.products where id = %s', (product_id,))
+            _refresh_product_stats(cur, None, previous_categories)
+            if get_catalog_schema(cur).has_tombstones:
+                prune_tombstones(cur)
             conn.commit()
+    _catalog_changed(product_id)
     return redirect(url_for('admin_products'))
 
 
 @app.route('/admin/users')
 @admin_required
 def admin_users():
+    filters = parse_admin_args(request.args, USER_FLAGS)
     with get_db_connection() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                """
-                select
-                  u.id,
-                  u.email,
-                  u.full_name,
-                  u.is_active,
-                  exists (
-                    select 1
-                    from public.user_roles ur
-                    join public.roles r on r.id = ur.role_id
-                    where ur.user_id = u.id and r.name = 'admin'
-                  ) as is_admin
-                from public.users u
-                order by u.created_at desc
-                """
-            )
-            users = cur.fetchall()
-    return render_template('admin/users_list.html', users=users)
+            users, next_cursor, total = fetch_admin_users(cur, filters)
+
+    return render_template(
+        'admin/users_list.html',
+        users=users,
+        filters=filters,
+        filter_args=admin_query_args(filters),
+        next_cursor=next_cursor,
+        total=total,
+    )
 
 
 @app.route('/admin/users/new', methods=['GET', 'POST'])
@@ -812,7 +1159,7 @@ def admin_user_new():
     if len(password) < 6:
         return render_template('admin/user_form.html', error='La contrasena debe tener al menos 6 caracteres.')
 
-    password_hash = _hash_password(password)
+    password_hash = hash_password(password)
 
     with get_db_connection() as conn:
         with conn.cursor() as cur:
@@ -906,7 +1253,7 @@ def admin_user_edit(user_id):
             )
 
             if password:
-                password_hash = _hash_password(password)
+                password_hash = hash_password(password)
                 cur.execute(
                     "update public.users set password_hash = %s where id = %s",
                     (password_hash, user_id),
@@ -930,6 +1277,7 @@ def admin_user_edit(user_id):
                 )
             conn.commit()
 
+    invalidate_user_roles(user_id)
     if session.get('user_id') == user_id:
         session['is_admin'] = is_admin_flag
 
@@ -943,6 +1291,7 @@ def admin_user_delete(user_id):
         with conn.cursor() as cur:
             cur.execute('delete from public.users where id = %s', (user_id,))
             conn.commit()
+    invalidate_user_roles(user_id)
     return redirect(url_for('admin_users'))
 
 
@@ -964,5 +1313,24 @@ def health_db():
         'result': row.get('ok') if row else None,
     }
 
+
+@app.route('/health/cache')
+def health_cache():
+    return {
+        'status': 'ok',
+        'pid': os.getpid(),
+        'caches': cache_stats(),
+        'throttles': throttle_stats(),
+    }
+
+
+@app.route('/health/db/pool')
+def health_db_pool():
+    return {
+        'status': 'ok',
+        'pid': os.getpid(),
+        'pool': pool_stats(),
+    }
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
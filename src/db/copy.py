@@ -0,0 +1,46 @@
+import io
+
+
+def copy_escape(value):
+    # COPY text format; empty strings are sent as NULL.
+    if value is None:
+        return '\\N'
+    text = str(value)
+    if text == '':
+        return '\\N'
+    return (
+        text.replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+class CopyStream(io.RawIOBase):
+    # File-like view over an iterator of rows, encoded as COPY text format on
+    # demand so only one buffer's worth of rows is ever in memory. Pass it to
+    # cursor.copy_expert('copy ... from stdin', stream).
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = b''
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self.count += 1
+            line = ('\t'.join(copy_escape(value) for value in row) + '\n').encode('utf-8')
+            chunks.append(line)
+            length += len(line)
+        data = b''.join(chunks)
+        if size < 0:
+            size = len(data)
+        self._buffer = data[size:]
+        return data[:size]
@@ -0,0 +1,163 @@
+import hashlib
+import os
+import re
+import time
+
+import click
+import psycopg2
+from flask.cli import AppGroup
+from psycopg2.extras import RealDictCursor
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+_FILENAME_RE = re.compile(r'^(\d{4})_([a-z0-9_]+)\.sql$')
+# First-line marker for migrations that cannot run inside a transaction
+# (create index concurrently). Their statements run one by one in autocommit.
+_NO_TRANSACTION = '-- migrate: no-transaction'
+# Serializes concurrent `flask db upgrade` runs (e.g. several instances deploying).
+_LOCK_KEY = 'supermercado.schema_migrations'
+
+db_cli = AppGroup('db', help='Schema migrations.')
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, encoding='utf-8') as handle:
+            self.sql = handle.read()
+        self.checksum = hashlib.sha256(self.sql.encode('utf-8')).hexdigest()
+        self.transactional = not self.sql.lstrip().startswith(_NO_TRANSACTION)
+
+    def statements(self):
+        # Only used for no-transaction files, which hold plain DDL: splitting on
+        # semicolons at end of line is enough.
+        body = '\n'.join(line for line in self.sql.splitlines() if not line.strip().startswith('--'))
+        return [statement.strip() for statement in re.split(r';\s*$', body, flags=re.M) if statement.strip()]
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = _FILENAME_RE.match(filename)
+        if match:
+            migrations.append(Migration(match.group(1), match.group(2), os.path.join(directory, filename)))
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise click.ClickException('Duplicate migration version in ' + directory)
+    return migrations
+
+
+def _connect():
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        raise click.ClickException('DATABASE_URL is not set')
+    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+
+
+def _ensure_version_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            create table if not exists public.schema_migrations (
+                version text primary key,
+                name text not null,
+                checksum text not null,
+                applied_at timestamptz not null default now()
+            )
+            """
+        )
+    conn.commit()
+
+
+def applied_migrations(conn):
+    with conn.cursor() as cur:
+        cur.execute('select version, name, checksum, applied_at from public.schema_migrations order by version')
+        return {row['version']: row for row in cur.fetchall()}
+
+
+def _apply(conn, migration):
+    if migration.transactional:
+        with conn.cursor() as cur:
+            cur.execute(migration.sql)
+            cur.execute(
+                'insert into public.schema_migrations (version, name, checksum) values (%s, %s, %s)',
+                (migration.version, migration.name, migration.checksum),
+            )
+        conn.commit()
+        return
+
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            for statement in migration.statements():
+                cur.execute(statement)
+            cur.execute(
+                'insert into public.schema_migrations (version, name, checksum) values (%s, %s, %s)',
+                (migration.version, migration.name, migration.checksum),
+            )
+    finally:
+        conn.autocommit = False
+
+
+def upgrade(conn, migrations, target=None, echo=print):
+    _ensure_version_table(conn)
+    with conn.cursor() as cur:
+        cur.execute('select pg_advisory_lock(hashtext(%s))', (_LOCK_KEY,))
+    conn.commit()
+    try:
+        applied = applied_migrations(conn)
+        # No-transaction migrations switch to autocommit, which needs an idle connection.
+        conn.commit()
+        pending = [
+            migration for migration in migrations
+            if migration.version not in applied and (target is None or migration.version <= target)
+        ]
+        for migration in pending:
+            started = time.perf_counter()
+            _apply(conn, migration)
+            echo(f'applied {migration.version}_{migration.name} ({time.perf_counter() - started:.2f}s)')
+        return pending
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute('select pg_advisory_unlock(hashtext(%s))', (_LOCK_KEY,))
+        conn.commit()
+
+
+@db_cli.command('upgrade')
+@click.option('--to', 'target', help='Stop after this version (e.g. 0002).')
+def upgrade_command(target):
+    """Apply pending migrations."""
+    conn = _connect()
+    try:
+        applied = upgrade(conn, load_migrations(), target, echo=click.echo)
+    finally:
+        conn.close()
+    if not applied:
+        click.echo('Database is up to date.')
+    else:
+        # Workers cache the detected schema; new columns show up after
+        # SCHEMA_CACHE_TTL or POST /admin/schema/refresh.
+        click.echo(f'{len(applied)} migration(s) applied.')
+
+
+@db_cli.command('status')
+def status_command():
+    """List applied and pending migrations."""
+    conn = _connect()
+    try:
+        _ensure_version_table(conn)
+        applied = applied_migrations(conn)
+    finally:
+        conn.close()
+
+    for migration in load_migrations():
+        row = applied.get(migration.version)
+        if row is None:
+            state = 'pending'
+        elif row['checksum'] != migration.checksum:
+            state = f"applied {row['applied_at']:%Y-%m-%d %H:%M} (file changed since)"
+        else:
+            state = f"applied {row['applied_at']:%Y-%m-%d %H:%M}"
+        click.echo(f'{migration.version}_{migration.name}: {state}')
@@ -0,0 +1,73 @@
+-- Tables the app reads and writes. Everything is "if not exists" so this is a
+-- no-op on databases that were created by hand before migrations existed.
+
+create table if not exists public.products (
+    id uuid primary key default gen_random_uuid(),
+    name text not null,
+    slug text,
+    description text,
+    price numeric(12, 2) not null default 0,
+    image_url text,
+    is_on_offer boolean not null default false,
+    offer_price numeric(12, 2) default 0,
+    is_active boolean not null default true,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create table if not exists public.categories (
+    id uuid primary key default gen_random_uuid(),
+    name text not null unique
+);
+
+create table if not exists public.product_categories (
+    product_id uuid not null references public.products (id) on delete cascade,
+    category_id uuid not null references public.categories (id) on delete cascade,
+    primary key (product_id, category_id)
+);
+
+create table if not exists public.users (
+    id uuid primary key default gen_random_uuid(),
+    email text not null unique,
+    password_hash text not null,
+    full_name text,
+    is_active boolean not null default true,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create table if not exists public.roles (
+    id uuid primary key default gen_random_uuid(),
+    name text not null unique,
+    description text
+);
+
+create table if not exists public.user_roles (
+    user_id uuid not null references public.users (id) on delete cascade,
+    role_id uuid not null references public.roles (id) on delete cascade,
+    primary key (user_id, role_id)
+);
+
+create table if not exists public.orders (
+    id uuid primary key default gen_random_uuid(),
+    user_id uuid references public.users (id),
+    status text not null default 'pending',
+    subtotal numeric(12, 2) not null default 0,
+    tax numeric(12, 2) not null default 0,
+    total numeric(12, 2) not null default 0,
+    currency text not null default 'USD',
+    created_at timestamptz not null default now()
+);
+
+create table if not exists public.order_items (
+    id uuid primary key default gen_random_uuid(),
+    order_id uuid not null references public.orders (id) on delete cascade,
+    product_id uuid references public.products (id),
+    quantity integer not null,
+    unit_price numeric(12, 2) not null,
+    line_total numeric(12, 2) not null
+);
+
+insert into public.roles (name, description)
+values ('admin', 'Admin role')
+on conflict (name) do nothing;
@@ -0,0 +1,56 @@
+-- migrate: no-transaction
+-- Built concurrently so this can run against a live database. Unique indexes
+-- use the names Postgres gives the equivalent constraints, so tables created by
+-- 0001 (or by hand with the same constraints) skip them.
+
+-- Catalog snapshot: active products, newest first.
+create index concurrently if not exists products_active_created_name_idx
+    on public.products (is_active, created_at desc, name);
+
+-- Keyset pages of /products (sort=recent) and /admin/products.
+create index concurrently if not exists products_created_id_idx
+    on public.products (created_at desc, id desc);
+
+-- /products?sort=name and ?sort=price_*; the expression must stay identical to
+-- CatalogSchema.effective_price_sql.
+create index concurrently if not exists products_name_id_idx
+    on public.products (name, id);
+
+create index concurrently if not exists products_effective_price_id_idx
+    on public.products ((coalesce(case when is_on_offer and offer_price > 0 then offer_price else price end, 0)), id);
+
+-- Feed imports match on slug.
+create index concurrently if not exists products_slug_idx
+    on public.products (slug);
+
+create unique index concurrently if not exists product_categories_pkey
+    on public.product_categories (product_id, category_id);
+
+create index concurrently if not exists product_categories_category_id_idx
+    on public.product_categories (category_id);
+
+create unique index concurrently if not exists categories_name_key
+    on public.categories (name);
+
+-- Login and registration look users up by email.
+create unique index concurrently if not exists users_email_key
+    on public.users (email);
+
+-- /admin/users pages.
+create index concurrently if not exists users_created_id_idx
+    on public.users (created_at desc, id desc);
+
+create unique index concurrently if not exists user_roles_pkey
+    on public.user_roles (user_id, role_id);
+
+create index concurrently if not exists user_roles_role_id_idx
+    on public.user_roles (role_id);
+
+create index concurrently if not exists orders_user_created_idx
+    on public.orders (user_id, created_at desc);
+
+create index concurrently if not exists order_items_order_id_idx
+    on public.order_items (order_id);
+
+create index concurrently if not exists order_items_product_id_idx
+    on public.order_items (product_id);
@@ -0,0 +1,6 @@
+-- Lets checkout use on conflict (idempotency_key) so a resubmitted form returns
+-- the order it already created.
+alter table public.orders add column if not exists idempotency_key text;
+
+create unique index if not exists orders_idempotency_key_key
+    on public.orders (idempotency_key);
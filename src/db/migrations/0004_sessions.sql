@@ -0,0 +1,9 @@
+-- Server-side sessions: the cookie only carries a signed id, the data lives here.
+create table if not exists public.sessions (
+    id text primary key,
+    data bytea not null,
+    expires_at timestamptz not null
+);
+
+create index if not exists sessions_expires_at_idx
+    on public.sessions (expires_at);
@@ -0,0 +1,39 @@
+-- Carts of signed-in users, so they follow the customer across devices.
+-- Anonymous carts stay in the session and are merged in on login.
+-- Key types follow users.id and products.id, which older databases may not
+-- have as uuid.
+do $$
+declare
+    user_id_type text := (
+        select format_type(atttypid, atttypmod) from pg_attribute
+        where attrelid = 'public.users'::regclass and attname = 'id'
+    );
+    product_id_type text := (
+        select format_type(atttypid, atttypmod) from pg_attribute
+        where attrelid = 'public.products'::regclass and attname = 'id'
+    );
+begin
+    execute format(
+        'create table if not exists public.carts (
+            id uuid primary key default gen_random_uuid(),
+            user_id %s not null unique references public.users (id) on delete cascade,
+            updated_at timestamptz not null default now()
+        )',
+        user_id_type
+    );
+    execute format(
+        'create table if not exists public.cart_items (
+            cart_id uuid not null references public.carts (id) on delete cascade,
+            product_id %s not null references public.products (id) on delete cascade,
+            quantity integer not null check (quantity > 0),
+            added_at timestamptz not null default now(),
+            primary key (cart_id, product_id)
+        )',
+        product_id_type
+    );
+end
+$$;
+
+-- Deleting a product cascades into cart lines.
+create index if not exists cart_items_product_id_idx
+    on public.cart_items (product_id);
@@ -0,0 +1,5 @@
+-- migrate: no-transaction
+-- Incremental sync of /api/products reads products changed since a timestamp,
+-- in (updated_at, id) order.
+create index concurrently if not exists products_updated_id_idx
+    on public.products (updated_at, id);
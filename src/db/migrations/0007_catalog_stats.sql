@@ -0,0 +1,87 @@
+-- Precomputed catalog statistics, so catalog pages read O(categories) rows
+-- instead of aggregating products or order lines per request.
+--   product_sales / category_sales: units sold per product (overall and per
+--     category), added to by every checkout.
+--   category_facets: active product count, offers and price range per
+--     category, recomputed for the categories a catalog change touches.
+-- Key types follow products.id and categories.id.
+do $$
+declare
+    product_id_type text := (
+        select format_type(atttypid, atttypmod) from pg_attribute
+        where attrelid = 'public.products'::regclass and attname = 'id'
+    );
+    category_id_type text := (
+        select format_type(atttypid, atttypmod) from pg_attribute
+        where attrelid = 'public.categories'::regclass and attname = 'id'
+    );
+begin
+    execute format(
+        'create table if not exists public.product_sales (
+            product_id %s primary key references public.products (id) on delete cascade,
+            units bigint not null default 0,
+            revenue numeric(14, 2) not null default 0,
+            updated_at timestamptz not null default now()
+        )',
+        product_id_type
+    );
+    execute format(
+        'create table if not exists public.category_sales (
+            category_id %s not null references public.categories (id) on delete cascade,
+            product_id %s not null references public.products (id) on delete cascade,
+            units bigint not null default 0,
+            primary key (category_id, product_id)
+        )',
+        category_id_type,
+        product_id_type
+    );
+    execute format(
+        'create table if not exists public.category_facets (
+            category_id %s primary key references public.categories (id) on delete cascade,
+            product_count integer not null default 0,
+            offer_count integer not null default 0,
+            min_price numeric(12, 2),
+            max_price numeric(12, 2),
+            updated_at timestamptz not null default now()
+        )',
+        category_id_type
+    );
+end
+$$;
+
+-- Best sellers overall and per category are index range scans.
+create index if not exists product_sales_units_idx
+    on public.product_sales (units desc, product_id);
+
+create index if not exists category_sales_units_idx
+    on public.category_sales (category_id, units desc, product_id);
+
+create index if not exists category_sales_product_id_idx
+    on public.category_sales (product_id);
+
+-- Backfill from the orders placed so far.
+insert into public.product_sales (product_id, units, revenue)
+select oi.product_id, sum(oi.quantity), sum(oi.line_total)
+from public.order_items oi
+join public.products p on p.id = oi.product_id
+group by oi.product_id
+on conflict (product_id) do nothing;
+
+insert into public.category_sales (category_id, product_id, units)
+select pc.category_id, s.product_id, s.units
+from public.product_sales s
+join public.product_categories pc on pc.product_id = s.product_id
+on conflict (category_id, product_id) do nothing;
+
+insert into public.category_facets (category_id, product_count, offer_count, min_price, max_price)
+select
+    c.id,
+    count(p.id),
+    count(p.id) filter (where p.is_on_offer and p.offer_price > 0),
+    min(case when p.is_on_offer and p.offer_price > 0 then p.offer_price else p.price end),
+    max(case when p.is_on_offer and p.offer_price > 0 then p.offer_price else p.price end)
+from public.categories c
+left join public.product_categories pc on pc.category_id = c.id
+left join public.products p on p.id = pc.product_id and p.is_active
+group by c.id
+on conflict (category_id) do nothing;
@@ -0,0 +1,37 @@
+-- Tombstones for /api/products deltas: a product deleted by any path (admin,
+-- SQL) leaves its id here, so clients syncing with `since` can drop it.
+do $$
+begin
+    execute format(
+        'create table if not exists public.deleted_products (
+            id %s primary key,
+            deleted_at timestamptz not null default now()
+        )',
+        (
+            select format_type(atttypid, atttypmod) from pg_attribute
+            where attrelid = 'public.products'::regclass and attname = 'id'
+        )
+    );
+end
+$$;
+
+create index if not exists deleted_products_deleted_at_idx
+    on public.deleted_products (deleted_at, id);
+
+-- One statement per delete, whatever the number of rows.
+create or replace function public.record_deleted_products() returns trigger
+language plpgsql as $$
+begin
+    insert into public.deleted_products (id, deleted_at)
+    select id, now() from deleted_rows
+    on conflict (id) do update set deleted_at = excluded.deleted_at;
+    return null;
+end
+$$;
+
+drop trigger if exists products_record_deleted on public.products;
+create trigger products_record_deleted
+    after delete on public.products
+    referencing old table as deleted_rows
+    for each statement
+    execute function public.record_deleted_products();
@@ -0,0 +1,257 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+from services.metrics import TimedCursor, timed
+
+
+class PoolTimeout(RuntimeError):
+    pass
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        dsn,
+        min_size=1,
+        max_size=10,
+        timeout=5.0,
+        healthcheck_idle=30.0,
+        cursor_factory=TimedCursor,
+    ):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        self.dsn = dsn
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.timeout = timeout
+        # Connections idle for longer than this are pinged before being handed out.
+        # 0 pings on every borrow.
+        self.healthcheck_idle = healthcheck_idle
+        self.cursor_factory = cursor_factory
+
+        self._cond = threading.Condition()
+        self._idle = []
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._connects = 0
+        self._connect_total = 0.0
+
+        self._fill()
+
+    def _fill(self):
+        while self._size < self.min_size:
+            try:
+                conn = self._connect()
+            except psycopg2.Error:
+                # The pool still works lazily if the database is down at startup.
+                return
+            with self._cond:
+                self._size += 1
+                self._idle.append((conn, time.monotonic()))
+
+    def _connect(self):
+        started = time.perf_counter()
+        with timed('connect', 'db_connect_duration_seconds'):
+            conn = psycopg2.connect(self.dsn, cursor_factory=self.cursor_factory)
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            self._connects += 1
+            self._connect_total += elapsed
+        return conn
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - idle_since < self.healthcheck_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('select 1')
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        idle_entry = None
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError('Connection pool is closed')
+                if self._idle:
+                    idle_entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f'No database connection available after {self.timeout:.1f}s '
+                        f'(max_size={self.max_size})'
+                    )
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            waited = time.perf_counter() - started
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        try:
+            if idle_entry is not None:
+                conn, idle_since = idle_entry
+                if self._is_healthy(conn, idle_since):
+                    return conn
+                self._close_quietly(conn)
+                with self._cond:
+                    self._discarded += 1
+            return self._connect()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+        else:
+            discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._size -= 1
+                self._discarded += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            self._cond.notify()
+
+        if conn is not None:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+            if not conn.closed:
+                conn.commit()
+        except BaseException:
+            if conn.closed:
+                discard = True
+            else:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+                'wait_seconds_total': round(self._wait_total, 6),
+                'wait_seconds_max': round(self._wait_max, 6),
+                'connects': self._connects,
+                'connect_seconds_total': round(self._connect_total, 6),
+            }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _env_number(name, default, cast):
+    value = os.getenv(name)
+    if value is None or value.strip() == '':
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        return default
+
+
+def get_pool():
+    global _pool, _pool_pid
+
+    # Gunicorn forks workers after import, so every process builds its own pool.
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+
+    with _pool_lock:
+        if _pool is not None and _pool_pid == pid:
+            return _pool
+
+        database_url = os.getenv('DATABASE_URL')
+        if not database_url:
+            raise RuntimeError('DATABASE_URL is not set')
+
+        _pool = ConnectionPool(
+            database_url,
+            min_size=_env_number('DB_POOL_MIN_SIZE', 1, int),
+            max_size=_env_number('DB_POOL_MAX_SIZE', 10, int),
+            timeout=_env_number('DB_POOL_TIMEOUT', 5.0, float),
+            healthcheck_idle=_env_number('DB_POOL_HEALTHCHECK_IDLE', 30.0, float),
+        )
+        _pool_pid = pid
+        return _pool
+
+
+def pool_stats():
+    if _pool is None or _pool_pid != os.getpid():
+        return None
+    return _pool.stats()
@@ -0,0 +1,296 @@
+import os
+import threading
+import time
+import uuid
+
+
+# Column types that can be safely interpolated into casts such as `%s::uuid[]`.
+_ID_TYPES = {
+    'uuid': 'uuid',
+    'bigint': 'bigint',
+    'integer': 'integer',
+    'smallint': 'smallint',
+    'text': 'text',
+    'character varying': 'text',
+}
+
+
+class CatalogSchema:
+    def __init__(
+        self,
+        product_columns,
+        has_category_tables,
+        product_id_type=None,
+        order_columns=(),
+        has_carts=False,
+        has_catalog_stats=False,
+        has_sessions=False,
+        has_tombstones=False,
+    ):
+        self.product_columns = frozenset(product_columns)
+        self.has_category_tables = bool(has_category_tables)
+        self.has_carts = bool(has_carts)
+        self.has_catalog_stats = bool(has_catalog_stats) and self.has_category_tables
+        self.has_sessions = bool(has_sessions)
+        self.has_tombstones = bool(has_tombstones)
+        self.product_id_type = _ID_TYPES.get(product_id_type or '', 'text')
+        self.order_columns = frozenset(order_columns)
+        self.detected_at = time.time()
+
+        columns = self.product_columns
+        description_sql = 'p.description' if 'description' in columns else 'null::text as description'
+        price_sql = 'p.price' if 'price' in columns else '0::numeric as price'
+        image_url_sql = 'p.image_url' if 'image_url' in columns else 'null::text as image_url'
+        is_on_offer_sql = 'p.is_on_offer' if 'is_on_offer' in columns else 'false as is_on_offer'
+        offer_price_sql = 'p.offer_price' if 'offer_price' in columns else '0::numeric as offer_price'
+        where_active_sql = 'where p.is_active = true' if 'is_active' in columns else ''
+        order_by_sql = 'order by p.created_at desc, p.name asc' if 'created_at' in columns else 'order by p.name asc'
+        created_at_sql = 'p.created_at' if 'created_at' in columns else 'null::timestamptz as created_at'
+
+        base_price_sql = 'p.price' if 'price' in columns else '0::numeric'
+        if 'is_on_offer' in columns and 'offer_price' in columns:
+            self.effective_price_sql = (
+                f'coalesce(case when p.is_on_offer and p.offer_price > 0 '
+                f'then p.offer_price else {base_price_sql} end, 0)'
+            )
+        else:
+            self.effective_price_sql = f'coalesce({base_price_sql}, 0)'
+        self.active_filter_sql = 'p.is_active = true' if 'is_active' in columns else None
+
+        if self.has_category_tables:
+            category_sql = 'c.name as category'
+            join_sql = """
+                left join public.product_categories pc
+                    on pc.product_id = p.id
+                left join public.categories c
+                    on c.id = pc.category_id
+            """
+        else:
+            category_sql = 'null::text as category'
+            join_sql = ''
+
+        self.products_sql = f"""
+            select
+                p.id,
+                p.name,
+                {description_sql},
+                {price_sql},
+                {image_url_sql},
+                {is_on_offer_sql},
+                {offer_price_sql},
+                {category_sql}
+            from public.products p
+            {join_sql}
+            {where_active_sql}
+            {order_by_sql}
+        """
+
+        # Unfiltered, unordered select used by the paginated listing; callers append
+        # their own where/order by/limit.
+        self.listing_sql = f"""
+            select
+                p.id,
+                p.name,
+                {description_sql},
+                {price_sql},
+                {image_url_sql},
+                {is_on_offer_sql},
+                {offer_price_sql},
+                {category_sql},
+                {created_at_sql},
+                {self.effective_price_sql} as effective_price
+            from public.products p
+            {join_sql}
+        """
+
+        self.products_by_ids_sql = f"""
+            select
+              p.id,
+              p.name,
+              {price_sql},
+              {image_url_sql},
+              {is_on_offer_sql},
+              {offer_price_sql}
+            from public.products p
+            where p.id = any(%s::{self.product_id_type}[])
+        """
+
+        # Export feed of /api/products: one row per product, categories as an array
+        # so a product in several categories is not repeated.
+        if self.has_category_tables:
+            categories_sql = """
+                array(
+                    select c.name
+                    from public.product_categories pc
+                    join public.categories c on c.id = pc.category_id
+                    where pc.product_id = p.id
+                    order by c.name
+                ) as categories
+            """
+        else:
+            categories_sql = "'{}'::text[] as categories"
+        slug_sql = 'p.slug' if 'slug' in columns else 'null::text as slug'
+        is_active_sql = 'p.is_active' if 'is_active' in columns else 'true as is_active'
+        updated_at_sql = 'p.updated_at' if 'updated_at' in columns else 'null::timestamptz as updated_at'
+        self.feed_sql = f"""
+            select
+                p.id,
+                p.name,
+                {slug_sql},
+                {description_sql},
+                {price_sql},
+                {offer_price_sql},
+                {is_on_offer_sql},
+                {self.effective_price_sql} as effective_price,
+                {image_url_sql},
+                {is_active_sql},
+                {updated_at_sql},
+                {categories_sql}
+            from public.products p
+        """
+
+        # Cheap stand-in for hashing the catalog: every change the app makes bumps
+        # updated_at (or, for deletes, the row count).
+        if 'updated_at' in columns:
+            self.catalog_state_sql = """
+                select count(*) as row_count, max(p.updated_at) as last_updated
+                from public.products p
+            """
+        else:
+            self.catalog_state_sql = None
+
+        # A stored cart with current prices, in the order lines were added.
+        self.cart_lines_sql = f"""
+            select
+              p.id,
+              p.name,
+              {price_sql},
+              {image_url_sql},
+              {is_on_offer_sql},
+              {offer_price_sql},
+              ci.quantity
+            from public.carts c
+            join public.cart_items ci on ci.cart_id = c.id
+            join public.products p on p.id = ci.product_id
+            where c.user_id = %s
+            order by ci.added_at, ci.product_id
+        """
+
+    def coerce_ids(self, values):
+        # Drops ids that cannot be cast to the primary key type, so typed
+        # `id = any(...)` lookups can use the index instead of failing (or
+        # comparing as text) on stale cart entries.
+        ids = []
+        for value in values:
+            value = str(value).strip()
+            if self.product_id_type == 'uuid':
+                try:
+                    uuid.UUID(value)
+                except ValueError:
+                    continue
+            elif self.product_id_type != 'text':
+                if not value.lstrip('-').isdigit():
+                    continue
+            ids.append(value)
+        return ids
+
+    def has_column(self, name):
+        return name in self.product_columns
+
+    def describe(self):
+        return {
+            'product_columns': sorted(self.product_columns),
+            'product_id_type': self.product_id_type,
+            'order_columns': sorted(self.order_columns),
+            'has_category_tables': self.has_category_tables,
+            'has_carts': self.has_carts,
+            'has_catalog_stats': self.has_catalog_stats,
+            'has_sessions': self.has_sessions,
+            'has_tombstones': self.has_tombstones,
+            'detected_at': self.detected_at,
+        }
+
+
+_schema = None
+_schema_loaded_at = 0.0
+_schema_lock = threading.Lock()
+
+
+def _schema_ttl():
+    # Seconds before the schema is re-detected; 0 keeps it until an explicit refresh.
+    try:
+        return float(os.getenv('SCHEMA_CACHE_TTL', '300'))
+    except ValueError:
+        return 300.0
+
+
+def detect_catalog_schema(cur):
+    cur.execute(
+        """
+        select
+            coalesce(
+                (
+                    select array_agg(column_name::text)
+                    from information_schema.columns
+                    where table_schema = 'public' and table_name = 'products'
+                ),
+                '{}'::text[]
+            ) as product_columns,
+            (
+                select data_type::text
+                from information_schema.columns
+                where table_schema = 'public' and table_name = 'products' and column_name = 'id'
+            ) as product_id_type,
+            coalesce(
+                (
+                    select array_agg(column_name::text)
+                    from information_schema.columns
+                    where table_schema = 'public' and table_name = 'orders'
+                ),
+                '{}'::text[]
+            ) as order_columns,
+            to_regclass('public.product_categories') is not null as has_product_categories,
+            to_regclass('public.categories') is not null as has_categories,
+            to_regclass('public.cart_items') is not null as has_carts,
+            to_regclass('public.category_facets') is not null as has_catalog_stats,
+            to_regclass('public.sessions') is not null as has_sessions,
+            to_regclass('public.deleted_products') is not null as has_tombstones
+        """
+    )
+    row = cur.fetchone() or {}
+    return CatalogSchema(
+        row.get('product_columns') or [],
+        row.get('has_product_categories') and row.get('has_categories'),
+        product_id_type=row.get('product_id_type'),
+        order_columns=row.get('order_columns') or [],
+        has_carts=row.get('has_carts'),
+        has_catalog_stats=row.get('has_catalog_stats'),
+        has_sessions=row.get('has_sessions'),
+        has_tombstones=row.get('has_tombstones'),
+    )
+
+
+def _is_fresh():
+    if _schema is None:
+        return False
+    ttl = _schema_ttl()
+    return ttl <= 0 or time.monotonic() - _schema_loaded_at < ttl
+
+
+def get_catalog_schema(cur):
+    global _schema, _schema_loaded_at
+
+    if _is_fresh():
+        return _schema
+
+    with _schema_lock:
+        if not _is_fresh():
+            _schema = detect_catalog_schema(cur)
+            _schema_loaded_at = time.monotonic()
+        return _schema
+
+
+def invalidate_catalog_schema():
+    global _schema
+    with _schema_lock:
+        _schema = None
@@ -1,5 +1,19 @@
+import os
 from functools import wraps
 from flask import redirect, url_for, request, render_template, session
+from services.cache import TTLCache
+
+
+def _role_cache_ttl():
+    try:
+        return float(os.getenv('ROLE_CACHE_TTL', '60'))
+    except ValueError:
+        return 60.0
+
+
+# Shared by inject_globals and admin_required so a page view checks roles at most
+# once per TTL. Role changes made through the admin panel invalidate the entry.
+role_cache = TTLCache('roles', ttl=_role_cache_ttl(), max_entries=10000)
 
 
 def get_admin_role_id(conn):
@@ -15,9 +29,7 @@ def get_admin_role_id(conn):
         return cur.fetchone()['id']
 
 
-def is_admin(user_id, get_db_connection):
-    if not user_id:
-        return False
+def _query_is_admin(user_id, get_db_connection):
     with get_db_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(
@@ -32,6 +44,19 @@ def is_admin(user_id, get_db_connection):
             return cur.fetchone() is not None
 
 
+def is_admin(user_id, get_db_connection):
+    if not user_id:
+        return False
+    return role_cache.get_or_load(
+        str(user_id),
+        lambda: _query_is_admin(user_id, get_db_connection),
+    )
+
+
+def invalidate_user_roles(user_id=None):
+    role_cache.invalidate(str(user_id) if user_id is not None else None)
+
+
 def build_admin_required(get_db_connection):
     def decorator(view_func):
         @wraps(view_func)
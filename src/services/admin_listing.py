@@ -0,0 +1,200 @@
+import uuid
+
+from services.product_listing import cursor_value, decode_cursor, encode_cursor, keyset_condition
+
+ADMIN_PAGE_SIZE = 50
+MAX_ADMIN_PAGE_SIZE = 200
+# Admin lists always page newest first; the cursor carries (created_at, id).
+_CURSOR_SORT = 'created'
+
+_YES_VALUES = ('1', 'yes', 'true', 'on')
+_NO_VALUES = ('0', 'no', 'false', 'off')
+
+PRODUCT_FLAGS = ('active', 'offer')
+USER_FLAGS = ('active', 'admin')
+
+
+def _parse_flag(value):
+    # Tri-state filter: True, False or None (no filter).
+    value = (value or '').strip().lower()
+    if value in _YES_VALUES:
+        return True
+    if value in _NO_VALUES:
+        return False
+    return None
+
+
+def _parse_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return ADMIN_PAGE_SIZE
+    return max(1, min(limit, MAX_ADMIN_PAGE_SIZE))
+
+
+def parse_admin_args(args, flags):
+    return {
+        'q': (args.get('q') or '').strip()[:100],
+        'flags': {name: _parse_flag(args.get(name)) for name in flags},
+        'limit': _parse_limit(args.get('limit')),
+        'cursor': _decode_admin_cursor(args.get('cursor')),
+    }
+
+
+def _decode_admin_cursor(token):
+    # Products and users have uuid keys (migration 0001); anything else would
+    # fail the cast in the query.
+    cursor = decode_cursor(token, _CURSOR_SORT)
+    if cursor is None:
+        return None
+    try:
+        uuid.UUID(cursor[1])
+        return cursor_value('created_at', cursor[0]), cursor[1]
+    except ValueError:
+        return None
+
+
+def admin_query_args(filters):
+    args = {}
+    if filters['q']:
+        args['q'] = filters['q']
+    for name, value in filters['flags'].items():
+        if value is not None:
+            args[name] = '1' if value else '0'
+    if filters['limit'] != ADMIN_PAGE_SIZE:
+        args['limit'] = str(filters['limit'])
+    return args
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _flag_condition(value, true_sql, false_sql):
+    if value is None:
+        return None
+    return true_sql if value else false_sql
+
+
+def estimate_count(cur, sql, params):
+    # Planner estimate instead of count(*): free on any table size, and close
+    # enough for a "~N results" label.
+    cur.execute(f'explain (format json) {sql}', params)
+    row = cur.fetchone() or {}
+    plan = next(iter(row.values()), None)
+    try:
+        return int(plan[0]['Plan']['Plan Rows'])
+    except (TypeError, LookupError, ValueError):
+        return None
+
+
+def _fetch_page(cur, select_sql, count_sql, conditions, params, prefix, filters):
+    count_where = f"where {' and '.join(conditions)}" if conditions else ''
+    total = estimate_count(cur, f'{count_sql} {count_where}', params)
+
+    page_conditions = list(conditions)
+    page_params = list(params)
+    if filters['cursor']:
+        created_at, row_id = filters['cursor']
+        condition, cursor_params = keyset_condition(f'{prefix}.created_at', f'{prefix}.id', 'desc', created_at, row_id)
+        page_conditions.append(condition)
+        page_params.extend(cursor_params)
+    where_sql = f"where {' and '.join(page_conditions)}" if page_conditions else ''
+
+    cur.execute(
+        f"""
+        {select_sql}
+        {where_sql}
+        order by {prefix}.created_at desc, {prefix}.id desc
+        limit %s
+        """,
+        page_params + [filters['limit'] + 1],
+    )
+    rows = cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > filters['limit']:
+        rows = rows[:filters['limit']]
+        last = rows[-1]
+        next_cursor = encode_cursor(_CURSOR_SORT, last['created_at'], last['id'])
+    return rows, next_cursor, total
+
+
+def fetch_admin_products(cur, filters):
+    conditions = []
+    params = []
+    if filters['q']:
+        pattern = f"%{_escape_like(filters['q'])}%"
+        conditions.append("(p.name ilike %s escape '\\' or p.slug ilike %s escape '\\')")
+        params.extend([pattern, pattern])
+
+    flags = filters['flags']
+    for condition in (
+        _flag_condition(flags.get('active'), 'p.is_active = true', 'p.is_active = false'),
+        _flag_condition(flags.get('offer'), 'p.is_on_offer = true', 'p.is_on_offer = false'),
+    ):
+        if condition:
+            conditions.append(condition)
+
+    # The category comes from a per-row limit 1 lookup rather than a join so a
+    # product linked to several categories still appears once per page.
+    select_sql = """
+        select
+          p.id,
+          p.name,
+          p.price,
+          p.is_active,
+          p.is_on_offer,
+          p.offer_price,
+          p.created_at,
+          (
+            select c.name
+            from public.product_categories pc
+            join public.categories c on c.id = pc.category_id
+            where pc.product_id = p.id
+            limit 1
+          ) as category
+        from public.products p
+    """
+    return _fetch_page(cur, select_sql, 'select 1 from public.products p', conditions, params, 'p', filters)
+
+
+def fetch_admin_users(cur, filters):
+    conditions = []
+    params = []
+    if filters['q']:
+        pattern = f"%{_escape_like(filters['q'])}%"
+        conditions.append("(u.email ilike %s escape '\\' or u.full_name ilike %s escape '\\')")
+        params.extend([pattern, pattern])
+
+    flags = filters['flags']
+    for condition in (
+        _flag_condition(flags.get('active'), 'u.is_active = true', 'u.is_active = false'),
+        _flag_condition(flags.get('admin'), 'a.user_id is not null', 'a.user_id is null'),
+    ):
+        if condition:
+            conditions.append(condition)
+
+    # Admins are resolved once for the whole page with a join instead of an
+    # exists() per row.
+    admins_sql = """
+        left join (
+            select ur.user_id
+            from public.user_roles ur
+            join public.roles r on r.id = ur.role_id
+            where r.name = 'admin'
+        ) a on a.user_id = u.id
+    """
+    select_sql = f"""
+        select
+          u.id,
+          u.email,
+          u.full_name,
+          u.is_active,
+          u.created_at,
+          a.user_id is not null as is_admin
+        from public.users u
+        {admins_sql}
+    """
+    count_sql = f'select 1 from public.users u {admins_sql}'
+    return _fetch_page(cur, select_sql, count_sql, conditions, params, 'u', filters)
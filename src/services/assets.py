@@ -0,0 +1,197 @@
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+
+import click
+from flask import abort, current_app, request, send_from_directory
+from flask.cli import AppGroup
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+    features = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+FINGERPRINTED = {'.css', '.js', '.svg', '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.ico'}
+COMPRESSIBLE = {'.css', '.js', '.svg'}
+BANNER_DIR = 'img/banners/'
+BANNER_WIDTHS = (640, 1280, 1920)
+# Encoder quality per variant format; AVIF reaches the same visual quality lower.
+VARIANT_QUALITY = {'avif': 55, 'webp': 75}
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+assets_cli = AppGroup('assets', help='Build fingerprinted static assets.')
+
+
+def _fingerprint(data):
+    return hashlib.blake2b(data, digest_size=6).hexdigest()
+
+
+def _hashed_name(rel_path, data, ext=None):
+    stem, original_ext = os.path.splitext(rel_path)
+    return f'{stem}.{_fingerprint(data)}{ext or original_ext}'
+
+
+def _write(dist_root, rel_path, data):
+    target = os.path.join(dist_root, rel_path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as handle:
+        handle.write(data)
+
+
+def _write_compressed(dist_root, rel_path, data):
+    # Only keep an encoded copy when it is actually smaller than the original.
+    gzipped = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gzipped) < len(data):
+        _write(dist_root, rel_path + '.gz', gzipped)
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < len(data):
+            _write(dist_root, rel_path + '.br', compressed)
+
+
+def _variant_formats():
+    if Image is None:
+        return []
+    return [fmt for fmt in ('avif', 'webp') if features.check(fmt)]
+
+
+def _banner_variants(dist_root, rel_path, data, formats):
+    variants = []
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert('RGB')
+        widths = sorted({min(width, image.width) for width in BANNER_WIDTHS})
+        for width in widths:
+            height = round(image.height * width / image.width)
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                buffer = io.BytesIO()
+                resized.save(buffer, fmt.upper(), quality=VARIANT_QUALITY[fmt])
+                encoded = buffer.getvalue()
+                stem = os.path.splitext(rel_path)[0]
+                hashed = _hashed_name(f'{stem}-{width}w', encoded, f'.{fmt}')
+                _write(dist_root, hashed, encoded)
+                variants.append({'format': fmt, 'width': width, 'path': hashed})
+    return variants
+
+
+def build_assets(static_folder):
+    # Earlier builds are left in place: names are content hashes, and workers still
+    # running with the previous manifest keep serving the files it points to.
+    dist_root = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist_root, exist_ok=True)
+
+    formats = _variant_formats()
+    manifest = {'assets': {}, 'variants': {}}
+    for directory, subdirs, files in os.walk(static_folder):
+        if os.path.abspath(directory) == os.path.abspath(static_folder):
+            subdirs[:] = [name for name in subdirs if name != DIST_DIR]
+        for filename in sorted(files):
+            path = os.path.join(directory, filename)
+            rel_path = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            ext = os.path.splitext(filename)[1].lower()
+            if ext not in FINGERPRINTED:
+                continue
+
+            with open(path, 'rb') as handle:
+                data = handle.read()
+            hashed = _hashed_name(rel_path, data)
+            _write(dist_root, hashed, data)
+            if ext in COMPRESSIBLE:
+                _write_compressed(dist_root, hashed, data)
+            manifest['assets'][rel_path] = hashed
+
+            if rel_path.startswith(BANNER_DIR) and formats and ext not in ('.svg', '.gif'):
+                manifest['variants'][rel_path] = _banner_variants(dist_root, rel_path, data, formats)
+
+    with open(os.path.join(dist_root, MANIFEST_NAME), 'w', encoding='utf-8') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path, encoding='utf-8') as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError):
+        # No build yet (development): templates fall back to the plain files.
+        return {'assets': {}, 'variants': {}}
+    manifest.setdefault('assets', {})
+    manifest.setdefault('variants', {})
+    return manifest
+
+
+def _serve_dist(app, filename):
+    dist_root = os.path.join(app.static_folder, DIST_DIR)
+    if safe_join(dist_root, filename) is None:
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    encoding = None
+    served = filename
+    for name, suffix in ENCODINGS:
+        if request.accept_encodings[name] and os.path.isfile(safe_join(dist_root, filename + suffix)):
+            encoding, served = name, filename + suffix
+            break
+
+    response = send_from_directory(dist_root, served, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_assets(app):
+    manifest = load_manifest(app.static_folder)
+    base_url_for = app.url_for
+
+    def asset_url_for(endpoint, **values):
+        # Drop-in for url_for in templates: static files that went through the
+        # build resolve to their fingerprinted copy.
+        if endpoint == 'static':
+            hashed = manifest['assets'].get(values.get('filename'))
+            if hashed:
+                values['filename'] = f'{DIST_DIR}/{hashed}'
+        return base_url_for(endpoint, **values)
+
+    def asset_srcset(filename, fmt):
+        variants = manifest['variants'].get(filename, [])
+        return ', '.join(
+            f"{base_url_for('static', filename=DIST_DIR + '/' + variant['path'])} {variant['width']}w"
+            for variant in variants
+            if variant['format'] == fmt
+        )
+
+    app.jinja_env.globals.update(url_for=asset_url_for, asset_srcset=asset_srcset)
+    app.add_url_rule(
+        f'{app.static_url_path}/{DIST_DIR}/<path:filename>',
+        'static_dist',
+        lambda filename: _serve_dist(app, filename),
+    )
+    app.cli.add_command(assets_cli)
+    return manifest
+
+
+@assets_cli.command('build')
+def build_command():
+    manifest = build_assets(current_app.static_folder)
+    variants = sum(len(items) for items in manifest['variants'].values())
+    click.echo(f"{len(manifest['assets'])} assets fingerprinted, {variants} image variants written")
+    click.echo(f'brotli: {"yes" if brotli else "no (pip install brotli)"}, '
+               f'image variants: {", ".join(_variant_formats()) or "no (pip install Pillow)"}')
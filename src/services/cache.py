@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class _Flight:
+    __slots__ = ('done', 'ok', 'value')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok = False
+        self.value = None
+
+
+class TTLCache:
+    def __init__(self, name, ttl, max_entries=1024):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # Loads in progress by key, so concurrent misses wait for one loader.
+        self._flights = {}
+        # Bumped on every invalidation so a load that started before it is not stored.
+        self._generation = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._loads = 0
+        self._load_seconds = 0.0
+        self._invalidations = 0
+        self._evictions = 0
+        self._waits = 0
+
+        with _registry_lock:
+            _registry[name] = self
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return False, None
+
+    def set(self, key, value, generation=None):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def get_or_load(self, key, loader):
+        found, value = self.get(key)
+        if found:
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generation = self._generation
+            else:
+                self._waits += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.ok:
+                return flight.value
+            # The leader failed: the waiters elect a new one.
+            return self.get_or_load(key, loader)
+
+        try:
+            flight.value = self._load(key, loader, generation)
+            flight.ok = True
+            return flight.value
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def _load(self, key, loader, generation):
+        started = time.perf_counter()
+        value = loader()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._loads += 1
+            self._load_seconds += elapsed
+        self.set(key, value, generation=generation)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            self._generation += 1
+            self._invalidations += 1
+            # Requests arriving from now on start a fresh load instead of
+            # waiting for one that may return pre-invalidation data.
+            if key is None:
+                self._entries.clear()
+                self._flights.clear()
+            else:
+                self._entries.pop(key, None)
+                self._flights.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'generation': self._generation,
+                'hits': self._hits,
+                'misses': self._misses,
+                'loads': self._loads,
+                'waits': self._waits,
+                'load_seconds_total': round(self._load_seconds, 6),
+                'invalidations': self._invalidations,
+                'evictions': self._evictions,
+            }
+
+
+def cache_stats():
+    with _registry_lock:
+        caches = list(_registry.values())
+    return {cache.name: cache.stats() for cache in caches}
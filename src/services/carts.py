@@ -0,0 +1,121 @@
+# Stored carts of signed-in users. Every change is one statement; reads return
+# lines already joined with current product prices.
+from services.records import price_row_from_row
+
+
+# A change is (mode, value): ('add', n) adds n to the stored quantity, ('set', n)
+# replaces it and ('set', 0) removes the line.
+ADD = 'add'
+SET = 'set'
+
+
+def fold_changes(operations):
+    # Collapses a sequence of (op, product_id, quantity) cart operations into one
+    # change per product, so a batch is still a single statement.
+    changes = {}
+    for op, product_id, quantity in operations:
+        mode, value = changes.get(product_id, (ADD, 0))
+        if op == 'add':
+            changes[product_id] = (mode, value + quantity)
+        elif op == 'update' and quantity > 0:
+            changes[product_id] = (SET, quantity)
+        else:
+            changes[product_id] = (SET, 0)
+    return changes
+
+
+def apply_to_session_cart(cart, changes):
+    cart = dict(cart)
+    for product_id, (mode, value) in changes.items():
+        quantity = value if mode == SET else int(cart.get(product_id, 0)) + value
+        if quantity > 0:
+            cart[product_id] = quantity
+        else:
+            cart.pop(product_id, None)
+    return cart
+
+
+def _changes_sql(schema):
+    id_type = schema.product_id_type
+    # Removals, additions and replacements touch disjoint products, so the three
+    # data-modifying CTEs never race for the same row.
+    return f"""
+        with cart as (
+            insert into public.carts (user_id) values (%(user_id)s)
+            on conflict (user_id) do update set updated_at = now()
+            returning id
+        ),
+        changes as (
+            select c.product_id, c.mode, c.value
+            from unnest(%(product_ids)s::{id_type}[], %(modes)s::text[], %(values)s::integer[])
+                as c(product_id, mode, value)
+            join public.products p on p.id = c.product_id
+        ),
+        removed as (
+            delete from public.cart_items ci
+            using cart, changes ch
+            where ci.cart_id = cart.id
+              and ci.product_id = ch.product_id
+              and ch.mode = 'set' and ch.value <= 0
+        ),
+        added as (
+            insert into public.cart_items (cart_id, product_id, quantity)
+            select cart.id, ch.product_id, ch.value
+            from cart, changes ch
+            where ch.mode = 'add' and ch.value > 0
+            on conflict (cart_id, product_id)
+            do update set quantity = public.cart_items.quantity + excluded.quantity
+        )
+        insert into public.cart_items (cart_id, product_id, quantity)
+        select cart.id, ch.product_id, ch.value
+        from cart, changes ch
+        where ch.mode = 'set' and ch.value > 0
+        on conflict (cart_id, product_id)
+        do update set quantity = excluded.quantity
+    """
+
+
+def apply_cart_changes(cur, schema, user_id, changes):
+    # Ids that are malformed or no longer exist are skipped, like in session carts.
+    typed_ids = set(schema.coerce_ids(changes.keys()))
+    entries = [(product_id, mode, value) for product_id, (mode, value) in changes.items() if product_id in typed_ids]
+    if not entries:
+        return
+    cur.execute(
+        _changes_sql(schema),
+        {
+            'user_id': user_id,
+            'product_ids': [product_id for product_id, _, _ in entries],
+            'modes': [mode for _, mode, _ in entries],
+            'values': [value for _, _, value in entries],
+        },
+    )
+
+
+def fetch_cart_lines(cur, schema, user_id):
+    cur.execute(schema.cart_lines_sql, (user_id,))
+    return [(price_row_from_row(row), int(row['quantity'])) for row in cur.fetchall()]
+
+
+def cart_quantity(cur, user_id):
+    cur.execute(
+        """
+        select coalesce(sum(ci.quantity), 0)::integer as quantity
+        from public.carts c
+        join public.cart_items ci on ci.cart_id = c.id
+        where c.user_id = %s
+        """,
+        (user_id,),
+    )
+    return cur.fetchone()['quantity']
+
+
+def clear_cart(cur, user_id):
+    cur.execute(
+        """
+        delete from public.cart_items ci
+        using public.carts c
+        where ci.cart_id = c.id and c.user_id = %s
+        """,
+        (user_id,),
+    )
@@ -0,0 +1,29 @@
+import os
+
+from services.cache import TTLCache
+
+CATALOG_KEY = 'catalog'
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return float(default)
+
+
+# One snapshot per worker. Writes in this worker invalidate it immediately; other
+# workers pick up the change once the TTL runs out, so staleness is bounded by it.
+catalog_cache = TTLCache(
+    'catalog',
+    ttl=_env_float('CATALOG_CACHE_TTL', 30),
+    max_entries=1,
+)
+
+
+def get_catalog(loader):
+    return catalog_cache.get_or_load(CATALOG_KEY, loader)
+
+
+def invalidate_catalog():
+    catalog_cache.invalidate()
@@ -0,0 +1,201 @@
+import contextlib
+import datetime
+import json
+import os
+import re
+import uuid
+
+from db.pool import get_pool
+from db.schema import get_catalog_schema
+
+
+def _env_number(name, default, cast):
+    try:
+        return cast(os.getenv(name, default))
+    except ValueError:
+        return cast(default)
+
+
+# Rows per round trip of the server-side cursor; memory per response is bounded
+# by one batch, whatever the catalog size.
+API_FETCH_SIZE = max(1, _env_number('API_FETCH_SIZE', 1000, int))
+# next_since is moved back by this many seconds, so rows written by transactions
+# still open when the export started are sent again on the next sync instead of
+# being missed. Clients upsert by id, so repeats are harmless.
+API_SYNC_OVERLAP = max(0.0, _env_number('API_SYNC_OVERLAP', 60, float))
+
+# Tombstones of deleted products are kept this long; a `since` older than that
+# could miss deletes, so such clients are told to run a full sync instead.
+API_TOMBSTONE_DAYS = max(1.0, _env_number('API_TOMBSTONE_DAYS', 30, float))
+
+FORMATS = ('ndjson', 'json')
+
+
+class FeedError(ValueError):
+    status = 400
+
+
+class FullSyncRequired(FeedError):
+    status = 410
+
+
+def parse_since(value):
+    value = (value or '').strip()
+    if not value:
+        return None
+    # An unescaped '+' in a query string arrives as a space.
+    value = re.sub(r'(T.*) (\d{2}:?\d{2})$', r'\1+\2', value)
+    try:
+        since = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise FeedError('since must be an ISO 8601 timestamp') from None
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=datetime.timezone.utc)
+    return since
+
+
+def parse_format(value):
+    fmt = (value or 'ndjson').strip().lower()
+    if fmt not in FORMATS:
+        raise FeedError(f"format must be one of: {', '.join(FORMATS)}")
+    return fmt
+
+
+def feed_record(row):
+    updated_at = row.get('updated_at')
+    return {
+        'id': str(row.get('id')),
+        'name': row.get('name'),
+        'slug': row.get('slug'),
+        'description': row.get('description'),
+        'price': float(row.get('price') or 0),
+        'offer_price': float(row.get('offer_price') or 0),
+        'is_on_offer': bool(row.get('is_on_offer')),
+        'effective_price': float(row.get('effective_price') or 0),
+        'image_url': row.get('image_url'),
+        'is_active': bool(row.get('is_active')),
+        'categories': list(row.get('categories') or []),
+        'updated_at': updated_at.isoformat() if updated_at else None,
+    }
+
+
+def feed_query(schema, since):
+    # A full export lists active products; a delta also lists products that were
+    # deactivated since, so clients can drop them.
+    if since is None:
+        where_sql = f'where {schema.active_filter_sql}' if schema.active_filter_sql else ''
+        return f'{schema.feed_sql} {where_sql} order by p.id', ()
+    if not schema.has_column('updated_at'):
+        raise FeedError('this catalog does not track updated_at; omit since')
+    if not schema.has_tombstones:
+        raise FeedError('this catalog does not track deleted products yet; omit since')
+    return f'{schema.feed_sql} where p.updated_at >= %s order by p.updated_at, p.id', (since,)
+
+
+def tombstone_query(since):
+    return (
+        'select id, deleted_at from public.deleted_products where deleted_at >= %s order by deleted_at, id',
+        (since,),
+    )
+
+
+def tombstone_record(row):
+    return {'id': str(row['id']), 'deleted': True, 'deleted_at': row['deleted_at'].isoformat()}
+
+
+def prune_tombstones(cur):
+    cur.execute(
+        'delete from public.deleted_products where deleted_at < now() - make_interval(days => %s)',
+        (int(API_TOMBSTONE_DAYS),),
+    )
+
+
+def prepare_feed(since):
+    # Validates the request and fixes next_since before any byte is streamed, so
+    # errors still get a proper status code.
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            schema = get_catalog_schema(cur)
+            query, params = feed_query(schema, since)
+            cur.execute(
+                """
+                select
+                    now() - make_interval(secs => %s) as next_since,
+                    now() - make_interval(days => %s) as tombstones_from
+                """,
+                (API_SYNC_OVERLAP, int(API_TOMBSTONE_DAYS)),
+            )
+            row = cur.fetchone()
+    next_since = row['next_since']
+    tombstones = None
+    if since is not None:
+        if since < row['tombstones_from']:
+            raise FullSyncRequired(
+                f'since is older than the {int(API_TOMBSTONE_DAYS)} days deletes are kept; run a full sync'
+            )
+        tombstones = tombstone_query(since)
+        if next_since < since:
+            next_since = since
+    return query, params, tombstones, next_since.isoformat()
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _batches(query, params, fetch_size):
+    # The pooled connection is borrowed only once the body is iterated and is
+    # released when the generator finishes or is closed on client disconnect.
+    with get_pool().connection() as conn:
+        name = f'api_products_{uuid.uuid4().hex}'
+        with conn.cursor(name=name) as cur:
+            cur.itersize = fetch_size
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield rows
+
+
+def stream_feed(query, params, next_since, fmt='ndjson', fetch_size=None, tombstones=None):
+    # One chunk per fetched batch: few writes, and nothing but the current batch
+    # is held in memory. Deltas end with the products deleted since, after the
+    # rows, so a product updated and then deleted ends up deleted.
+    fetch_size = fetch_size or API_FETCH_SIZE
+    count = deleted = 0
+    if fmt == 'ndjson':
+        with contextlib.closing(_batches(query, params, fetch_size)) as batches:
+            for rows in batches:
+                count += len(rows)
+                yield ''.join(_dumps(feed_record(row)) + '\n' for row in rows)
+        if tombstones:
+            with contextlib.closing(_batches(*tombstones, fetch_size)) as batches:
+                for rows in batches:
+                    deleted += len(rows)
+                    yield ''.join(_dumps(tombstone_record(row)) + '\n' for row in rows)
+        # The last line carries no id: it marks a complete export and tells
+        # the client where to resume.
+        trailer = {'next_since': next_since, 'count': count}
+        if tombstones:
+            trailer['deleted'] = deleted
+        yield _dumps(trailer) + '\n'
+        return
+
+    yield f'{{"status":"ok","next_since":{_dumps(next_since)},"products":['
+    separator = ''
+    with contextlib.closing(_batches(query, params, fetch_size)) as batches:
+        for rows in batches:
+            count += len(rows)
+            yield separator + ','.join(_dumps(feed_record(row)) for row in rows)
+            separator = ','
+    yield ']'
+    if tombstones:
+        yield ',"deleted":['
+        separator = ''
+        with contextlib.closing(_batches(*tombstones, fetch_size)) as batches:
+            for rows in batches:
+                yield separator + ','.join(_dumps(tombstone_record(row)) for row in rows)
+                separator = ','
+        yield ']'
+    yield f',"count":{count}}}'
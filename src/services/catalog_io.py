@@ -0,0 +1,392 @@
+import contextlib
+import csv
+import io
+import json
+import sys
+import time
+
+import click
+from flask.cli import AppGroup
+
+from db.copy import CopyStream
+from db.pool import get_pool
+from db.schema import detect_catalog_schema
+from services.catalog_stats import refresh_catalog_stats
+
+catalog_cli = AppGroup('catalog', help='Bulk catalog import/export.')
+
+# Feed columns understood by the importer, in staging-table order.
+IMPORT_COLUMNS = (
+    'name', 'slug', 'description', 'price', 'offer_price',
+    'is_on_offer', 'is_active', 'image_url', 'category',
+)
+BOOLEAN_COLUMNS = ('is_on_offer', 'is_active')
+NUMERIC_COLUMNS = ('price', 'offer_price')
+DEFAULT_BATCH_SIZE = 50000
+
+_NUMERIC_RE = r'^\s*[0-9]+(\.[0-9]+)?\s*$'
+_TRUE_VALUES = "('1', 't', 'true', 'y', 'yes', 'si', 'sí', 'on')"
+_BOOL_VALUES = "('1', 't', 'true', 'y', 'yes', 'si', 'sí', 'on', '0', 'f', 'false', 'n', 'no', 'off')"
+# Same result as app._slugify, computed for the whole batch on the server.
+_SLUG_SQL = (
+    "coalesce(nullif(regexp_replace(regexp_replace(lower(trim(s.name)), "
+    "'[^a-z0-9\\s-]', '', 'g'), '\\s+', '-', 'g'), ''), 'producto')"
+)
+
+
+def _feed_format(path, fmt):
+    if fmt:
+        return fmt
+    return 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def _open_feed(path):
+    if path == '-':
+        return contextlib.nullcontext(io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline=''))
+    return open(path, encoding='utf-8', newline='')
+
+
+def _read_rows(handle, fmt):
+    # Yields (line, {column: value}) with only the columns the importer knows.
+    if fmt == 'csv':
+        reader = csv.DictReader(handle)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line, text in enumerate(handle, start=1):
+        text = text.strip()
+        if not text:
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError:
+            record = None
+        yield line, record if isinstance(record, dict) else {'__invalid__': 'json invalido'}
+
+
+def _batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _staging_rows(batch):
+    for line, record in batch:
+        error = record.get('__invalid__')
+        values = [record.get(column) for column in IMPORT_COLUMNS]
+        yield [line, *(None if value is None else str(value).strip() for value in values), error]
+
+
+def _prepare_staging(cur):
+    columns = ', '.join(f'{column} text' for column in IMPORT_COLUMNS)
+    cur.execute(
+        f"""
+        create temp table if not exists catalog_staging (
+            line bigint,
+            {columns},
+            error text
+        ) on commit drop
+        """
+    )
+
+
+def _validate_batch(cur):
+    numeric_checks = ' '.join(
+        f"when {column} is not null and {column} !~ '{_NUMERIC_RE}' then 'invalid {column}'"
+        for column in NUMERIC_COLUMNS
+    )
+    boolean_checks = ' '.join(
+        f"when {column} is not null and lower({column}) not in {_BOOL_VALUES} then 'invalid {column}'"
+        for column in BOOLEAN_COLUMNS
+    )
+    cur.execute(
+        f"""
+        update catalog_staging s
+        set error = case
+                when s.name is null and s.slug is null then 'name or slug required'
+                {numeric_checks}
+                {boolean_checks}
+            end,
+            slug = coalesce(s.slug, {_SLUG_SQL})
+        where s.error is null
+        """
+    )
+
+
+def _typed_value(column):
+    if column in NUMERIC_COLUMNS:
+        return f'{column}::numeric'
+    if column in BOOLEAN_COLUMNS:
+        return f'(lower({column}) in {_TRUE_VALUES})'
+    return column
+
+
+_INSERT_DEFAULTS = {'price': '0', 'offer_price': '0', 'is_on_offer': 'false', 'is_active': 'true'}
+
+
+def _merge_batch(cur, schema, present):
+    # One update for rows whose slug exists, one insert for the rest; the latest
+    # line wins when a slug repeats inside the batch.
+    columns = [
+        column for column in IMPORT_COLUMNS
+        if (column in present or column == 'slug') and column != 'category' and schema.has_column(column)
+    ]
+    typed = ',\n'.join(f'{_typed_value(column)} as {column}' for column in columns)
+    source = f"""
+        src as (
+            select distinct on (slug) line, {typed}, category
+            from catalog_staging
+            where error is null
+            order by slug, line desc
+        )
+    """
+
+    updated = 0
+    update_columns = [column for column in columns if column != 'slug']
+    if update_columns:
+        assignments = ', '.join(f'{column} = coalesce(src.{column}, p.{column})' for column in update_columns)
+        changed = ' or '.join(
+            f'(src.{column} is not null and src.{column} is distinct from p.{column})'
+            for column in update_columns
+        )
+        touch = ', updated_at = now()' if schema.has_column('updated_at') else ''
+        cur.execute(
+            f"""
+            with {source}
+            update public.products p
+            set {assignments}{touch}
+            from src
+            where p.slug = src.slug and ({changed})
+            """
+        )
+        updated = cur.rowcount
+
+    inserted = 0
+    if 'name' in columns:
+        insert_columns = [column for column in columns if column in ('name', 'slug') or column in update_columns]
+        values = ', '.join(
+            f"coalesce(src.{column}, {_INSERT_DEFAULTS[column]})" if column in _INSERT_DEFAULTS else f'src.{column}'
+            for column in insert_columns
+        )
+        cur.execute(
+            f"""
+            with {source}
+            insert into public.products ({', '.join(insert_columns)})
+            select {values}
+            from src
+            where src.name is not null
+              and not exists (select 1 from public.products p where p.slug = src.slug)
+            """
+        )
+        inserted = cur.rowcount
+
+    if 'category' in present and schema.has_category_tables:
+        cur.execute(
+            """
+            insert into public.categories (name)
+            select distinct s.category
+            from catalog_staging s
+            where s.error is null and s.category is not null
+              and not exists (select 1 from public.categories c where c.name = s.category)
+            """
+        )
+        # A product has one category (as in the admin form): replace the link only
+        # when it differs from the feed.
+        cur.execute(
+            """
+            with src as (
+                select distinct on (s.slug) s.slug, c.id as category_id
+                from catalog_staging s
+                join public.categories c on c.name = s.category
+                where s.error is null
+                order by s.slug, s.line desc
+            ),
+            targets as (
+                select p.id as product_id, src.category_id
+                from src
+                join public.products p on p.slug = src.slug
+            ),
+            removed as (
+                delete from public.product_categories pc
+                using targets t
+                where pc.product_id = t.product_id and pc.category_id <> t.category_id
+            )
+            insert into public.product_categories (product_id, category_id)
+            select t.product_id, t.category_id
+            from targets t
+            where not exists (
+                select 1 from public.product_categories pc
+                where pc.product_id = t.product_id and pc.category_id = t.category_id
+            )
+            returning product_id
+            """
+        )
+        moved = [row['product_id'] for row in cur.fetchall()]
+        if moved and schema.has_column('updated_at'):
+            # A new category is a catalog change: it moves the catalog version
+            # and shows up in /api/products deltas.
+            cur.execute(
+                f'update public.products set updated_at = now() '
+                f'where id = any(%s::{schema.product_id_type}[])',
+                (moved,),
+            )
+
+    return updated, inserted
+
+
+def import_catalog(conn, handle, fmt, batch_size=DEFAULT_BATCH_SIZE, report=None):
+    with conn.cursor() as cur:
+        schema = detect_catalog_schema(cur)
+        if not schema.has_column('slug'):
+            raise click.ClickException('products.slug is required to match feed rows to products')
+        _prepare_staging(cur)
+
+        records = _read_rows(handle, fmt)
+        totals = {'rows': 0, 'updated': 0, 'inserted': 0, 'rejected': 0}
+        rejections = []
+        present = set()
+        started = time.perf_counter()
+
+        for batch in _batches(records, batch_size):
+            for _, record in batch:
+                present.update(column for column in IMPORT_COLUMNS if record.get(column) not in (None, ''))
+            cur.execute('truncate catalog_staging')
+            stream = CopyStream(_staging_rows(batch))
+            cur.copy_expert(
+                f"copy catalog_staging (line, {', '.join(IMPORT_COLUMNS)}, error) from stdin",
+                stream,
+                size=65536,
+            )
+            _validate_batch(cur)
+            updated, inserted = _merge_batch(cur, schema, present)
+
+            cur.execute('select line, error from catalog_staging where error is not null order by line')
+            rejected = cur.fetchall()
+            rejections.extend(rejected[:max(0, 20 - len(rejections))])
+
+            totals['rows'] += stream.count
+            totals['updated'] += updated
+            totals['inserted'] += inserted
+            totals['rejected'] += len(rejected)
+            if report:
+                report(totals, time.perf_counter() - started)
+
+        if schema.has_catalog_stats:
+            refresh_catalog_stats(cur, schema)
+
+        totals['unchanged'] = totals['rows'] - totals['updated'] - totals['inserted'] - totals['rejected']
+        totals['seconds'] = time.perf_counter() - started
+        return totals, rejections
+
+
+def _export_sql(schema, fmt):
+    columns = schema.product_columns
+    fields = [
+        'p.name',
+        'p.slug' if 'slug' in columns else 'null::text as slug',
+        'p.description' if 'description' in columns else 'null::text as description',
+        'p.price' if 'price' in columns else '0::numeric as price',
+        'p.offer_price' if 'offer_price' in columns else '0::numeric as offer_price',
+        'p.is_on_offer' if 'is_on_offer' in columns else 'false as is_on_offer',
+        'p.is_active' if 'is_active' in columns else 'true as is_active',
+        'p.image_url' if 'image_url' in columns else 'null::text as image_url',
+    ]
+    if schema.has_category_tables:
+        fields.append(
+            """
+            (
+                select c.name
+                from public.product_categories pc
+                join public.categories c on c.id = pc.category_id
+                where pc.product_id = p.id
+                order by c.name
+                limit 1
+            ) as category
+            """
+        )
+    else:
+        fields.append('null::text as category')
+    select_sql = f"select {', '.join(fields)} from public.products p order by p.name, p.id"
+
+    if fmt == 'csv':
+        return f'copy ({select_sql}) to stdout with (format csv, header true)'
+    # row_to_json escapes every control character, so CSV mode with delimiter and
+    # quote bytes that cannot occur emits each JSON document untouched.
+    return (
+        f'copy (select row_to_json(t) from ({select_sql}) t) to stdout '
+        f"with (format csv, quote e'\\x01', delimiter e'\\x02')"
+    )
+
+
+def export_catalog(conn, handle, fmt):
+    with conn.cursor() as cur:
+        schema = detect_catalog_schema(cur)
+        started = time.perf_counter()
+        cur.copy_expert(_export_sql(schema, fmt), handle, size=65536)
+        return cur.rowcount, time.perf_counter() - started
+
+
+def _echo_progress(totals, elapsed):
+    rate = totals['rows'] / elapsed if elapsed else 0
+    click.echo(
+        f"{totals['rows']:,} rows  {totals['inserted']:,} inserted  {totals['updated']:,} updated  "
+        f"{totals['rejected']:,} rejected  ({rate:,.0f} rows/s)",
+        err=True,
+    )
+
+
+@catalog_cli.command('import')
+@click.argument('path', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults from the file extension.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=DEFAULT_BATCH_SIZE, show_default=True)
+@click.option('--dry-run', is_flag=True, help='Validate and merge, then roll back.')
+def import_command(path, fmt, batch_size, dry_run):
+    """Upsert products (matched by slug) from a CSV or NDJSON feed."""
+    fmt = _feed_format(path, fmt)
+    with _open_feed(path) as handle:
+        with get_pool().connection() as conn:
+            totals, rejections = import_catalog(conn, handle, fmt, batch_size, report=_echo_progress)
+            if dry_run:
+                conn.rollback()
+
+    for row in rejections:
+        click.echo(f"line {row['line']}: {row['error']}", err=True)
+    rate = totals['rows'] / totals['seconds'] if totals['seconds'] else 0
+    click.echo(
+        f"{'Dry run: ' if dry_run else ''}{totals['rows']:,} rows in {totals['seconds']:.2f}s "
+        f"({rate:,.0f} rows/s): {totals['inserted']:,} inserted, {totals['updated']:,} updated, "
+        f"{totals['unchanged']:,} unchanged, {totals['rejected']:,} rejected"
+    )
+
+
+@catalog_cli.command('export')
+@click.argument('path', type=click.Path(dir_okay=False, allow_dash=True), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults from the file extension.')
+def export_command(path, fmt):
+    """Write the whole catalog as CSV or NDJSON (stdout by default)."""
+    fmt = _feed_format(path, fmt)
+    # psycopg2 writes the COPY output as bytes.
+    with click.open_file(path, 'wb') as handle:
+        with get_pool().connection() as conn:
+            rows, seconds = export_catalog(conn, handle, fmt)
+    if path != '-':
+        click.echo(f'{rows:,} rows in {seconds:.2f}s ({rows / seconds if seconds else 0:,.0f} rows/s)', err=True)
+
+
+@catalog_cli.command('refresh-stats')
+@click.option('--rebuild-sales', is_flag=True, help='Also recount units sold from order_items.')
+def refresh_stats_command(rebuild_sales):
+    """Recompute best-seller rankings and category facets (migration 0007)."""
+    started = time.perf_counter()
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            schema = detect_catalog_schema(cur)
+            if not schema.has_catalog_stats:
+                raise click.ClickException('catalog stats tables are missing; run `flask db upgrade`')
+            refresh_catalog_stats(cur, schema, rebuild_sales=rebuild_sales)
+    click.echo(f'catalog stats refreshed in {time.perf_counter() - started:.2f}s')
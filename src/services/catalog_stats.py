@@ -0,0 +1,213 @@
+import os
+
+from services.cache import TTLCache
+
+# Best sellers and category facets (migration 0007). Sales are added to in the
+# checkout statement (see services.checkout); facets are recomputed for the
+# categories a catalog change touches. Readers get O(categories) rows.
+
+
+def _env_number(name, default, cast):
+    try:
+        return cast(os.getenv(name, default))
+    except ValueError:
+        return cast(default)
+
+
+BEST_SELLERS_LIMIT = 6
+
+# Rankings move with every order; each worker re-reads them at most this often.
+stats_cache = TTLCache(
+    'stats',
+    ttl=_env_number('STATS_CACHE_TTL', 60, float),
+    max_entries=_env_number('STATS_CACHE_SIZE', 512, int),
+)
+
+
+def _category_name_sql(schema):
+    if not schema.has_category_tables:
+        return 'null::text as category'
+    return """
+        (
+            select c.name
+            from public.product_categories pc
+            join public.categories c on c.id = pc.category_id
+            where pc.product_id = p.id
+            order by c.name
+            limit 1
+        ) as category
+    """
+
+
+def _product_columns_sql(schema):
+    columns = schema.product_columns
+    return ', '.join([
+        'p.id',
+        'p.name',
+        'p.description' if 'description' in columns else 'null::text as description',
+        'p.price' if 'price' in columns else '0::numeric as price',
+        'p.image_url' if 'image_url' in columns else 'null::text as image_url',
+        'p.is_on_offer' if 'is_on_offer' in columns else 'false as is_on_offer',
+        'p.offer_price' if 'offer_price' in columns else '0::numeric as offer_price',
+    ])
+
+
+def fetch_best_sellers(cur, schema, category=None, limit=BEST_SELLERS_LIMIT):
+    # Walks the units index and stops after `limit` active products.
+    active_sql = f'and {schema.active_filter_sql}' if schema.active_filter_sql else ''
+    if category is None:
+        cur.execute(
+            f"""
+            select {_product_columns_sql(schema)}, {_category_name_sql(schema)}, s.units
+            from public.product_sales s
+            join public.products p on p.id = s.product_id
+            where s.units > 0 {active_sql}
+            order by s.units desc, s.product_id
+            limit %s
+            """,
+            (limit,),
+        )
+    else:
+        cur.execute(
+            f"""
+            select {_product_columns_sql(schema)}, c.name as category, s.units
+            from public.categories c
+            join public.category_sales s on s.category_id = c.id
+            join public.products p on p.id = s.product_id
+            where c.name = %s and s.units > 0 {active_sql}
+            order by s.units desc, s.product_id
+            limit %s
+            """,
+            (category, limit),
+        )
+    return cur.fetchall()
+
+
+def fetch_category_facets(cur):
+    cur.execute(
+        """
+        select c.name, f.product_count, f.offer_count, f.min_price, f.max_price
+        from public.category_facets f
+        join public.categories c on c.id = f.category_id
+        where f.product_count > 0
+        order by c.name
+        """
+    )
+    return [
+        {
+            'name': row['name'],
+            'product_count': row['product_count'],
+            'offer_count': row['offer_count'],
+            'min_price': float(row['min_price']) if row['min_price'] is not None else None,
+            'max_price': float(row['max_price']) if row['max_price'] is not None else None,
+        }
+        for row in cur.fetchall()
+    ]
+
+
+def product_category_ids(cur, product_id):
+    cur.execute(
+        'select category_id::text as category_id from public.product_categories where product_id = %s',
+        (product_id,),
+    )
+    return {row['category_id'] for row in cur.fetchall()}
+
+
+def refresh_category_facets(cur, schema, category_ids=None):
+    # Recomputes the given categories (all when None) in one statement; each
+    # category costs one pass over its own products.
+    if category_ids is not None and not category_ids:
+        return
+    join_active = f'and {schema.active_filter_sql}' if schema.active_filter_sql else ''
+    if schema.has_column('is_on_offer') and schema.has_column('offer_price'):
+        offer_sql = 'p.is_on_offer and p.offer_price > 0'
+    else:
+        offer_sql = 'false'
+    where_sql = 'where c.id::text = any(%(category_ids)s)' if category_ids is not None else ''
+    cur.execute(
+        f"""
+        insert into public.category_facets as f
+            (category_id, product_count, offer_count, min_price, max_price, updated_at)
+        select
+            c.id,
+            count(p.id),
+            count(p.id) filter (where {offer_sql}),
+            min({schema.effective_price_sql}) filter (where p.id is not null),
+            max({schema.effective_price_sql}) filter (where p.id is not null),
+            now()
+        from public.categories c
+        left join public.product_categories pc on pc.category_id = c.id
+        left join public.products p on p.id = pc.product_id {join_active}
+        {where_sql}
+        group by c.id
+        on conflict (category_id) do update
+        set product_count = excluded.product_count,
+            offer_count = excluded.offer_count,
+            min_price = excluded.min_price,
+            max_price = excluded.max_price,
+            updated_at = excluded.updated_at
+        """,
+        {'category_ids': list(category_ids or ())},
+    )
+
+
+def sync_category_sales(cur, product_id=None):
+    # Moves a product's sales (every product's when None) to its current
+    # categories after they change.
+    product_sql = 'and cs.product_id = %(product_id)s' if product_id is not None else ''
+    source_sql = 'where s.product_id = %(product_id)s' if product_id is not None else ''
+    cur.execute(
+        f"""
+        delete from public.category_sales cs
+        where not exists (
+            select 1 from public.product_categories pc
+            where pc.product_id = cs.product_id and pc.category_id = cs.category_id
+        ) {product_sql}
+        """,
+        {'product_id': product_id},
+    )
+    cur.execute(
+        f"""
+        insert into public.category_sales (category_id, product_id, units)
+        select pc.category_id, s.product_id, s.units
+        from public.product_sales s
+        join public.product_categories pc on pc.product_id = s.product_id
+        {source_sql}
+        on conflict (category_id, product_id) do update set units = excluded.units
+        """,
+        {'product_id': product_id},
+    )
+
+
+def rebuild_product_sales(cur):
+    # Recounts from order_items, for orders written outside checkout.
+    cur.execute('delete from public.product_sales')
+    cur.execute(
+        """
+        insert into public.product_sales (product_id, units, revenue)
+        select oi.product_id, sum(oi.quantity), sum(oi.line_total)
+        from public.order_items oi
+        join public.products p on p.id = oi.product_id
+        group by oi.product_id
+        """
+    )
+
+
+def refresh_catalog_stats(cur, schema, rebuild_sales=False):
+    # After bulk changes (feed imports, generated data): everything at once.
+    if rebuild_sales:
+        rebuild_product_sales(cur)
+    sync_category_sales(cur)
+    refresh_category_facets(cur, schema)
+
+
+def cached_best_sellers(load, category=None):
+    return stats_cache.get_or_load(('best_sellers', category), load)
+
+
+def cached_category_facets(load):
+    return stats_cache.get_or_load(('facets',), load)
+
+
+def invalidate_stats():
+    stats_cache.invalidate()
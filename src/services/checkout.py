@@ -0,0 +1,113 @@
+import re
+import uuid
+
+_IDEMPOTENCY_KEY_RE = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+def new_idempotency_key():
+    return uuid.uuid4().hex
+
+
+def normalize_idempotency_key(value):
+    value = (value or '').strip()
+    if _IDEMPOTENCY_KEY_RE.match(value):
+        return value
+    return None
+
+
+def _order_sql(schema, idempotent):
+    key_column = ', idempotency_key' if idempotent else ''
+    key_value = ', %(idempotency_key)s' if idempotent else ''
+    conflict = 'on conflict (idempotency_key) do nothing' if idempotent else ''
+    sales = ''
+    if schema.has_catalog_stats:
+        # Best-seller counters move with the order. Joining new_order means a
+        # replayed idempotency key (no new order) counts nothing.
+        sales = """,
+        new_sales as (
+            insert into public.product_sales as s (product_id, units, revenue)
+            select l.product_id, sum(l.quantity), sum(l.line_total)
+            from new_order o
+            cross join lines l
+            group by l.product_id
+            on conflict (product_id) do update
+            set units = s.units + excluded.units,
+                revenue = s.revenue + excluded.revenue,
+                updated_at = now()
+        ),
+        new_category_sales as (
+            insert into public.category_sales as s (category_id, product_id, units)
+            select pc.category_id, l.product_id, sum(l.quantity)
+            from new_order o
+            cross join lines l
+            join public.product_categories pc on pc.product_id = l.product_id
+            group by pc.category_id, l.product_id
+            on conflict (category_id, product_id) do update
+            set units = s.units + excluded.units
+        )"""
+    # The order row and all of its lines go in one statement; unnest() turns the
+    # parallel arrays back into rows on the server.
+    return f"""
+        with lines as (
+            select *
+            from unnest(
+                %(product_ids)s::{schema.product_id_type}[],
+                %(quantities)s::integer[],
+                %(unit_prices)s::numeric[],
+                %(line_totals)s::numeric[]
+            ) as l(product_id, quantity, unit_price, line_total)
+        ),
+        new_order as (
+            insert into public.orders (user_id, status, subtotal, tax, total, currency{key_column})
+            values (%(user_id)s, %(status)s, %(subtotal)s, %(tax)s, %(total)s, %(currency)s{key_value})
+            {conflict}
+            returning id
+        ),
+        new_items as (
+            insert into public.order_items
+            (order_id, product_id, quantity, unit_price, line_total)
+            select o.id, l.product_id, l.quantity, l.unit_price, l.line_total
+            from new_order o
+            cross join lines l
+        ){sales}
+        select id from new_order
+    """
+
+
+def place_order(cur, schema, user_id, items, subtotal, tax, total, currency='USD', idempotency_key=None):
+    # Returns (order_id, created). A repeated idempotency key returns the order
+    # that was already placed with it instead of creating a duplicate.
+    idempotent = bool(idempotency_key) and 'idempotency_key' in schema.order_columns
+    params = {
+        'user_id': user_id,
+        'status': 'pending',
+        'subtotal': subtotal,
+        'tax': tax,
+        'total': total,
+        'currency': currency,
+        'idempotency_key': idempotency_key,
+        'product_ids': [item['id'] for item in items],
+        'quantities': [item['quantity'] for item in items],
+        'unit_prices': [item['unit_price'] for item in items],
+        'line_totals': [item['line_total'] for item in items],
+    }
+    cur.execute(_order_sql(schema, idempotent), params)
+    row = cur.fetchone()
+    if row:
+        return row['id'], True
+    if not idempotent:
+        return None, False
+
+    return find_order(cur, schema, user_id, idempotency_key), False
+
+
+def find_order(cur, schema, user_id, idempotency_key):
+    # The order an earlier submission with this key already placed, if any.
+    if not idempotency_key or 'idempotency_key' not in schema.order_columns:
+        return None
+    cur.execute(
+        'select id from public.orders where idempotency_key = %s and user_id = %s',
+        (idempotency_key, user_id),
+    )
+    row = cur.fetchone()
+    return row['id'] if row else None
@@ -0,0 +1,335 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, before_render_template, g, request, template_rendered
+from psycopg2.extras import RealDictCursor
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# Histogram name -> (help, buckets). Label values are added as they are observed.
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Request latency by endpoint.', LATENCY_BUCKETS),
+    'http_request_db_queries': ('Database statements run per request.', COUNT_BUCKETS),
+    'http_request_db_seconds': ('Time spent in database statements per request.', LATENCY_BUCKETS),
+    'db_connect_duration_seconds': ('Time to open a new database connection.', LATENCY_BUCKETS),
+    'bcrypt_duration_seconds': ('Time spent hashing or checking passwords.', LATENCY_BUCKETS),
+    'template_render_duration_seconds': ('Time spent rendering a template.', LATENCY_BUCKETS),
+}
+COUNTERS = {
+    'http_requests_total': 'Requests by endpoint, method and status.',
+}
+
+# Server-Timing entry name for each timed section.
+_SECTIONS = ('db', 'connect', 'bcrypt', 'render')
+
+# Called as observer(cursor, query, params, elapsed) after every statement.
+statement_observers = []
+# Extra per-worker data written next to the metrics: name -> snapshot function.
+snapshot_sections = {}
+
+
+def _env_number(name, default, cast):
+    try:
+        return cast(os.getenv(name, default))
+    except ValueError:
+        return cast(default)
+
+
+FLUSH_INTERVAL = _env_number('METRICS_FLUSH_INTERVAL', 1.0, float)
+SERVER_TIMING = os.getenv('SERVER_TIMING', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+class _Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, labels)
+        with self.lock:
+            entry = self.histograms.get(key)
+            if entry is None:
+                entry = self.histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, list(labels), list(entry[0]), entry[1], entry[2]]
+                    for (name, labels), entry in self.histograms.items()
+                ],
+            }
+
+
+_registry = _Registry()
+_registry_pid = os.getpid()
+_flusher_lock = threading.Lock()
+_flusher_pid = None
+_request_state = threading.local()
+
+
+def _current_registry():
+    global _registry, _registry_pid
+    # A registry inherited through fork (gunicorn --preload) belongs to the master.
+    if _registry_pid != os.getpid():
+        with _flusher_lock:
+            if _registry_pid != os.getpid():
+                _registry = _Registry()
+                _registry_pid = os.getpid()
+    return _registry
+
+
+def metrics_dir():
+    # Every worker of one gunicorn master shares a directory; a restart gets a
+    # new master pid and starts from zero.
+    return os.getenv('METRICS_DIR') or os.path.join(
+        tempfile.gettempdir(), f'supermercado-metrics-{os.getppid()}'
+    )
+
+
+def flush():
+    directory = metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as handle:
+        snapshot = _current_registry().snapshot()
+        for name, section in snapshot_sections.items():
+            snapshot[name] = section()
+        json.dump(snapshot, handle)
+    os.replace(temp_path, path)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def _ensure_flusher():
+    global _flusher_pid
+    pid = os.getpid()
+    if _flusher_pid == pid:
+        return
+    with _flusher_lock:
+        if _flusher_pid == pid:
+            return
+        threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+        atexit.register(flush)
+        _flusher_pid = pid
+
+
+def _request_timings():
+    return getattr(_request_state, 'timings', None)
+
+
+def _record(section, elapsed):
+    timings = _request_timings()
+    if timings is not None:
+        timings[section][0] += 1
+        timings[section][1] += elapsed
+
+
+@contextmanager
+def timed(section, histogram=None, labels=()):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _record(section, elapsed)
+        if histogram:
+            _current_registry().observe(histogram, labels, elapsed)
+
+
+class TimedCursor(RealDictCursor):
+    # Counts and times every statement so a request knows its own database cost.
+    def _timed(self, run, query, params):
+        started = time.perf_counter()
+        try:
+            return run()
+        finally:
+            elapsed = time.perf_counter() - started
+            _record('db', elapsed)
+            for observer in statement_observers:
+                observer(self, query, params, elapsed)
+
+    def execute(self, query, vars=None):
+        return self._timed(lambda: super(TimedCursor, self).execute(query, vars), query, vars)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        return self._timed(lambda: super(TimedCursor, self).executemany(query, vars_list), query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._timed(lambda: super(TimedCursor, self).copy_expert(sql, file, size), sql, None)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+# Label names per metric, in the order the values are stored.
+_LABELS = {
+    'http_requests_total': ('endpoint', 'method', 'status'),
+    'http_request_duration_seconds': ('endpoint', 'method'),
+    'http_request_db_queries': ('endpoint',),
+    'http_request_db_seconds': ('endpoint',),
+    'db_connect_duration_seconds': (),
+    'bcrypt_duration_seconds': ('operation',),
+    'template_render_duration_seconds': ('template',),
+}
+
+
+def read_snapshots():
+    directory = metrics_dir()
+    snapshots = []
+    try:
+        filenames = os.listdir(directory)
+    except FileNotFoundError:
+        return snapshots
+    for filename in filenames:
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename), encoding='utf-8') as handle:
+                snapshots.append(json.load(handle))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def render_metrics():
+    # Files of workers that have exited are kept so counters never go backwards.
+    counters = {}
+    histograms = {}
+    for snapshot in read_snapshots():
+        for name, labels, value in snapshot.get('counters', []):
+            key = (name, tuple(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, total, count in snapshot.get('histograms', []):
+            if name not in HISTOGRAMS or len(buckets) != len(HISTOGRAMS[name][1]):
+                continue
+            entry = histograms.setdefault((name, tuple(labels)), [[0] * len(buckets), 0.0, 0])
+            entry[0] = [a + b for a, b in zip(entry[0], buckets)]
+            entry[1] += total
+            entry[2] += count
+
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for (key_name, labels), value in sorted(counters.items()):
+            if key_name == name:
+                lines.append(f'{name}{_format_labels(_LABELS[name], labels)} {value}')
+
+    for name, (help_text, bounds) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (key_name, labels), (buckets, total, count) in sorted(histograms.items()):
+            if key_name != name:
+                continue
+            names = _LABELS[name]
+            cumulative = 0
+            for bound, bucket in zip(bounds, buckets):
+                cumulative += bucket
+                le = f'le="{bound}"'
+                lines.append(f'{name}_bucket{_format_labels(names, labels, le)} {cumulative}')
+            le = 'le="+Inf"'
+            lines.append(f'{name}_bucket{_format_labels(names, labels, le)} {count}')
+            lines.append(f'{name}_sum{_format_labels(names, labels)} {total:.6f}')
+            lines.append(f'{name}_count{_format_labels(names, labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def _server_timing(timings, total):
+    entries = []
+    for section in _SECTIONS:
+        count, seconds = timings[section]
+        if count:
+            entries.append(f'{section};dur={seconds * 1000:.1f};desc="{count}x"')
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def _before_render(sender, template, context, **extra):
+    stack = g.setdefault('_render_started', [])
+    stack.append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    stack = g.get('_render_started')
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    # Nested render_template calls (cached fragments) are already inside the
+    # outer render's time, so only the outermost one counts for the request.
+    if not stack:
+        _record('render', elapsed)
+    _current_registry().observe('template_render_duration_seconds', (template.name or '-',), elapsed)
+
+
+def init_metrics(app):
+    @app.before_request
+    def _start_request_timing():
+        _ensure_flusher()
+        _request_state.timings = {section: [0, 0.0] for section in _SECTIONS}
+        _request_state.started = time.perf_counter()
+
+    @app.after_request
+    def _finish_request_timing(response):
+        timings = _request_timings()
+        if timings is None:
+            return response
+        total = time.perf_counter() - _request_state.started
+        endpoint = request.endpoint or '<unmatched>'
+        registry = _current_registry()
+        registry.inc('http_requests_total', (endpoint, request.method, str(response.status_code)))
+        registry.observe('http_request_duration_seconds', (endpoint, request.method), total)
+        registry.observe('http_request_db_queries', (endpoint,), timings['db'][0])
+        registry.observe('http_request_db_seconds', (endpoint,), timings['db'][1])
+        if SERVER_TIMING:
+            response.headers['Server-Timing'] = _server_timing(timings, total)
+        return response
+
+    @app.teardown_request
+    def _clear_request_timing(exc):
+        _request_state.timings = None
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+    @app.route('/metrics')
+    def metrics():
+        flush()
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,56 @@
+import hashlib
+import os
+
+from markupsafe import Markup
+
+from services.cache import TTLCache
+
+
+def _env_number(name, default, cast):
+    try:
+        return cast(os.getenv(name, default))
+    except ValueError:
+        return cast(default)
+
+
+# Rendered catalog bodies keyed by template, catalog version and query. Entries
+# for an old version are never read again and simply age out.
+page_cache = TTLCache(
+    'pages',
+    ttl=_env_number('PAGE_CACHE_TTL', 300, float),
+    max_entries=_env_number('PAGE_CACHE_SIZE', 256, int),
+)
+
+# How long a shared cache (reverse proxy/CDN) may serve anonymous catalog pages.
+SHARED_MAX_AGE = _env_number('PAGE_SHARED_MAX_AGE', 30, int)
+
+
+def catalog_version(products):
+    # Content hash of the snapshot: identical catalogs give the same version in
+    # every worker, and any change (including deletes) gives a new one. Costs a
+    # repr per product, so large catalogs use catalog_state_version instead.
+    digest = hashlib.blake2b(digest_size=16)
+    for product in products:
+        digest.update(repr(sorted(product.items())).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def catalog_state_version(row_count, last_updated):
+    # Same in every worker for the same table state, without touching the rows.
+    return page_etag('catalog-state', row_count, last_updated.isoformat() if last_updated else None)
+
+
+def page_etag(*parts):
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def cached_fragment(key, render):
+    return page_cache.get_or_load(key, lambda: Markup(render()))
+
+
+def cached_value(key, build):
+    return page_cache.get_or_load(key, build)
@@ -0,0 +1,107 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+from services.metrics import timed
+
+
+def _env_number(name, default, cast):
+    try:
+        return cast(os.getenv(name, default))
+    except ValueError:
+        return cast(default)
+
+
+# Cost factor for new hashes. Existing hashes with another cost are rehashed on
+# the next successful login.
+BCRYPT_ROUNDS = max(4, min(_env_number('BCRYPT_ROUNDS', 12, int), 31))
+# Concurrent hash operations per worker; further requests queue behind them.
+BCRYPT_CONCURRENCY = max(1, _env_number('BCRYPT_CONCURRENCY', 1, int))
+# Requests beyond this many waiting for a slot get a 503 at once, so logins can
+# never hold every thread of a worker.
+BCRYPT_MAX_QUEUE = max(0, _env_number('BCRYPT_MAX_QUEUE', 2, int))
+BCRYPT_TIMEOUT = _env_number('BCRYPT_TIMEOUT', 10.0, float)
+
+
+class PasswordHasherBusy(RuntimeError):
+    pass
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_pending = 0
+
+
+def _get_executor():
+    global _executor, _executor_pid, _pending
+
+    # Executor threads do not survive a fork, so each gunicorn worker builds its own.
+    pid = os.getpid()
+    if _executor is not None and _executor_pid == pid:
+        return _executor
+    with _executor_lock:
+        if _executor is None or _executor_pid != pid:
+            _executor = ThreadPoolExecutor(max_workers=BCRYPT_CONCURRENCY, thread_name_prefix='bcrypt')
+            _executor_pid = pid
+            _pending = 0
+        return _executor
+
+
+def _run(operation, func, *args):
+    global _pending
+
+    executor = _get_executor()
+    with _executor_lock:
+        if _pending >= BCRYPT_CONCURRENCY + BCRYPT_MAX_QUEUE:
+            raise PasswordHasherBusy('Too many password operations in progress')
+        _pending += 1
+    try:
+        future = executor.submit(func, *args)
+    except BaseException:
+        _release(None)
+        raise
+    # The slot is freed when the hash finishes, not when the request stops
+    # waiting: a timed-out hash still occupies the CPU until it is done.
+    future.add_done_callback(_release)
+    try:
+        # bcrypt releases the GIL, so with threaded workers other requests keep
+        # running while a hash is computed.
+        with timed('bcrypt', 'bcrypt_duration_seconds', (operation,)):
+            return future.result(timeout=BCRYPT_TIMEOUT)
+    except FutureTimeout:
+        raise PasswordHasherBusy('Password operation timed out') from None
+
+
+def _release(future):
+    global _pending
+
+    with _executor_lock:
+        _pending -= 1
+
+
+def hash_password(password, rounds=None):
+    salt = bcrypt.gensalt(rounds=rounds or BCRYPT_ROUNDS)
+    return _run('hash', bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+
+def check_password(password, password_hash):
+    try:
+        return _run('check', bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError:
+        # Malformed hash in the database: treat as a failed login.
+        return False
+
+
+def hash_rounds(password_hash):
+    # $2b$12$<salt+hash>
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash):
+    return hash_rounds(password_hash) != BCRYPT_ROUNDS
@@ -0,0 +1,81 @@
+import os
+from decimal import Decimal
+
+from services.cache import TTLCache
+from services.records import PriceRow, price_row_from_row
+
+_MISSING = object()
+
+
+def _env_number(name, default, cast):
+    try:
+        return cast(os.getenv(name, default))
+    except ValueError:
+        return cast(default)
+
+
+# product id -> PriceRow (or _MISSING for ids that no longer exist). Checkout always
+# re-reads prices from the database, so this only has to be fresh enough for display.
+price_cache = TTLCache(
+    'prices',
+    ttl=_env_number('CART_PRICE_CACHE_TTL', 60, float),
+    max_entries=_env_number('CART_PRICE_CACHE_SIZE', 20000, int),
+)
+
+
+def unit_price(row):
+    if isinstance(row, PriceRow):
+        return row.unit_price
+    offer_price = Decimal(str(row.get('offer_price') or 0))
+    price = Decimal(str(row.get('price') or 0))
+    if row.get('is_on_offer') and offer_price > 0:
+        return offer_price
+    return price
+
+
+def remember_price_rows(rows, requested_ids=(), generation=None):
+    # Caches database rows as PriceRow records and returns {product_id: record}.
+    records = {}
+    for row in rows:
+        record = price_row_from_row(row)
+        records[record.id] = record
+        price_cache.set(record.id, record, generation=generation)
+    for product_id in requested_ids:
+        if product_id not in records:
+            price_cache.set(product_id, _MISSING, generation=generation)
+    return records
+
+
+def get_price_rows(product_ids, fetch_rows):
+    # Returns {product_id: row} for the ids that exist, going to the database only
+    # for ids that are not cached, and in a single query.
+    rows = {}
+    missing = []
+    for product_id in product_ids:
+        found, row = price_cache.get(product_id)
+        if not found:
+            missing.append(product_id)
+        elif row is not _MISSING:
+            rows[product_id] = row
+
+    if missing:
+        generation = price_cache.generation
+        rows.update(remember_price_rows(fetch_rows(missing), missing, generation=generation))
+    return rows
+
+
+def price_line(row, quantity):
+    price = unit_price(row)
+    line_total = price * quantity
+    return {
+        'id': str(row.get('id')),
+        'name': row.get('name'),
+        'image_url': row.get('image_url'),
+        'quantity': quantity,
+        'unit_price': float(price),
+        'line_total': float(line_total),
+    }, line_total
+
+
+def invalidate_prices(product_id=None):
+    price_cache.invalidate(str(product_id) if product_id is not None else None)
@@ -0,0 +1,222 @@
+import base64
+import binascii
+import datetime
+import json
+from decimal import Decimal, InvalidOperation
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# sort name -> (row key used for the cursor, direction)
+SORT_OPTIONS = {
+    'recent': ('created_at', 'desc'),
+    'price_asc': ('effective_price', 'asc'),
+    'price_desc': ('effective_price', 'desc'),
+    'name': ('name', 'asc'),
+}
+DEFAULT_SORT = 'recent'
+
+_TRUE_VALUES = ('1', 'on', 'true', 'yes')
+
+
+def _parse_price(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        return None
+    if not price.is_finite() or price < 0:
+        return None
+    return price
+
+
+def _parse_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(sort, value, product_id):
+    if value is not None and not isinstance(value, str):
+        value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+    payload = json.dumps([sort, value, str(product_id)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def cursor_value(row_key, value):
+    # The client sends the cursor back, so its value is checked against the
+    # sort column's type before it reaches the query; raises ValueError.
+    if value is None:
+        return None
+    if row_key == 'created_at':
+        if not isinstance(value, str):
+            raise ValueError('timestamp expected')
+        return datetime.datetime.fromisoformat(value)
+    if row_key == 'effective_price':
+        price = _parse_price(value)
+        if price is None:
+            raise ValueError('number expected')
+        return price
+    if not isinstance(value, str):
+        raise ValueError('text expected')
+    return value
+
+
+def decode_cursor(token, sort):
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor_sort, value, product_id = json.loads(base64.urlsafe_b64decode(padded))
+        # A cursor only makes sense for the ordering it was issued for. A null
+        # value is a row whose sort column is NULL, not a missing cursor.
+        if cursor_sort != sort or not isinstance(product_id, str) or not product_id or len(product_id) > 128:
+            return None
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    # Only scalars; the type is checked once the sort column is known.
+    if value is not None and (isinstance(value, bool) or not isinstance(value, (str, int, float))):
+        return None
+    return value, product_id
+
+
+def parse_listing_args(args):
+    sort = args.get('sort')
+    if sort not in SORT_OPTIONS:
+        sort = DEFAULT_SORT
+
+    return {
+        'q': (args.get('q') or '').strip()[:100],
+        'min_price': _parse_price(args.get('min_price')),
+        'max_price': _parse_price(args.get('max_price')),
+        'offers': (args.get('offers') or '').strip().lower() in _TRUE_VALUES,
+        'category': (args.get('category') or '').strip() or None,
+        'sort': sort,
+        'limit': _parse_limit(args.get('limit')),
+        'cursor': decode_cursor(args.get('cursor'), sort),
+    }
+
+
+def listing_query_args(filters):
+    args = {}
+    if filters['q']:
+        args['q'] = filters['q']
+    if filters['min_price'] is not None:
+        args['min_price'] = str(filters['min_price'])
+    if filters['max_price'] is not None:
+        args['max_price'] = str(filters['max_price'])
+    if filters['offers']:
+        args['offers'] = '1'
+    if filters['category']:
+        args['category'] = filters['category']
+    if filters['sort'] != DEFAULT_SORT:
+        args['sort'] = filters['sort']
+    if filters['limit'] != DEFAULT_PAGE_SIZE:
+        args['limit'] = str(filters['limit'])
+    return args
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _sort_expression(schema, sort):
+    row_key, direction = SORT_OPTIONS[sort]
+    if row_key == 'created_at' and not schema.has_column('created_at'):
+        return 'p.name', 'asc', 'name'
+    if row_key == 'effective_price':
+        return schema.effective_price_sql, direction, row_key
+    return f'p.{row_key}', direction, row_key
+
+
+def keyset_condition(sort_sql, id_sql, direction, value, row_id):
+    # Rows after the cursor in `order by sort, id`. Postgres puts NULLs last in
+    # ascending order and first in descending order, and a row comparison with a
+    # NULL matches nothing, so NULL sort values need their own branches.
+    comparison = '<' if direction == 'desc' else '>'
+    if value is None:
+        condition = f'({sort_sql} is null and {id_sql} {comparison} %s)'
+        if direction == 'desc':
+            condition = f'({condition} or {sort_sql} is not null)'
+        return condition, [row_id]
+    condition = f'({sort_sql}, {id_sql}) {comparison} (%s, %s)'
+    if direction == 'asc':
+        condition = f'({condition} or {sort_sql} is null)'
+    return condition, [value, row_id]
+
+
+def _checked_cursor(schema, row_key, cursor):
+    # A value or id that does not fit the column would fail the query; such a
+    # cursor is treated as no cursor.
+    if not cursor or not schema.coerce_ids([cursor[1]]):
+        return None
+    try:
+        return cursor_value(row_key, cursor[0]), cursor[1]
+    except ValueError:
+        return None
+
+
+def build_listing_query(schema, filters):
+    conditions = []
+    params = []
+
+    if schema.active_filter_sql:
+        conditions.append(schema.active_filter_sql)
+
+    if filters['q']:
+        conditions.append("p.name ilike %s escape '\\'")
+        params.append(f"%{_escape_like(filters['q'])}%")
+
+    if filters['min_price'] is not None:
+        conditions.append(f'{schema.effective_price_sql} >= %s')
+        params.append(filters['min_price'])
+
+    if filters['max_price'] is not None:
+        conditions.append(f'{schema.effective_price_sql} <= %s')
+        params.append(filters['max_price'])
+
+    if filters['offers'] and schema.has_column('is_on_offer'):
+        conditions.append('p.is_on_offer = true')
+
+    if filters['category'] and schema.has_category_tables:
+        conditions.append('c.name = %s')
+        params.append(filters['category'])
+
+    sort_sql, direction, row_key = _sort_expression(schema, filters['sort'])
+    cursor = _checked_cursor(schema, row_key, filters['cursor'])
+    if cursor:
+        condition, cursor_params = keyset_condition(sort_sql, 'p.id', direction, *cursor)
+        conditions.append(condition)
+        params.extend(cursor_params)
+
+    where_sql = f"where {' and '.join(conditions)}" if conditions else ''
+    sql = f"""
+        {schema.listing_sql}
+        {where_sql}
+        order by {sort_sql} {direction}, p.id {direction}
+        limit %s
+    """
+    # One extra row tells us whether another page exists.
+    params.append(filters['limit'] + 1)
+    return sql, params
+
+
+def fetch_listing_page(cur, schema, filters):
+    sql, params = build_listing_query(schema, filters)
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+
+    limit = filters['limit']
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        _, _, row_key = _sort_expression(schema, filters['sort'])
+        last = rows[-1]
+        next_cursor = encode_cursor(filters['sort'], last.get(row_key), last.get('id'))
+    return rows, next_cursor
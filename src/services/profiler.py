@@ -0,0 +1,245 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from flask import has_request_context, request
+from psycopg2 import sql as pg_sql
+
+from services.metrics import flush, read_snapshots, snapshot_sections, statement_observers
+
+
+def _env_number(name, default, cast):
+    try:
+        return cast(os.getenv(name, default))
+    except ValueError:
+        return cast(default)
+
+
+ENABLED = os.getenv('SQL_PROFILER', '0').strip().lower() in ('1', 'true', 'yes', 'on')
+# Parameters carry emails and password hashes, so logs and /admin/perf only
+# show their types and lengths unless this is turned on to debug locally.
+LOG_PARAMS = os.getenv('SQL_LOG_PARAMS', '0').strip().lower() in ('1', 'true', 'yes', 'on')
+SLOW_QUERY_MS = _env_number('SLOW_QUERY_MS', 200, float)
+# The same statement this many times in one request is reported as N+1.
+N_PLUS_ONE_THRESHOLD = _env_number('N_PLUS_ONE_THRESHOLD', 5, int)
+MAX_FINGERPRINTS = 500
+SLOW_LOG_SIZE = 50
+
+logger = logging.getLogger('supermercado.sql')
+
+_COMMENT_RE = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER_RE = re.compile(r'%\(\w+\)s|%s')
+_NUMBER_RE = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_VALUES_RE = re.compile(r'(values\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+')
+_SPACE_RE = re.compile(r'\s+')
+
+_lock = threading.Lock()
+_statements = {}
+_n_plus_one = {}
+_slow = deque(maxlen=SLOW_LOG_SIZE)
+_request_state = threading.local()
+
+
+def normalize_sql(query):
+    # Literals and placeholders become ?, lists of them collapse, so the same
+    # statement with different values (or a different number of ids) shares a
+    # fingerprint.
+    text = _COMMENT_RE.sub(' ', query)
+    text = _STRING_RE.sub('?', text)
+    text = _PLACEHOLDER_RE.sub('?', text)
+    text = _NUMBER_RE.sub('?', text)
+    text = _SPACE_RE.sub(' ', text).strip().lower()
+    text = _LIST_RE.sub('(...)', text)
+    return _VALUES_RE.sub(r'\1, ...', text)
+
+
+def fingerprint(normalized):
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _query_text(cursor, query):
+    if isinstance(query, pg_sql.Composable):
+        return query.as_string(cursor)
+    if isinstance(query, bytes):
+        return query.decode('utf-8', 'replace')
+    return query
+
+
+def _redact(value):
+    if value is None or isinstance(value, bool):
+        return repr(value)
+    if isinstance(value, (str, bytes, bytearray, memoryview, list, tuple)):
+        return f'{type(value).__name__}[{len(value)}]'
+    return type(value).__name__
+
+
+def _short_params(params):
+    if LOG_PARAMS:
+        text = repr(params)
+    elif params is None:
+        text = 'None'
+    elif isinstance(params, dict):
+        text = '{' + ', '.join(f'{key!r}: {_redact(value)}' for key, value in params.items()) + '}'
+    elif isinstance(params, (list, tuple)):
+        text = '(' + ', '.join(_redact(value) for value in params) + ')'
+    else:
+        text = _redact(params)
+    return text if len(text) <= 300 else text[:297] + '...'
+
+
+def _endpoint():
+    return (request.endpoint or '<unmatched>') if has_request_context() else '<cli>'
+
+
+def _observe(cursor, query, params, elapsed):
+    normalized = normalize_sql(_query_text(cursor, query))
+    key = fingerprint(normalized)
+    rows = max(cursor.rowcount, 0)
+    endpoint = _endpoint()
+
+    with _lock:
+        entry = _statements.get(key)
+        if entry is None:
+            if len(_statements) >= MAX_FINGERPRINTS:
+                return
+            entry = _statements[key] = {
+                'query': normalized,
+                'calls': 0,
+                'total_seconds': 0.0,
+                'max_seconds': 0.0,
+                'rows': 0,
+                'endpoints': {},
+            }
+        entry['calls'] += 1
+        entry['total_seconds'] += elapsed
+        entry['max_seconds'] = max(entry['max_seconds'], elapsed)
+        entry['rows'] += rows
+        entry['endpoints'][endpoint] = entry['endpoints'].get(endpoint, 0) + 1
+
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            _slow.append({
+                'at': time.time(),
+                'ms': round(elapsed * 1000, 2),
+                'endpoint': endpoint,
+                'fingerprint': key,
+                'query': normalized,
+                'params': _short_params(params),
+            })
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning(
+            'slow query %.1fms in %s [%s]: %s params=%s',
+            elapsed * 1000, endpoint, key, normalized, _short_params(params),
+        )
+
+    counts = getattr(_request_state, 'counts', None)
+    if counts is not None:
+        counts[key] = counts.get(key, 0) + 1
+
+
+def _finish_request():
+    counts = getattr(_request_state, 'counts', None)
+    _request_state.counts = None
+    if not counts:
+        return
+    endpoint = _endpoint()
+    for key, calls in counts.items():
+        if calls < N_PLUS_ONE_THRESHOLD:
+            continue
+        with _lock:
+            entry = _n_plus_one.setdefault(f'{endpoint} {key}', {
+                'endpoint': endpoint,
+                'fingerprint': key,
+                'query': _statements[key]['query'] if key in _statements else '',
+                'requests': 0,
+                'max_calls': 0,
+            })
+            entry['requests'] += 1
+            entry['max_calls'] = max(entry['max_calls'], calls)
+        logger.warning('possible N+1 in %s: [%s] ran %d times in one request', endpoint, key, calls)
+
+
+def _snapshot():
+    with _lock:
+        return {
+            'statements': {key: dict(entry, endpoints=dict(entry['endpoints'])) for key, entry in _statements.items()},
+            'n_plus_one': [dict(entry) for entry in _n_plus_one.values()],
+            'slow': list(_slow),
+        }
+
+
+def profiler_report():
+    # Merges the snapshots of every worker, like /metrics does.
+    flush()
+    statements = {}
+    n_plus_one = {}
+    slow = []
+    workers = 0
+    for snapshot in read_snapshots():
+        queries = snapshot.get('queries')
+        if not queries:
+            continue
+        workers += 1
+        for key, entry in queries['statements'].items():
+            merged = statements.get(key)
+            if merged is None:
+                statements[key] = dict(entry, endpoints=dict(entry['endpoints']))
+                continue
+            merged['calls'] += entry['calls']
+            merged['total_seconds'] += entry['total_seconds']
+            merged['max_seconds'] = max(merged['max_seconds'], entry['max_seconds'])
+            merged['rows'] += entry['rows']
+            for endpoint, calls in entry['endpoints'].items():
+                merged['endpoints'][endpoint] = merged['endpoints'].get(endpoint, 0) + calls
+        for entry in queries['n_plus_one']:
+            merged = n_plus_one.setdefault(f"{entry['endpoint']} {entry['fingerprint']}", dict(entry, requests=0, max_calls=0))
+            merged['requests'] += entry['requests']
+            merged['max_calls'] = max(merged['max_calls'], entry['max_calls'])
+        slow.extend(queries['slow'])
+
+    rows = []
+    for key, entry in statements.items():
+        rows.append({
+            'fingerprint': key,
+            'query': entry['query'],
+            'calls': entry['calls'],
+            'total_ms': round(entry['total_seconds'] * 1000, 2),
+            'mean_ms': round(entry['total_seconds'] * 1000 / entry['calls'], 3),
+            'max_ms': round(entry['max_seconds'] * 1000, 2),
+            'rows': entry['rows'],
+            'rows_per_call': round(entry['rows'] / entry['calls'], 1),
+            'endpoints': dict(sorted(entry['endpoints'].items(), key=lambda item: -item[1])),
+        })
+    rows.sort(key=lambda row: -row['total_ms'])
+    slow.sort(key=lambda entry: -entry['at'])
+    return {
+        'enabled': ENABLED,
+        'workers': workers,
+        'slow_query_ms': SLOW_QUERY_MS,
+        'params_redacted': not LOG_PARAMS,
+        'n_plus_one_threshold': N_PLUS_ONE_THRESHOLD,
+        'statements': rows,
+        'n_plus_one': sorted(n_plus_one.values(), key=lambda entry: -entry['requests']),
+        'slow': slow[:SLOW_LOG_SIZE],
+    }
+
+
+def init_profiler(app):
+    if not ENABLED:
+        return
+    statement_observers.append(_observe)
+    snapshot_sections['queries'] = _snapshot
+
+    @app.before_request
+    def _start_profiling():
+        _request_state.counts = {}
+
+    @app.teardown_request
+    def _finish_profiling(exc):
+        _finish_request()
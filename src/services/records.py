@@ -0,0 +1,95 @@
+import sys
+from dataclasses import dataclass
+from decimal import Decimal
+
+# Compact, read-only records for rows that are cached per worker. A slotted
+# record takes about a third of the memory of the equivalent dict, Flask
+# serializes dataclasses to JSON as is and templates read them as attributes.
+
+
+def _intern(value):
+    # Categories and quantity labels repeat across thousands of products; one
+    # shared string per distinct value instead of one per row.
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class _RowAccess:
+    # Mapping-style reads, so code written against database rows (the search
+    # index, catalog_version) takes records unchanged.
+    __slots__ = ()
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.__slots__]
+
+
+# Hashable by content (records are never mutated), so a product can key caches
+# of its rendered card: any change to it is a different key.
+@dataclass(slots=True, unsafe_hash=True)
+class Product(_RowAccess):
+    id: str
+    name: str
+    category: str
+    price: float
+    cantity: str
+    image_url: str
+    is_on_offer: bool
+    offer_price: float
+
+
+def _normalize_cantity(description):
+    if not description:
+        return ''
+    prefix = 'Cantidad:'
+    if description.startswith(prefix):
+        return description[len(prefix):].strip()
+    return description
+
+
+def product_from_row(row):
+    return Product(
+        str(row.get('id')),
+        row.get('name'),
+        _intern(row.get('category') or 'Sin categoria'),
+        float(row.get('price') or 0),
+        _intern(_normalize_cantity(row.get('description'))),
+        row.get('image_url'),
+        bool(row.get('is_on_offer')),
+        float(row.get('offer_price') or 0),
+    )
+
+
+@dataclass(slots=True)
+class PriceRow(_RowAccess):
+    # What a cart line needs from a product, with the effective unit price
+    # computed once when the row is cached instead of on every cart render.
+    id: str
+    name: str
+    image_url: str
+    price: Decimal
+    is_on_offer: bool
+    offer_price: Decimal
+    unit_price: Decimal
+
+
+def price_row_from_row(row):
+    price = Decimal(str(row.get('price') or 0))
+    offer_price = Decimal(str(row.get('offer_price') or 0))
+    is_on_offer = bool(row.get('is_on_offer'))
+    return PriceRow(
+        str(row.get('id')),
+        row.get('name'),
+        row.get('image_url'),
+        price,
+        is_on_offer,
+        offer_price,
+        offer_price if is_on_offer and offer_price > 0 else price,
+    )
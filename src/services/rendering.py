@@ -0,0 +1,90 @@
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from jinja2 import FileSystemBytecodeCache, TemplateSyntaxError
+from markupsafe import Markup
+
+from services.cache import TTLCache
+
+
+def _env_number(name, default, cast):
+    try:
+        return cast(os.getenv(name, default))
+    except ValueError:
+        return cast(default)
+
+
+# Compiled templates are kept on disk, so restarted or newly forked workers load
+# bytecode instead of parsing and compiling every template again. Entries are
+# keyed by the template source checksum, so an edited template is recompiled.
+JINJA_BYTECODE_CACHE = os.getenv('JINJA_BYTECODE_CACHE', '1') != '0'
+# Unset: Jinja's private per-user directory under the temp dir. Bytecode is
+# executed when loaded, so the directory must not be writable by other users.
+JINJA_CACHE_DIR = os.getenv('JINJA_CACHE_DIR') or None
+
+CARD_TEMPLATE = 'partials/_product_card.html'
+
+# Rendered product cards keyed by (variant, product). Products are compared by
+# content, so an edited product never hits its old card.
+card_cache = TTLCache(
+    'cards',
+    ttl=_env_number('CARD_CACHE_TTL', 3600, float),
+    max_entries=_env_number('CARD_CACHE_SIZE', 20000, int),
+)
+
+templates_cli = AppGroup('templates', help='Template compilation.')
+
+
+def _bytecode_cache():
+    try:
+        if JINJA_CACHE_DIR:
+            os.makedirs(JINJA_CACHE_DIR, mode=0o700, exist_ok=True)
+        return FileSystemBytecodeCache(JINJA_CACHE_DIR)
+    except (OSError, RuntimeError):
+        # Unusable directory: templates are still compiled in memory per worker.
+        return None
+
+
+def init_rendering(app):
+    if JINJA_BYTECODE_CACHE:
+        app.jinja_env.bytecode_cache = _bytecode_cache()
+
+    def product_cards(products, variant):
+        # Page bodies become a join of cached cards; only cards not seen yet
+        # are rendered.
+        render_card = app.jinja_env.get_template(CARD_TEMPLATE).module.card
+        cards = []
+        for product in products:
+            key = (variant, product)
+            found, card = card_cache.get(key)
+            if not found:
+                card = str(render_card(product, variant))
+                card_cache.set(key, card)
+            cards.append(card)
+        return Markup(''.join(cards))
+
+    app.jinja_env.globals['product_cards'] = product_cards
+    app.cli.add_command(templates_cli)
+
+
+@templates_cli.command('compile')
+def compile_command():
+    """Compile every template into the bytecode cache."""
+    env = current_app.jinja_env
+    if env.bytecode_cache is None:
+        raise click.ClickException('The bytecode cache is disabled (JINJA_BYTECODE_CACHE=0)')
+    started = time.perf_counter()
+    names = env.list_templates(extensions=('html',))
+    failed = []
+    for name in names:
+        try:
+            env.get_template(name)
+        except TemplateSyntaxError as exc:
+            failed.append(name)
+            click.echo(f'{name}:{exc.lineno}: {exc.message}', err=True)
+    if failed:
+        raise click.ClickException(f'{len(failed)} template(s) failed to compile')
+    click.echo(f'{len(names)} templates compiled to {env.bytecode_cache.directory} in {time.perf_counter() - started:.2f}s')
@@ -0,0 +1,346 @@
+import heapq
+import itertools
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_EXPANSION = 200
+MIN_FUZZY_LENGTH = 4
+MAX_FUZZY_CANDIDATES = 50
+MAX_QUERY_TERMS = 6
+MAX_TIER_COMBINATIONS = 512
+SMALL_SET_SIZE = 512
+
+EXACT_WEIGHT = 1.0
+PREFIX_WEIGHT = 0.8
+FUZZY_WEIGHT = 0.6
+CATEGORY_FACTOR = 0.5
+
+
+def fold(text):
+    # "Lácteos" -> "lacteos", "Piña" -> "pina"
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(fold(text))
+
+
+def _trigrams(token):
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _max_distance(token):
+    return 1 if len(token) <= 5 else 2
+
+
+def _edit_distance(a, b, limit):
+    # Optimal string alignment distance with an early exit once `limit` is exceeded.
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        row_min = current[0]
+        for j, cb in enumerate(b, 1):
+            cost = 0 if ca == cb else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs = {}
+        self._doc_tokens = {}
+        self._postings = {}
+        self._name_postings = {}
+        self._rank = {}
+        self._by_length = {}
+        self._vocabulary = []
+        self._bulk = False
+        self._trigram_tokens = {}
+        self._source = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _add_token(self, token, product_id, in_name):
+        postings = self._postings.get(token)
+        if postings is None:
+            postings = self._postings[token] = set()
+            # Bulk syncs re-sort the vocabulary once at the end instead.
+            if not self._bulk:
+                insort(self._vocabulary, token)
+            for gram in _trigrams(token):
+                self._trigram_tokens.setdefault(gram, set()).add(token)
+        postings.add(product_id)
+        if in_name:
+            self._name_postings.setdefault(token, set()).add(product_id)
+        else:
+            name_postings = self._name_postings.get(token)
+            if name_postings is not None:
+                name_postings.discard(product_id)
+
+    def _drop_token(self, token, product_id):
+        postings = self._postings.get(token)
+        if postings is None:
+            return
+        postings.discard(product_id)
+        name_postings = self._name_postings.get(token)
+        if name_postings is not None:
+            name_postings.discard(product_id)
+            if not name_postings:
+                del self._name_postings[token]
+        if postings:
+            return
+        del self._postings[token]
+        if not self._bulk:
+            index = bisect_left(self._vocabulary, token)
+            if index < len(self._vocabulary) and self._vocabulary[index] == token:
+                del self._vocabulary[index]
+        for gram in _trigrams(token):
+            tokens = self._trigram_tokens.get(gram)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._trigram_tokens[gram]
+
+    def _upsert(self, product):
+        product_id = product['id']
+        name_tokens = frozenset(tokenize(product.get('name')))
+        category_tokens = frozenset(tokenize(product.get('category'))) - name_tokens
+
+        previous = self._doc_tokens.get(product_id)
+        if previous is not None:
+            for token in (previous[0] | previous[1]) - (name_tokens | category_tokens):
+                self._drop_token(token, product_id)
+        for token in name_tokens:
+            self._add_token(token, product_id, True)
+        for token in category_tokens:
+            self._add_token(token, product_id, False)
+
+        name = product.get('name') or ''
+        self._drop_rank(product_id)
+        self._docs[product_id] = product
+        self._doc_tokens[product_id] = (name_tokens, category_tokens)
+        self._rank[product_id] = (len(name), product_id)
+        self._by_length.setdefault(len(name), set()).add(product_id)
+
+    def _drop_rank(self, product_id):
+        rank = self._rank.pop(product_id, None)
+        if rank is None:
+            return
+        bucket = self._by_length.get(rank[0])
+        if bucket is not None:
+            bucket.discard(product_id)
+            if not bucket:
+                del self._by_length[rank[0]]
+
+    def _remove(self, product_id):
+        tokens = self._doc_tokens.pop(product_id, None)
+        self._docs.pop(product_id, None)
+        self._drop_rank(product_id)
+        if tokens is None:
+            return
+        for token in tokens[0] | tokens[1]:
+            self._drop_token(token, product_id)
+
+    def sync(self, products):
+        # Applies only the difference against what is already indexed, so a
+        # refreshed catalog snapshot costs a diff rather than a full rebuild.
+        with self._lock:
+            if products is self._source:
+                return
+            self._bulk = True
+            try:
+                seen = set()
+                for product in products:
+                    product_id = product['id']
+                    seen.add(product_id)
+                    current = self._docs.get(product_id)
+                    if (
+                        current is None
+                        or current.get('name') != product.get('name')
+                        or current.get('category') != product.get('category')
+                    ):
+                        self._upsert(product)
+                    else:
+                        self._docs[product_id] = product
+                for product_id in [pid for pid in self._docs if pid not in seen]:
+                    self._remove(product_id)
+                if len(self._vocabulary) != len(self._postings) or any(
+                    token not in self._postings for token in self._vocabulary
+                ):
+                    self._vocabulary = sorted(self._postings)
+            finally:
+                self._bulk = False
+            self._source = products
+
+    def _prefix_tokens(self, prefix):
+        start = bisect_left(self._vocabulary, prefix)
+        matches = []
+        for token in self._vocabulary[start:start + MAX_PREFIX_EXPANSION]:
+            if not token.startswith(prefix):
+                break
+            matches.append(token)
+        return matches
+
+    def _fuzzy_tokens(self, token):
+        limit = _max_distance(token)
+        grams = _trigrams(token)
+        overlap = {}
+        for gram in grams:
+            for candidate in self._trigram_tokens.get(gram, ()):
+                overlap[candidate] = overlap.get(candidate, 0) + 1
+
+        # A single edit (including a transposition) destroys at most four trigrams.
+        needed = max(1, len(grams) - 4 * limit)
+        candidates = heapq.nlargest(
+            MAX_FUZZY_CANDIDATES,
+            (item for item in overlap.items() if item[1] >= needed),
+            key=lambda item: item[1],
+        )
+        matches = []
+        for candidate, _ in candidates:
+            distance = _edit_distance(token, candidate, limit)
+            if distance <= limit:
+                matches.append((candidate, distance))
+        return matches
+
+    def _expand(self, token, is_last):
+        # token -> weight of the best way it can match a vocabulary entry
+        expanded = {}
+        if token in self._postings:
+            expanded[token] = EXACT_WEIGHT
+        if is_last and len(token) >= MIN_PREFIX_LENGTH:
+            for candidate in self._prefix_tokens(token):
+                expanded.setdefault(candidate, PREFIX_WEIGHT)
+        if not expanded and len(token) >= MIN_FUZZY_LENGTH:
+            for candidate, distance in self._fuzzy_tokens(token):
+                expanded[candidate] = FUZZY_WEIGHT - 0.1 * distance
+        return expanded
+
+    def _term_tiers(self, expanded):
+        # Splits the products matching one query term into disjoint sets keyed by
+        # the best weight they reach, highest first.
+        by_weight = {}
+        for token, weight in expanded.items():
+            postings = self._postings[token]
+            name_ids = self._name_postings.get(token, set())
+            if name_ids:
+                by_weight.setdefault(weight, set()).update(name_ids)
+            if len(name_ids) != len(postings):
+                by_weight.setdefault(weight * CATEGORY_FACTOR, set()).update(postings - name_ids)
+
+        tiers = []
+        seen = set()
+        for weight in sorted(by_weight, reverse=True):
+            ids = by_weight[weight] - seen
+            if ids:
+                tiers.append((weight, ids))
+                seen |= ids
+        return tiers
+
+    def _score(self, product_id, expansions):
+        name_tokens, category_tokens = self._doc_tokens[product_id]
+        total = 0.0
+        for expanded in expansions:
+            best = 0.0
+            for token in name_tokens:
+                best = max(best, expanded.get(token, 0.0))
+            for token in category_tokens:
+                best = max(best, expanded.get(token, 0.0) * CATEGORY_FACTOR)
+            total += best
+        return total
+
+    def _top_ranked(self, ids, count):
+        # Shorter names first, then id. Large sets are cut by name-length bucket
+        # so only the handful of rows that can make the page get sorted.
+        if len(ids) <= SMALL_SET_SIZE:
+            return heapq.nsmallest(count, ids, key=self._rank.__getitem__)
+        picked = []
+        for length in sorted(self._by_length):
+            chunk = ids & self._by_length[length]
+            if chunk:
+                picked.extend(sorted(chunk)[:count - len(picked)])
+                if len(picked) >= count:
+                    break
+        return picked
+
+    def search(self, query, limit=10):
+        terms = tokenize(query)[:MAX_QUERY_TERMS]
+        if not terms or limit <= 0:
+            return []
+
+        with self._lock:
+            expansions = [
+                self._expand(term, index == len(terms) - 1)
+                for index, term in enumerate(terms)
+            ]
+            if not all(expansions):
+                return []
+
+            term_tiers = [self._term_tiers(expanded) for expanded in expansions]
+
+            combinations = 1
+            for tiers in term_tiers:
+                combinations *= len(tiers)
+
+            if combinations > MAX_TIER_COMBINATIONS:
+                # Many terms: the intersection is small, so score each product.
+                term_sets = sorted(
+                    (set().union(*(ids for _, ids in tiers)) for tiers in term_tiers),
+                    key=len,
+                )
+                candidates = set.intersection(*term_sets)
+                ranked = heapq.nsmallest(
+                    limit,
+                    candidates,
+                    key=lambda pid: (-self._score(pid, expansions), self._rank[pid]),
+                )
+                return [self._docs[product_id] for product_id in ranked]
+
+            # Every product falls in exactly one tier per term, so walking tier
+            # combinations by total weight yields results in score order and
+            # only the tie-break needs a per-product key.
+            combos = sorted(
+                (
+                    (sum(weight for weight, _ in combo), [ids for _, ids in combo])
+                    for combo in itertools.product(*term_tiers)
+                ),
+                key=lambda item: -item[0],
+            )
+            results = []
+            for _, group in itertools.groupby(combos, key=lambda item: round(item[0], 6)):
+                ids = set()
+                for _, sets in group:
+                    sets = sorted(sets, key=len)
+                    ids |= sets[0].intersection(*sets[1:])
+                if ids:
+                    results.extend(self._top_ranked(ids, limit - len(results)))
+                    if len(results) >= limit:
+                        break
+            return [self._docs[product_id] for product_id in results]
+
+
+search_index = SearchIndex()
+
+
+def search_products(query, products, limit=10):
+    search_index.sync(products)
+    return search_index.search(query, limit=limit)
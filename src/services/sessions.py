@@ -0,0 +1,397 @@
+import datetime
+import json
+import logging
+import os
+import secrets
+import tempfile
+import threading
+import time
+import uuid
+
+import psycopg2
+from flask.sessions import SecureCookieSession, SessionInterface
+from itsdangerous import BadSignature, Signer
+
+from db.pool import get_pool
+from db.schema import detect_catalog_schema
+
+
+def _env_number(name, default, cast):
+    try:
+        return cast(os.getenv(name, default))
+    except ValueError:
+        return cast(default)
+
+
+logger = logging.getLogger('supermercado.sessions')
+
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'postgres').strip().lower()
+# Idle lifetime of a server-side session; active sessions are extended.
+SESSION_TTL = _env_number('SESSION_TTL', 14 * 24 * 3600, int)
+SESSION_CLEANUP_INTERVAL = _env_number('SESSION_CLEANUP_INTERVAL', 600, float)
+SESSION_FILE_DIR = os.getenv('SESSION_FILE_DIR') or os.path.join(tempfile.gettempdir(), 'supermercado-sessions')
+# Requests under these paths never read or write the session.
+_SKIP_PREFIXES = ('/static/', '/metrics', '/health/', '/api/')
+
+_FORMAT_VERSION = 1
+_ID_UUID = 0
+_ID_TEXT = 1
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _uuid_bytes(value):
+    try:
+        parsed = uuid.UUID(value)
+    except (TypeError, ValueError, AttributeError):
+        return None
+    return parsed.bytes if str(parsed) == value else None
+
+
+def encode_session(data):
+    # Version byte, the small scalar keys as compact JSON, then the cart as
+    # (16-byte uuid or length-prefixed text id, varint quantity) pairs. A
+    # 20-line cart of uuid ids is ~360 bytes instead of ~1 KB of JSON.
+    data = dict(data)
+    cart = data.pop('cart', None)
+    if not isinstance(cart, dict):
+        cart = {}
+
+    out = bytearray([_FORMAT_VERSION])
+    meta = json.dumps(data, separators=(',', ':'), sort_keys=True).encode('utf-8') if data else b''
+    _write_varint(out, len(meta))
+    out += meta
+    _write_varint(out, len(cart))
+    for product_id, qty in cart.items():
+        packed = _uuid_bytes(product_id)
+        if packed is not None:
+            out.append(_ID_UUID)
+            out += packed
+        else:
+            raw = str(product_id).encode('utf-8')
+            out.append(_ID_TEXT)
+            _write_varint(out, len(raw))
+            out += raw
+        _write_varint(out, max(0, int(qty)))
+    return bytes(out)
+
+
+def decode_session(blob):
+    data = bytes(blob)
+    if not data or data[0] != _FORMAT_VERSION:
+        return {}
+    try:
+        length, pos = _read_varint(data, 1)
+        session = json.loads(data[pos:pos + length]) if length else {}
+        pos += length
+        count, pos = _read_varint(data, pos)
+        cart = {}
+        for _ in range(count):
+            tag = data[pos]
+            pos += 1
+            if tag == _ID_UUID:
+                product_id = str(uuid.UUID(bytes=data[pos:pos + 16]))
+                pos += 16
+            else:
+                length, pos = _read_varint(data, pos)
+                product_id = data[pos:pos + length].decode('utf-8')
+                pos += length
+            cart[product_id], pos = _read_varint(data, pos)
+    except (IndexError, ValueError):
+        return {}
+    if cart:
+        session['cart'] = cart
+    return session
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class PostgresSessionStore:
+    def load(self, sid):
+        with get_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    'select data, expires_at from public.sessions where id = %s and expires_at > now()',
+                    (sid,),
+                )
+                row = cur.fetchone()
+        return (bytes(row['data']), row['expires_at']) if row else None
+
+    def save(self, sid, data, expires_at):
+        with get_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    insert into public.sessions (id, data, expires_at)
+                    values (%s, %s, %s)
+                    on conflict (id) do update set data = excluded.data, expires_at = excluded.expires_at
+                    """,
+                    (sid, data, expires_at),
+                )
+
+    def touch(self, sid, expires_at):
+        with get_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute('update public.sessions set expires_at = %s where id = %s', (expires_at, sid))
+
+    def delete(self, sid):
+        with get_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute('delete from public.sessions where id = %s', (sid,))
+
+    def delete_expired(self):
+        with get_pool().connection() as conn:
+            with conn.cursor() as cur:
+                # One worker at a time; the others skip this round.
+                cur.execute("select pg_try_advisory_xact_lock(hashtext('supermercado.sessions')) as locked")
+                if not cur.fetchone()['locked']:
+                    return 0
+                cur.execute('delete from public.sessions where expires_at < now()')
+                return cur.rowcount
+
+
+class MemorySessionStore:
+    # Per process: only for tests and single-process development servers.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._sessions.get(sid)
+        if entry is None or entry[1] <= _utcnow():
+            return None
+        return entry
+
+    def save(self, sid, data, expires_at):
+        with self._lock:
+            self._sessions[sid] = (data, expires_at)
+
+    def touch(self, sid, expires_at):
+        with self._lock:
+            if sid in self._sessions:
+                self._sessions[sid] = (self._sessions[sid][0], expires_at)
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def delete_expired(self):
+        now = _utcnow()
+        with self._lock:
+            expired = [sid for sid, (_, expires_at) in self._sessions.items() if expires_at <= now]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+
+class FileSessionStore:
+    # One file per session holding the expiry timestamp and the encoded data.
+    # Shared by every process on the host, so it also works under gunicorn.
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def load(self, sid):
+        try:
+            with open(self._path(sid), 'rb') as handle:
+                header = handle.readline()
+                data = handle.read()
+            expires_at = datetime.datetime.fromtimestamp(float(header), datetime.timezone.utc)
+        except (OSError, ValueError):
+            return None
+        if expires_at <= _utcnow():
+            return None
+        return data, expires_at
+
+    def save(self, sid, data, expires_at):
+        temp_path = f'{self._path(sid)}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as handle:
+            handle.write(f'{expires_at.timestamp()}\n'.encode('ascii'))
+            handle.write(data)
+        os.replace(temp_path, self._path(sid))
+
+    def touch(self, sid, expires_at):
+        loaded = self.load(sid)
+        if loaded is not None:
+            self.save(sid, loaded[0], expires_at)
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def delete_expired(self):
+        removed = 0
+        for sid in os.listdir(self.directory):
+            if not sid.endswith('.tmp') and self.load(sid) is None:
+                self.delete(sid)
+                removed += 1
+        return removed
+
+
+class ServerSession(SecureCookieSession):
+    def __init__(self, initial=None, sid=None, loaded=b'', expires_at=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.new = sid is None
+        # Encoded form as read from the store; saving compares against it.
+        self.loaded = loaded
+        self.expires_at = expires_at
+        self.rotate = False
+
+    def regenerate(self):
+        # New id on privilege changes (login) so a planted session id is useless.
+        self.rotate = True
+        self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+        self._cleaner_pid = None
+        self._cleaner_lock = threading.Lock()
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-session')
+
+    def _ensure_cleaner(self):
+        pid = os.getpid()
+        if self._cleaner_pid == pid or SESSION_CLEANUP_INTERVAL <= 0:
+            return
+        with self._cleaner_lock:
+            if self._cleaner_pid == pid:
+                return
+            threading.Thread(target=self._clean_loop, name='session-cleanup', daemon=True).start()
+            self._cleaner_pid = pid
+
+    def _clean_loop(self):
+        while True:
+            time.sleep(SESSION_CLEANUP_INTERVAL)
+            try:
+                self.store.delete_expired()
+            except Exception:
+                # The database may be briefly unavailable; try again next round.
+                pass
+
+    def open_session(self, app, request):
+        if request.path.startswith(_SKIP_PREFIXES):
+            return None
+        self._ensure_cleaner()
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return ServerSession()
+        try:
+            sid = self._signer(app).unsign(cookie).decode('ascii')
+        except (BadSignature, UnicodeDecodeError):
+            return ServerSession()
+        loaded = self.store.load(sid)
+        if loaded is None:
+            # Expired or unknown ids are never reused.
+            return ServerSession()
+        data, expires_at = loaded
+        return ServerSession(decode_session(data), sid=sid, loaded=data, expires_at=expires_at)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.sid:
+                self.store.delete(session.sid)
+                response.delete_cookie(
+                    name,
+                    domain=domain,
+                    path=path,
+                    secure=self.get_cookie_secure(app),
+                    samesite=self.get_cookie_samesite(app),
+                    httponly=self.get_cookie_httponly(app),
+                )
+            return
+
+        sid = session.sid
+        if session.rotate and sid:
+            self.store.delete(sid)
+            sid = None
+        data = encode_session(session)
+        now = _utcnow()
+        expires_at = now + datetime.timedelta(seconds=SESSION_TTL)
+
+        if sid is None:
+            sid = secrets.token_urlsafe(32)
+            self.store.save(sid, data, expires_at)
+            response.set_cookie(
+                name,
+                self._signer(app).sign(sid).decode('ascii'),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+        elif data != session.loaded:
+            self.store.save(sid, data, expires_at)
+        elif session.expires_at - now < datetime.timedelta(seconds=SESSION_TTL / 2):
+            # Unchanged data: only extend an active session once per half lifetime.
+            self.store.touch(sid, expires_at)
+
+
+def _sessions_table_exists():
+    # No database to ask (CLI commands, an outage): keep the configured backend.
+    try:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cur:
+                return detect_catalog_schema(cur).has_sessions
+    except RuntimeError as exc:
+        logger.warning('could not check for public.sessions: %s', exc)
+        return True
+    except psycopg2.Error:
+        logger.warning('could not check for public.sessions', exc_info=True)
+        return True
+
+
+def init_sessions(app):
+    if SESSION_BACKEND == 'cookie':
+        return
+    if SESSION_BACKEND == 'memory':
+        store = MemorySessionStore()
+    elif SESSION_BACKEND == 'file':
+        store = FileSessionStore(SESSION_FILE_DIR)
+    elif SESSION_BACKEND == 'postgres':
+        if not _sessions_table_exists():
+            logger.warning(
+                'public.sessions is missing; using cookie sessions until `flask db upgrade` '
+                'has run and the workers restart'
+            )
+            return
+        store = PostgresSessionStore()
+    else:
+        raise RuntimeError(f'Unknown SESSION_BACKEND: {SESSION_BACKEND}')
+    app.session_interface = ServerSessionInterface(store)
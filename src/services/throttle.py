@@ -0,0 +1,84 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+def _env_number(name, default, cast):
+    try:
+        return cast(os.getenv(name, default))
+    except ValueError:
+        return cast(default)
+
+
+class RateLimiter:
+    # Sliding window per key, kept per worker like the other caches: with N
+    # workers a client gets at most N times the limit.
+    def __init__(self, name, limit, window, max_keys=50000):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.max_keys = max(1, max_keys)
+        self._lock = threading.Lock()
+        self._hits = OrderedDict()
+        self._rejected = 0
+
+    def _prune(self, hits, now):
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+
+    def retry_after(self, key):
+        # Seconds until `key` may try again; 0 when it is under the limit.
+        if self.limit <= 0 or not key:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                return 0
+            self._prune(hits, now)
+            if len(hits) < self.limit:
+                return 0
+            self._rejected += 1
+            return max(1, math.ceil(hits[0] + self.window - now))
+
+    def hit(self, key):
+        if self.limit <= 0 or not key:
+            return
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                hits = self._hits[key] = deque()
+            self._hits.move_to_end(key)
+            self._prune(hits, now)
+            hits.append(now)
+            while len(hits) > self.limit:
+                hits.popleft()
+            while len(self._hits) > self.max_keys:
+                self._hits.popitem(last=False)
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'keys': len(self._hits),
+                'limit': self.limit,
+                'window_seconds': self.window,
+                'rejected': self._rejected,
+            }
+
+
+_LOGIN_WINDOW = _env_number('LOGIN_RATE_WINDOW', 300, float)
+# Every login/register POST from one address counts.
+ip_limiter = RateLimiter('auth_ip', _env_number('LOGIN_RATE_PER_IP', 30, int), _LOGIN_WINDOW)
+# Only failed logins count against an account; a success clears them.
+email_limiter = RateLimiter('auth_email', _env_number('LOGIN_RATE_PER_EMAIL', 5, int), _LOGIN_WINDOW)
+
+
+def throttle_stats():
+    return {limiter.name: limiter.stats() for limiter in (ip_limiter, email_limiter)}
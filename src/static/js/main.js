@@ -1,67 +1,313 @@
 const setupProductFilters = () => {
 	const list = document.querySelector('[data-products-list]');
-	if (!list) {
+	const form = document.querySelector('[data-products-filters]');
+	if (!list || !form) {
 		return;
 	}
 
-	const items = Array.from(list.querySelectorAll('[data-product-item]'));
-	const searchInput = document.querySelector('[data-filter="search"]');
-	const priceMinInput = document.querySelector('[data-filter="price-min"]');
-	const priceMaxInput = document.querySelector('[data-filter="price-max"]');
-	const offerToggle = document.querySelector('[data-filter="offer"]');
 	const count = document.querySelector('[data-products-count]');
+	const moreButton = document.querySelector('[data-products-more]');
+	const searchInput = form.querySelector('[data-filter="search"]');
+	const suggestions = document.querySelector('[data-products-suggestions]');
+	let nextCursor = list.dataset.nextCursor || '';
+	let shown = list.querySelectorAll('[data-product-item]').length;
+	let controller = null;
+	let debounceTimer = null;
+	let suggestTimer = null;
+	let suggestController = null;
 
-	const applyFilters = () => {
-		const search = (searchInput?.value || '').trim().toLowerCase();
-		const minPrice = Number(priceMinInput?.value || 0);
-		const maxPriceValue = priceMaxInput?.value;
-		const maxPrice = maxPriceValue ? Number(maxPriceValue) : null;
-		const offersOnly = Boolean(offerToggle?.checked);
-
-		const visibleItems = items.filter((item) => {
-			const matchesSearch = !search || item.dataset.search.includes(search);
-			const price = Number(item.dataset.price);
-			const matchesMin = !Number.isFinite(minPrice) || price >= minPrice;
-			const matchesMax = maxPrice === null || (!Number.isNaN(maxPrice) && price <= maxPrice);
-			const matchesOffer = !offersOnly || (item.dataset.offer || '').trim() === 'on';
-			return matchesSearch && matchesMin && matchesMax && matchesOffer;
+	const buildParams = () => {
+		const params = new URLSearchParams();
+		new FormData(form).forEach((value, key) => {
+			const trimmed = String(value).trim();
+			if (trimmed) {
+				params.set(key, trimmed);
+			}
 		});
+		return params;
+	};
 
-		const sortedItems = visibleItems.slice();
-		sortedItems.sort((a, b) => Number(b.dataset.price) - Number(a.dataset.price));
+	const render = () => {
+		if (count) {
+			count.textContent = `Mostrando ${shown} productos`;
+		}
+		if (moreButton) {
+			moreButton.hidden = !nextCursor;
+		}
+	};
 
-		items.forEach((item) => {
-			const isVisible = visibleItems.includes(item);
-			item.style.display = isVisible ? '' : 'none';
-		});
+	const loadPage = async (append) => {
+		if (controller) {
+			controller.abort();
+		}
+		controller = new AbortController();
 
-		sortedItems.forEach((item) => {
-			list.appendChild(item);
-		});
+		const params = buildParams();
+		if (!append) {
+			const query = params.toString();
+			window.history.replaceState(null, '', query ? `${window.location.pathname}?${query}` : window.location.pathname);
+		} else if (nextCursor) {
+			params.set('cursor', nextCursor);
+		}
+		params.set('format', 'json');
 
-		if (count) {
-			count.textContent = `Mostrando ${visibleItems.length} de ${items.length} productos`;
+		try {
+			const response = await fetch(`/products?${params.toString()}`, {
+				headers: { Accept: 'application/json' },
+				signal: controller.signal,
+			});
+			if (!response.ok) {
+				return;
+			}
+			const data = await response.json();
+			if (!data || data.status !== 'ok') {
+				return;
+			}
+			if (append) {
+				list.insertAdjacentHTML('beforeend', data.html);
+				shown += data.products.length;
+			} else {
+				list.innerHTML = data.html;
+				shown = data.products.length;
+			}
+			nextCursor = data.next_cursor || '';
+			render();
+		} catch (error) {
+			if (error.name !== 'AbortError') {
+				console.error('Products error', error);
+			}
 		}
 	};
 
-	[searchInput, priceMinInput, priceMaxInput, offerToggle].forEach((control) => {
-		if (control) {
-			control.addEventListener('input', applyFilters);
-			control.addEventListener('change', applyFilters);
+	const loadSuggestions = async () => {
+		const query = (searchInput?.value || '').trim();
+		if (!suggestions || query.length < 2) {
+			return;
 		}
+		if (suggestController) {
+			suggestController.abort();
+		}
+		suggestController = new AbortController();
+
+		try {
+			const params = new URLSearchParams({ q: query, limit: '8' });
+			const response = await fetch(`/products/search?${params.toString()}`, {
+				signal: suggestController.signal,
+			});
+			if (!response.ok) {
+				return;
+			}
+			const data = await response.json();
+			if (!data || data.status !== 'ok') {
+				return;
+			}
+			suggestions.replaceChildren(
+				...data.results.map((product) => {
+					const option = document.createElement('option');
+					option.value = product.name;
+					return option;
+				}),
+			);
+		} catch (error) {
+			if (error.name !== 'AbortError') {
+				console.error('Search error', error);
+			}
+		}
+	};
+
+	if (searchInput) {
+		searchInput.addEventListener('input', () => {
+			window.clearTimeout(suggestTimer);
+			suggestTimer = window.setTimeout(loadSuggestions, 150);
+		});
+	}
+
+	const scheduleReload = () => {
+		window.clearTimeout(debounceTimer);
+		debounceTimer = window.setTimeout(() => loadPage(false), 250);
+	};
+
+	form.addEventListener('input', scheduleReload);
+	form.addEventListener('change', scheduleReload);
+	form.addEventListener('submit', (event) => {
+		event.preventDefault();
+		window.clearTimeout(debounceTimer);
+		loadPage(false);
 	});
 
-	applyFilters();
+	if (moreButton) {
+		moreButton.addEventListener('click', (event) => {
+			event.preventDefault();
+			if (nextCursor) {
+				loadPage(true);
+			}
+		});
+	}
+
+	render();
 };
 
 document.addEventListener('DOMContentLoaded', setupProductFilters);
 
-const setupCartActions = () => {
-	const buttons = Array.from(document.querySelectorAll('[data-product-id]'));
-	if (!buttons.length) {
-		return;
+// Resolves to { ok, retry, data }: retry is set for failures worth sending
+// again (network errors, 5xx, throttling); data carries the server's cart_count
+// when it answered.
+const postCartBatch = async (operations, keepalive = false) => {
+	let response;
+	try {
+		response = await fetch('/cart/batch', {
+			method: 'POST',
+			headers: {
+				'Content-Type': 'application/json',
+			},
+			body: JSON.stringify({ operations }),
+			// Lets the request outlive the page when it is sent on pagehide.
+			keepalive,
+		});
+	} catch (error) {
+		return { ok: false, retry: true, data: null };
+	}
+	const data = await response.json().catch(() => null);
+	if (response.ok && data && data.status === 'ok') {
+		return { ok: true, retry: false, data };
+	}
+	const retry = response.status >= 500 || response.status === 429;
+	return { ok: false, retry, data };
+};
+
+const showCartError = (message) => {
+	let notice = document.querySelector('[data-cart-notice]');
+	if (!notice) {
+		notice = document.createElement('p');
+		notice.className = 'cart-notice';
+		notice.setAttribute('role', 'status');
+		notice.dataset.cartNotice = '';
+		document.body.appendChild(notice);
 	}
+	notice.textContent = message;
+	notice.hidden = false;
+	window.clearTimeout(notice._timer);
+	notice._timer = window.setTimeout(() => {
+		notice.hidden = true;
+	}, 5000);
+};
+
+const MAX_CART_RETRIES = 3;
+
+// Collects cart changes and sends them as one /cart/batch request once the
+// user pauses. Only one request is in flight at a time, so responses can not
+// arrive out of order; changes made meanwhile go out in the next batch.
+// Whatever is still pending when the page is hidden or left is sent at once
+// with keepalive. Failed batches are retried, then reported through onFailure
+// with the server's answer (if any) so the page can undo optimistic updates.
+const createCartQueue = (onResult, onFailure, delay = 300) => {
+	const pending = new Map();
+	let timer = null;
+	let inFlight = false;
+	let attempts = 0;
+
+	const merge = (operation) => {
+		const current = pending.get(operation.product_id);
+		if (!current) {
+			pending.set(operation.product_id, { ...operation });
+		} else if (operation.op === 'add' && current.op === 'remove') {
+			pending.set(operation.product_id, { op: 'update', product_id: operation.product_id, quantity: operation.quantity });
+		} else if (operation.op === 'add') {
+			current.quantity += operation.quantity;
+		} else {
+			pending.set(operation.product_id, { ...operation });
+		}
+	};
+
+	// A failed batch goes back in front of what was queued since, so newer
+	// changes to the same product still win.
+	const requeue = (operations) => {
+		const newer = Array.from(pending.values());
+		pending.clear();
+		operations.forEach(merge);
+		newer.forEach(merge);
+	};
 
+	const send = async (operations, keepalive) => {
+		const result = await postCartBatch(operations, keepalive);
+		if (result.ok) {
+			attempts = 0;
+			onResult(result.data, operations);
+		} else if (result.retry && attempts < MAX_CART_RETRIES) {
+			attempts += 1;
+			requeue(operations);
+		} else {
+			attempts = 0;
+			onFailure(result.data, operations);
+		}
+	};
+
+	const flush = async () => {
+		timer = null;
+		if (inFlight || !pending.size) {
+			return;
+		}
+		const operations = Array.from(pending.values());
+		pending.clear();
+		inFlight = true;
+		try {
+			await send(operations, false);
+		} finally {
+			inFlight = false;
+			if (pending.size && !timer) {
+				timer = window.setTimeout(flush, delay * 2 ** attempts);
+			}
+		}
+	};
+
+	// The page may be going away: send now, even next to a batch in flight.
+	const flushNow = () => {
+		window.clearTimeout(timer);
+		timer = null;
+		if (!pending.size) {
+			return;
+		}
+		const operations = Array.from(pending.values());
+		pending.clear();
+		send(operations, true).finally(() => {
+			if (pending.size && !timer && !inFlight) {
+				timer = window.setTimeout(flush, delay * 2 ** attempts);
+			}
+		});
+	};
+
+	const schedule = () => {
+		window.clearTimeout(timer);
+		timer = window.setTimeout(flush, delay);
+	};
+
+	window.addEventListener('pagehide', flushNow);
+	document.addEventListener('visibilitychange', () => {
+		if (document.visibilityState === 'hidden') {
+			flushNow();
+		}
+	});
+
+	return {
+		add(productId, quantity = 1) {
+			merge({ op: 'add', product_id: productId, quantity });
+			schedule();
+		},
+		update(productId, quantity) {
+			merge({ op: 'update', product_id: productId, quantity });
+			schedule();
+		},
+		remove(productId) {
+			merge({ op: 'remove', product_id: productId });
+			schedule();
+		},
+	};
+};
+
+const cartErrorMessage = (data) =>
+	(data && data.message) || 'No pudimos actualizar tu carrito. Intenta de nuevo.';
+
+const setupCartActions = () => {
 	const cartCount = document.querySelector('[data-cart-count]');
 
 	const updateCount = (count) => {
@@ -71,32 +317,43 @@ const setupCartActions = () => {
 		cartCount.textContent = String(count);
 	};
 
-	buttons.forEach((button) => {
-		button.addEventListener('click', async () => {
-			const productId = button.dataset.productId;
-			if (!productId) {
-				return;
+	const queue = createCartQueue(
+		(data) => {
+			if (typeof data.cart_count === 'number') {
+				updateCount(data.cart_count);
 			}
-
-			try {
-				const response = await fetch('/cart/add', {
-					method: 'POST',
-					headers: {
-						'Content-Type': 'application/json',
-					},
-					body: JSON.stringify({ product_id: productId, quantity: 1 }),
-				});
-				if (!response.ok) {
-					return;
-				}
-				const data = await response.json();
-				if (data && typeof data.cart_count === 'number') {
-					updateCount(data.cart_count);
-				}
-			} catch (error) {
-				console.error('Cart error', error);
+		},
+		(data, operations) => {
+			// Back to the server's count, or undo this batch's optimistic adds.
+			if (data && typeof data.cart_count === 'number') {
+				updateCount(data.cart_count);
+			} else if (cartCount) {
+				const added = operations
+					.filter((operation) => operation.op === 'add')
+					.reduce((sum, operation) => sum + operation.quantity, 0);
+				updateCount(Math.max(0, Number(cartCount.textContent || 0) - added));
 			}
-		});
+			showCartError(cartErrorMessage(data));
+		},
+		250,
+	);
+
+	// Delegated so product cards loaded later by the listing still work.
+	document.addEventListener('click', (event) => {
+		const button = event.target.closest('.add-to-cart[data-product-id]');
+		if (!button) {
+			return;
+		}
+
+		const productId = button.dataset.productId;
+		if (!productId) {
+			return;
+		}
+
+		if (cartCount) {
+			updateCount(Number(cartCount.textContent || 0) + 1);
+		}
+		queue.add(productId, 1);
 	});
 };
 
@@ -134,61 +391,34 @@ const setupCartPage = () => {
 		}
 	};
 
-	const updateCart = async (productId, quantity, itemEl) => {
-		try {
-			const response = await fetch('/cart/update', {
-				method: 'POST',
-				headers: {
-					'Content-Type': 'application/json',
-				},
-				body: JSON.stringify({ product_id: productId, quantity }),
-			});
-			if (!response.ok) {
-				return;
-			}
-			const data = await response.json();
-			if (!data || data.status !== 'ok') {
+	const findItem = (productId) =>
+		Array.from(cartPage.querySelectorAll('[data-cart-item]')).find(
+			(itemEl) => itemEl.dataset.productId === productId,
+		);
+
+	const queue = createCartQueue((data, operations) => {
+		updateCartCount(data.cart_count);
+		updateSummary(data.subtotal);
+		operations.forEach((operation) => {
+			const itemEl = findItem(operation.product_id);
+			if (!itemEl) {
 				return;
 			}
-			updateCartCount(data.cart_count);
-			updateSummary(data.subtotal);
-			const itemData = data.items ? data.items[productId] : null;
+			const itemData = data.items ? data.items[operation.product_id] : null;
 			if (!itemData) {
 				itemEl.remove();
 			} else {
 				syncItem(itemEl, itemData);
 			}
-		} catch (error) {
-			console.error('Cart update error', error);
-		}
-	};
-
-	const removeItem = async (productId, itemEl) => {
-		try {
-			const response = await fetch('/cart/remove', {
-				method: 'POST',
-				headers: {
-					'Content-Type': 'application/json',
-				},
-				body: JSON.stringify({ product_id: productId }),
-			});
-			if (!response.ok) {
-				return;
-			}
-			const data = await response.json();
-			if (!data || data.status !== 'ok') {
-				return;
-			}
-			itemEl.remove();
-			updateCartCount(data.cart_count);
-			updateSummary(data.subtotal);
-			if (!data.cart_count) {
-				window.location.reload();
-			}
-		} catch (error) {
-			console.error('Cart remove error', error);
+		});
+		if (!data.cart_count) {
+			window.location.reload();
 		}
-	};
+	}, (data) => {
+		// The page shows quantities that were not saved; reload the real cart.
+		showCartError(cartErrorMessage(data));
+		window.setTimeout(() => window.location.reload(), 1500);
+	});
 
 	cartPage.querySelectorAll('[data-cart-item]').forEach((itemEl) => {
 		const productId = itemEl.dataset.productId;
@@ -200,7 +430,7 @@ const setupCartPage = () => {
 		if (qtyInput) {
 			qtyInput.addEventListener('change', () => {
 				const qty = Number(qtyInput.value || 1);
-				updateCart(productId, qty, itemEl);
+				queue.update(productId, qty);
 			});
 		}
 
@@ -209,7 +439,7 @@ const setupCartPage = () => {
 				const current = Number(qtyInput.value || 1);
 				const next = Math.max(1, current - 1);
 				qtyInput.value = next;
-				updateCart(productId, next, itemEl);
+				queue.update(productId, next);
 			});
 		}
 
@@ -218,13 +448,14 @@ const setupCartPage = () => {
 				const current = Number(qtyInput.value || 1);
 				const next = current + 1;
 				qtyInput.value = next;
-				updateCart(productId, next, itemEl);
+				queue.update(productId, next);
 			});
 		}
 
 		if (removeBtn) {
 			removeBtn.addEventListener('click', () => {
-				removeItem(productId, itemEl);
+				itemEl.hidden = true;
+				queue.remove(productId);
 			});
 		}
 	});
@@ -12,4 +12,7 @@ if [ ! -x "$VENV_GUNICORN" ]; then
 	exit 1
 fi
 
-exec "$VENV_GUNICORN" index:app
\ No newline at end of file
+cd "$PROJECT_DIR"
+"$PROJECT_DIR/.venv/bin/flask" --app index assets build
+"$PROJECT_DIR/.venv/bin/flask" --app index db upgrade
+exec "$VENV_GUNICORN" index:app --threads 4
\ No newline at end of file
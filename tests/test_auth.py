@@ -0,0 +1,83 @@
+import os
+import sys
+import uuid
+
+import bcrypt
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+SRC_PATH = os.path.join(PROJECT_ROOT, 'src')
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+pytestmark = pytest.mark.skipif(not os.getenv('DATABASE_URL'), reason='needs DATABASE_URL (a migrated database)')
+
+
+@pytest.fixture
+def stale_user():
+    from db.pool import get_pool
+
+    email = f'rehash-{uuid.uuid4().hex[:12]}@example.com'
+    password = 'secret123'
+    # Cost 4 is below any BCRYPT_ROUNDS, so a login wants to upgrade it.
+    stale_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=4)).decode('utf-8')
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                'insert into public.users (email, password_hash, full_name) values (%s, %s, %s)',
+                (email, stale_hash, 'Rehash Test'),
+            )
+    yield email, password, stale_hash
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute('delete from public.users where email = %s', (email,))
+
+
+def _stored_hash(email):
+    from db.pool import get_pool
+
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute('select password_hash from public.users where email = %s', (email,))
+            return cur.fetchone()['password_hash']
+
+
+def test_login_succeeds_when_the_rehash_finds_the_hasher_saturated(stale_user, monkeypatch):
+    from index import app
+    from services import passwords
+
+    email, password, stale_hash = stale_user
+    run = passwords._run
+
+    def saturated_for_hashing(operation, func, *args):
+        # The check goes through; by the time the upgrade hash is submitted
+        # every slot and queue place is taken.
+        if operation == 'hash':
+            monkeypatch.setattr(passwords, '_pending', passwords.BCRYPT_CONCURRENCY + passwords.BCRYPT_MAX_QUEUE)
+        return run(operation, func, *args)
+
+    monkeypatch.setattr(passwords, '_run', saturated_for_hashing)
+    app.config['TESTING'] = True
+    client = app.test_client()
+
+    response = client.post('/login', data={'email': email, 'password': password})
+
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert session.get('user_id')
+    # Skipped, not half-done: the next login upgrades it.
+    assert _stored_hash(email) == stale_hash
+
+
+def test_login_upgrades_a_stale_hash(stale_user):
+    from index import app
+    from services.passwords import BCRYPT_ROUNDS, hash_rounds
+
+    email, password, _ = stale_user
+    app.config['TESTING'] = True
+    response = app.test_client().post('/login', data={'email': email, 'password': password})
+
+    assert response.status_code == 302
+    assert hash_rounds(_stored_hash(email)) == BCRYPT_ROUNDS
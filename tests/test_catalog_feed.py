@@ -0,0 +1,84 @@
+import datetime
+import json
+import os
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+SRC_PATH = os.path.join(PROJECT_ROOT, 'src')
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+pytestmark = pytest.mark.skipif(not os.getenv('DATABASE_URL'), reason='needs DATABASE_URL (a migrated database)')
+
+
+def _client():
+    from index import app
+
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def _delta(client, since, fmt='ndjson'):
+    response = client.get('/api/products', query_string={'since': since, 'format': fmt})
+    assert response.status_code == 200
+    return response
+
+
+@pytest.fixture
+def product():
+    from db.pool import get_pool
+
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "insert into public.products (name, price) values ('Tombstone Test', 1) returning id"
+            )
+            product_id = str(cur.fetchone()['id'])
+    yield product_id
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute('delete from public.products where id = %s', (product_id,))
+            cur.execute('delete from public.deleted_products where id = %s', (product_id,))
+
+
+def test_delta_reports_products_deleted_since(product):
+    from db.pool import get_pool
+
+    client = _client()
+    since = _delta(client, (datetime.datetime.now(datetime.timezone.utc)
+                            - datetime.timedelta(minutes=1)).isoformat()).headers['X-Next-Since']
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute('delete from public.products where id = %s', (product,))
+
+    lines = [json.loads(line) for line in _delta(client, since).get_data(as_text=True).splitlines()]
+    deleted = [line for line in lines if line.get('deleted') is True]
+    assert product in [line['id'] for line in deleted]
+    assert lines[-1]['deleted'] == len(deleted)
+    assert not any(line.get('id') == product and 'deleted' not in line for line in lines)
+
+    body = _delta(client, since, 'json').get_json()
+    assert product in [row['id'] for row in body['deleted']]
+
+
+def test_full_sync_has_no_tombstones(product):
+    from db.pool import get_pool
+
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute('delete from public.products where id = %s', (product,))
+    trailer = json.loads(_client().get('/api/products').get_data(as_text=True).splitlines()[-1])
+    assert 'deleted' not in trailer
+
+
+def test_since_older_than_the_tombstones_asks_for_a_full_sync():
+    from services.catalog_feed import API_TOMBSTONE_DAYS
+
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=API_TOMBSTONE_DAYS + 1)
+    response = _client().get('/api/products', query_string={'since': since.isoformat()})
+    assert response.status_code == 410
+    assert 'full sync' in response.get_json()['message']
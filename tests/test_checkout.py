@@ -0,0 +1,59 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+pytestmark = pytest.mark.skipif(not os.getenv('DATABASE_URL'), reason='needs DATABASE_URL (a migrated database)')
+
+
+@pytest.fixture
+def customer():
+    from index import app
+    from db.pool import get_pool
+
+    app.config['TESTING'] = True
+    client = app.test_client()
+    email = f'checkout-{uuid.uuid4().hex[:12]}@example.com'
+    response = client.post('/register', data={
+        'first_name': 'Checkout', 'last_name': 'Test', 'email': email, 'password': 'secret123',
+    })
+    assert response.status_code == 302
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute('select id from public.products where is_active limit 1')
+            product_id = str(cur.fetchone()['id'])
+    yield client, product_id
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                'delete from public.orders where user_id = (select id from public.users where email = %s)',
+                (email,),
+            )
+            cur.execute('delete from public.users where email = %s', (email,))
+
+
+def test_checkout_retry_after_success_returns_the_order(customer):
+    client, product_id = customer
+    assert client.post('/cart/add', json={'product_id': product_id}).status_code == 200
+    key = uuid.uuid4().hex
+
+    first = client.post('/checkout', data={'idempotency_key': key})
+    assert first.status_code == 302
+    assert '/checkout/success' in first.headers['Location']
+
+    # The cart was emptied with the order; the retry still lands on it.
+    retry = client.post('/checkout', data={'idempotency_key': key})
+    assert retry.status_code == 302
+    assert retry.headers['Location'] == first.headers['Location']
+
+
+def test_checkout_with_empty_cart_and_new_key_goes_to_cart(customer):
+    client, _ = customer
+    response = client.post('/checkout', data={'idempotency_key': uuid.uuid4().hex})
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/cart')
@@ -0,0 +1,117 @@
+import base64
+import datetime
+import json
+import os
+import sys
+from decimal import Decimal
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_PATH = os.path.join(PROJECT_ROOT, 'src')
+for path in (PROJECT_ROOT, SRC_PATH):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from db.schema import CatalogSchema
+from services.admin_listing import PRODUCT_FLAGS, parse_admin_args
+from services.product_listing import (
+    build_listing_query,
+    decode_cursor,
+    encode_cursor,
+    fetch_listing_page,
+    parse_listing_args,
+)
+
+PRODUCT_ID = '0b5e4f6a-4a61-4d8e-9a38-2f1b7c9d0e11'
+SCHEMA = CatalogSchema(
+    ['id', 'name', 'description', 'price', 'image_url', 'is_on_offer', 'offer_price', 'is_active', 'created_at'],
+    True,
+    product_id_type='uuid',
+)
+
+
+def _token(payload):
+    raw = json.dumps(payload).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _query(args):
+    return build_listing_query(SCHEMA, parse_listing_args(MultiDict(args)))
+
+
+class _RowsCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_null_sort_value_round_trips():
+    rows = [
+        {'id': PRODUCT_ID, 'name': 'Pan', 'created_at': None},
+        {'id': PRODUCT_ID.replace('0b', '0c'), 'name': 'Leche', 'created_at': None},
+    ]
+    _, cursor = fetch_listing_page(_RowsCursor(rows), SCHEMA, parse_listing_args(MultiDict({'limit': '1'})))
+
+    assert decode_cursor(cursor, 'recent') == (None, PRODUCT_ID)
+    sql, params = _query({'cursor': cursor})
+    assert 'p.created_at is null' in sql
+    assert PRODUCT_ID in params
+
+
+def test_valid_cursor_values_are_typed():
+    created = datetime.datetime(2026, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)
+    _, params = _query({'cursor': encode_cursor('recent', created, PRODUCT_ID)})
+    assert created in params
+
+    _, params = _query({'sort': 'price_asc', 'cursor': encode_cursor('price_asc', Decimal('2.50'), PRODUCT_ID)})
+    assert Decimal('2.50') in params
+
+
+@pytest.mark.parametrize('payload, sort', [
+    (['recent', 'garbage', PRODUCT_ID], 'recent'),
+    (['recent', {'a': 1}, PRODUCT_ID], 'recent'),
+    (['recent', [1, 2], PRODUCT_ID], 'recent'),
+    (['recent', 12, PRODUCT_ID], 'recent'),
+    (['recent', '2026-01-02T03:04:05+00:00', 'x'], 'recent'),
+    (['recent', '2026-01-02T03:04:05+00:00', 42], 'recent'),
+    (['recent', '2026-01-02T03:04:05+00:00', {'id': 1}], 'recent'),
+    (['price_asc', 'cheap', PRODUCT_ID], 'price_asc'),
+    (['price_asc', True, PRODUCT_ID], 'price_asc'),
+    (['name', 5, PRODUCT_ID], 'name'),
+])
+def test_tampered_cursor_is_ignored(payload, sort):
+    tampered_sql, tampered_params = _query({'sort': sort, 'cursor': _token(payload)})
+    plain_sql, plain_params = _query({'sort': sort})
+
+    assert (tampered_sql, tampered_params) == (plain_sql, plain_params)
+
+
+@pytest.mark.parametrize('token', ['not-base64!!', _token({'a': 1}), _token(['recent', None]), _token('x')])
+def test_malformed_cursor_is_ignored(token):
+    assert parse_listing_args(MultiDict({'cursor': token}))['cursor'] is None
+
+
+def test_admin_cursor_requires_a_timestamp_and_uuid():
+    good = encode_cursor('created', datetime.datetime(2026, 1, 2, tzinfo=datetime.timezone.utc), PRODUCT_ID)
+    assert parse_admin_args(MultiDict({'cursor': good}), PRODUCT_FLAGS)['cursor'] is not None
+
+    for payload in (['created', 'garbage', PRODUCT_ID], ['created', '2026-01-02T00:00:00', 'x'], ['created', [], PRODUCT_ID]):
+        assert parse_admin_args(MultiDict({'cursor': _token(payload)}), PRODUCT_FLAGS)['cursor'] is None
+
+
+@pytest.mark.skipif(not os.getenv('DATABASE_URL'), reason='needs DATABASE_URL (a migrated database)')
+def test_tampered_cursor_does_not_fail_the_page():
+    from index import app
+
+    app.config['TESTING'] = True
+    client = app.test_client()
+    for payload in (['recent', 'garbage', 'x'], ['recent', {'a': 1}, PRODUCT_ID], ['recent', None, 'x']):
+        response = client.get('/products', query_string={'cursor': _token(payload)}, headers={'Accept': 'application/json'})
+        assert response.status_code == 200
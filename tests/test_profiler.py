@@ -0,0 +1,28 @@
+import datetime
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+SRC_PATH = os.path.join(PROJECT_ROOT, 'src')
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from services import profiler
+
+
+def test_params_are_redacted_by_default(monkeypatch):
+    monkeypatch.setattr(profiler, 'LOG_PARAMS', False)
+    password_hash = '$2b$12$abcdefghijklmnopqrstuv'
+    text = profiler._short_params(('ana@example.com', password_hash, 3, None, [1, 2], datetime.date(2026, 1, 1)))
+    assert text == '(str[15], str[29], int, None, list[2], date)'
+    assert 'ana@example.com' not in text and password_hash not in text
+
+    named = profiler._short_params({'email': 'ana@example.com', 'active': True})
+    assert named == "{'email': str[15], 'active': True}"
+
+
+def test_params_are_shown_when_explicitly_enabled(monkeypatch):
+    monkeypatch.setattr(profiler, 'LOG_PARAMS', True)
+    assert profiler._short_params(('ana@example.com',)) == "('ana@example.com',)"